@@ -0,0 +1,1113 @@
+# /// script
+# requires-python = ">=3.10"
+# dependencies = ["pyyaml>=6.0"]
+# ///
+"""Benchmarks for the yaks task tracker."""
+
+import argparse
+import contextlib
+import gc
+import hashlib
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import yak  # noqa: E402
+
+# ---------------------------------------------------------------------------
+# ID allocation
+# ---------------------------------------------------------------------------
+
+
+def _collision_run(n: int, trials: int, seed: int, cold: bool = False) -> dict:
+    """Allocate *n* IDs into an empty namespace, counting probes and widths.
+
+    With *cold*, the allocator gets no size estimate (as in a fresh CLI
+    process with no index loaded) and has to widen on collisions alone.
+    """
+    rng_state = random.getstate()
+    random.seed(seed)
+    try:
+        probes = 0
+        collisions = 0
+        widths: dict[int, int] = {}
+        start = time.perf_counter()
+        for _ in range(trials):
+            taken: set[str] = set()
+
+            def is_taken(tid: str) -> bool:
+                nonlocal probes, collisions
+                probes += 1
+                if tid in taken:
+                    collisions += 1
+                    return True
+                return False
+
+            for i in range(n):
+                tid = yak.allocate_id("bench", is_taken, known=0 if cold else i)
+                if tid is None:
+                    raise RuntimeError(f"allocation failed after {i} IDs")
+                taken.add(tid)
+                width = len(tid) - len("bench-")
+                widths[width] = widths.get(width, 0) + 1
+        elapsed = time.perf_counter() - start
+    finally:
+        random.setstate(rng_state)
+    allocs = n * trials
+    return {
+        "tasks": n,
+        "trials": trials,
+        "probes_per_id": probes / allocs,
+        "collision_rate": collisions / probes,
+        "widths": dict(sorted(widths.items())),
+        "final_width": yak._id_width(n),
+        "us_per_id": elapsed / allocs * 1e6,
+    }
+
+
+def _legacy_failure_probability(n: int) -> float:
+    """Chance the old fixed 4-hex, 100-attempt allocator failed at *n* tasks."""
+    load = min(n / 16 ** 4, 1.0)
+    return load ** 100
+
+
+def bench_ids(args) -> dict:
+    results = []
+    for n in args.tasks:
+        r = _collision_run(n, args.trials, args.seed, args.cold)
+        r["collision_probability"] = n / 16 ** r["final_width"]
+        r["legacy_collision_probability"] = min(n / 16 ** 4, 1.0)
+        r["legacy_failure_probability"] = _legacy_failure_probability(n)
+        results.append(r)
+    return {"ids": results}
+
+
+def _print_ids(results: dict) -> None:
+    print(f"{'tasks':>8} {'probes/id':>10} {'coll.rate':>10} {'width':>6} {'us/id':>7}  widths used")
+    for r in results["ids"]:
+        widths = " ".join(f"{w}:{c}" for w, c in r["widths"].items())
+        print(f"{r['tasks']:>8} {r['probes_per_id']:>10.4f} {r['collision_rate']:>10.4%} "
+              f"{r['final_width']:>6} {r['us_per_id']:>7.2f}  {widths}")
+    print("\nChance one fresh draw is taken once the tree holds that many tasks:")
+    for r in results["ids"]:
+        print(f"{r['tasks']:>8}  now p={r['collision_probability']:.3g}  "
+              f"legacy 4-hex p={r['legacy_collision_probability']:.3g}  "
+              f"legacy 100-attempt failure p={r['legacy_failure_probability']:.3g}")
+
+
+# ---------------------------------------------------------------------------
+# Task loading
+# ---------------------------------------------------------------------------
+
+
+_LABELS = ("api", "auth", "cli", "db", "docs", "perf", "ui")
+
+
+def _synthetic_ids(n: int, depth: int, fanout: int):
+    """The first *n* IDs of a forest of top-level tasks, each with *fanout* children per level down to *depth*."""
+    def family(tid: str, level: int):
+        yield tid
+        if level < depth:
+            for k in range(1, fanout + 1):
+                yield from family(f"{tid}.{k}", level + 1)
+
+    forest = itertools.chain.from_iterable(family(f"bench-{i:06x}", 1) for i in itertools.count())
+    return itertools.islice(forest, n)
+
+
+def make_tree(root: Path, n: int, seed: int = 0, *, mix: tuple[int, int, int] = (6, 1, 3), depth: int = 1,
+              fanout: int = 4, deps: float = 0.3, desc: int = 19, layout: str = yak.FLAT) -> None:
+    """Populate *root* (a `.yaks` dir) with *n* synthetic tasks spread across statuses.
+
+    *mix* weights hairy, shaving and shorn; *depth* > 1 gives every task
+    *fanout* children down to that many levels; *deps* is the chance a task
+    depends on an earlier one; descriptions run to up to *desc* sentences.
+    """
+    rng = random.Random(seed)
+    for s in yak.STATUSES:
+        (root / s).mkdir(parents=True, exist_ok=True)
+    cfg = {"prefix": "bench", "schema": yak.SCHEMA_VERSION}
+    if layout == yak.SHARDED:
+        cfg["layout"] = layout
+    (root / "config.yaml").write_text(yak.dump_yaml(cfg, yak.CONFIG_FIELDS))
+    made = set()
+    ids = []
+    for i, tid in enumerate(_synthetic_ids(n, depth, fanout)):
+        task = {
+            "id": tid,
+            "title": f"Synthetic task {i}",
+            "type": rng.choice(("task", "bug", "feature")),
+            "priority": rng.randint(1, 3),
+            "created": "2025-01-01T00:00:00Z",
+            "updated": "2025-01-02T00:00:00Z",
+        }
+        if i and rng.random() < deps:
+            task["depends_on"] = [ids[rng.randrange(i)]]
+        if desc:
+            task["description"] = "Lorem ipsum dolor sit amet. " * (rng.randrange(desc) + 1)
+        status = rng.choices(yak.STATUSES, weights=mix)[0]
+        if rng.random() < 0.2:
+            task["labels"] = [rng.choice(_LABELS)]
+        ids.append(tid)
+        d = root / status
+        if layout == yak.SHARDED:
+            d = d / yak.shard_of(tid)
+            if d not in made:
+                d.mkdir(exist_ok=True)
+                made.add(d)
+        (d / f"{tid}.md").write_text(yak.render_task(task))
+
+
+def _cold_load(root: Path, cfg: dict) -> float:
+    """Time a full index rebuild of *root* with the load_* settings in *cfg*."""
+    base = {k: v for k, v in yak.load_config(root).items() if not k.startswith("load_")}
+    (root / "config.yaml").write_text(yak.dump_yaml({**base, **cfg}))
+    (root / yak.INDEX_FILE).unlink(missing_ok=True)
+    yak._indexes.pop(root, None)
+    start = time.perf_counter()
+    yak.task_index(root)
+    return time.perf_counter() - start
+
+
+def bench_load(args) -> dict:
+    settings = [("serial", {"load_threads": 1}), ("threads", {})]
+    if args.processes > 1:
+        settings.append((f"threads+{args.processes}proc", {"load_processes": args.processes}))
+    results = []
+    for n in args.tasks:
+        if args.dir:
+            root = Path(args.dir)
+        else:
+            root = Path(tempfile.mkdtemp(prefix="yaks-bench-")) / ".yaks"
+            make_tree(root, n, args.seed)
+        try:
+            for name, cfg in settings:
+                times = [_cold_load(root, cfg) for _ in range(args.trials)]
+                results.append({"tasks": n, "mode": name, "seconds": min(times)})
+        finally:
+            if not args.dir:
+                shutil.rmtree(root.parent)
+    return {"load": results}
+
+
+def _print_load(results: dict) -> None:
+    print(f"{'tasks':>8} {'mode':<16} {'seconds':>8} {'us/task':>8}")
+    for r in results["load"]:
+        print(f"{r['tasks']:>8} {r['mode']:<16} {r['seconds']:>8.3f} {r['seconds'] / r['tasks'] * 1e6:>8.1f}")
+
+
+# ---------------------------------------------------------------------------
+# Frontmatter codec
+#
+# The fast frontmatter codec must agree with PyYAML on every document: what
+# it emits must match yaml.dump byte for byte, and what it parses must match
+# yaml.safe_load. Each document goes through both, and whatever the fast path
+# declines (returns None for) is not a mismatch, since PyYAML handles it.
+# ---------------------------------------------------------------------------
+
+# Strings that sit on a quoting, typing or folding boundary.
+_CODEC_STRINGS = [
+    "", "plain", "two words", "with: colon", "ends with:", "a:b", "http://x.y/z", "#hash", "a #b", "a#b",
+    "'single'", '"double"', "it's", 'say "hi"', "yes", "No", "on", "OFF", "null", "~", "123", "-7", "0x1F",
+    "0o17", "017", "1_000", "1:30", "1.5", "1e3", ".inf", "-.INF", ".nan", "2026-01-01", "2026-01-01 10:00:00",
+    "- dash", "-dash", "? q", "?q", ": c", "---", "...", "--- x", " lead", "trail ", "<<", "=", "!", "&a", "*a",
+    "%x", "@x", "`x`", "[x]", "{x}", ",x", "|x", ">x", "x,y", "a [b]", "tab\there", "ünïcødé", "日本語",
+    "emoji \U0001f410", "nbsp\xa0x", "line\u2028sep", "nel\x85x", "bom\ufeff", "\x7f", "x" * 79, "x" * 81,
+    " ".join(["word"] * 20), "multi\nline", "trailing newline\n", "\nleading newline", "two\n\n", "\n",
+    "  indented\nblock", "end  \nspace", "crlf\r\nline",
+]
+
+# Descriptions, which live in the body after the frontmatter.
+_CODEC_BODIES = [
+    None, "", "one line", "multi\nline\n\nbody", "  indented\ncode\n", "---\ninside", "unicode \u2713",
+    "# heading\n\n- item: value\n", "ends with newline\n",
+]
+
+_CODEC_ALPHABET = "aZ09 :#'\"-?,[]{}&*!|>%@`~._\t\néü日\U0001f410\xa0\u2028\x85"
+
+
+def _codec_corpus(n: int, seed: int):
+    """Task dicts: every fixed edge case in each field shape, then *n* seeded random documents."""
+    for v in _CODEC_STRINGS:
+        yield {"id": "t-0001", "title": v}
+        yield {"id": "t-0001", "labels": [v, "ok"], "depends_on": []}
+    for i, body in enumerate(_CODEC_BODIES):
+        doc = {"id": f"t-{i:04x}", "title": "t", "priority": i - 1, "labels": [], "commit": "a1b2c3d"}
+        if body is not None:
+            doc["description"] = body
+        yield doc
+    rng = random.Random(seed)
+    fields = sorted(yak.TASK_FIELDS)
+
+    def text() -> str:
+        return "".join(rng.choice(_CODEC_ALPHABET) for _ in range(rng.choice((0, 1, 2, 5, 12, 40, 90))))
+
+    for _ in range(n):
+        doc: dict = {}
+        for k in rng.sample(fields, rng.randint(1, len(fields))):
+            shape = rng.random()
+            if shape < 0.15:
+                doc[k] = rng.randint(-5, 10 ** rng.randint(1, 12))
+            elif shape < 0.3:
+                doc[k] = [text() for _ in range(rng.randint(0, 3))]
+            else:
+                doc[k] = rng.choice(_CODEC_STRINGS) if shape < 0.5 else text()
+        if rng.random() < 0.3:
+            doc["description"] = text()
+        yield doc
+
+
+def _yaml_dump(doc: dict) -> str:
+    """What dump_yaml() writes when the fast path declines."""
+    import yaml
+
+    return yaml.dump(doc, Dumper=yak._yaml_dumper(), default_flow_style=False, sort_keys=False, allow_unicode=True)
+
+
+def _yaml_parse(text: str) -> dict:
+    """parse_task() with yaml.safe_load in place of the fast codec."""
+    import yaml
+
+    end = text.find("\n---", 3)
+    task = yaml.safe_load(text[4:end]) or {}
+    body = text[end + 4:].strip()
+    if body:
+        task["description"] = body
+    return task
+
+
+def bench_codec(args) -> dict:
+    """Compare the fast frontmatter codec with PyYAML on edge cases and seeded random documents."""
+    import yaml
+
+    docs = fast_dumps = fast_loads = 0
+    mismatches = []
+    for doc in _codec_corpus(args.docs, args.seed):
+        docs += 1
+        fm = {k: v for k, v in doc.items() if k != "description"}
+        expected = _yaml_dump(fm)
+        got = yak._fast_dump_frontmatter(fm)
+        if got is not None:
+            fast_dumps += 1
+            if got != expected:
+                mismatches.append({"check": "dump", "doc": repr(doc), "got": got, "expected": expected})
+                continue
+        if yak._fast_load_frontmatter(expected) is not None:
+            fast_loads += 1
+        text = yak.render_task(doc)
+        try:
+            want = _yaml_parse(text)
+        except yaml.YAMLError:
+            want = None
+        got_task = yak.parse_task(text)
+        if got_task != want:
+            mismatches.append({"check": "load", "doc": repr(doc), "got": repr(got_task), "expected": repr(want)})
+    return {"codec": {
+        "documents": docs,
+        "fast_dumps": fast_dumps,
+        "fast_loads": fast_loads,
+        "mismatches": mismatches,
+    }}
+
+
+def _print_codec(results: dict) -> None:
+    r = results["codec"]
+    print(f"{r['documents']} documents: {r['fast_dumps']} dumped and {r['fast_loads']} loaded by the fast path")
+    for m in r["mismatches"][:10]:
+        print(f"  {m['check']} mismatch for {m['doc']}")
+        print(f"    got:      {m['got']!r}")
+        print(f"    expected: {m['expected']!r}")
+    print(f"FAILED: {len(r['mismatches'])} mismatches" if r["mismatches"] else "OK")
+
+
+# ---------------------------------------------------------------------------
+# Concurrent writers
+# ---------------------------------------------------------------------------
+
+
+def _yak(argv: list[str]) -> int:
+    """Run one yak subcommand in this process, returning its exit code."""
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        try:
+            yak._dispatch(argv)
+        except SystemExit as e:
+            return e.code if isinstance(e.code, int) else 1 if e.code else 0
+        except OSError:  # a torn read or a file moved underneath us
+            return 2
+    return 0
+
+
+def _label_writer(args: tuple[str, str, int, int]) -> tuple[int, int]:
+    """Add *n* uniquely named labels to one task, one `update` each."""
+    cwd, tid, worker, n = args
+    os.chdir(cwd)
+    failures = sum(_yak(["update", tid, "--add-label", f"w{worker}-{i}"]) != 0 for i in range(n))
+    return n, failures
+
+
+def _mover(args: tuple[str, str, int, int]) -> tuple[int, int]:
+    """Flip one task between hairy and shaving *n* times."""
+    cwd, tid, _, n = args
+    os.chdir(cwd)
+    failures = sum(_yak(["shave" if i % 2 == 0 else "regrow", tid]) != 0 for i in range(n))
+    return n, failures
+
+
+def _creator(args: tuple[str, str, int, int]) -> tuple[int, int]:
+    """Create *n* children of one task, racing the other creators for child numbers."""
+    cwd, tid, worker, n = args
+    os.chdir(cwd)
+    failures = sum(_yak(["create", "--title", f"c{worker}-{i}", "--parent", tid]) != 0 for i in range(n))
+    return n, failures
+
+
+def _batch_creator(args: tuple[str, str, int, int]) -> tuple[int, int]:
+    """Create *n* children of one task from a single `batch`, whose index stays in memory throughout."""
+    cwd, tid, worker, n = args
+    os.chdir(cwd)
+    ops = Path(cwd) / f"batch-{worker}.jsonl"
+    ops.write_text("".join(json.dumps(["create", "--title", f"b{worker}-{i}", "--parent", tid]) + "\n"
+                           for i in range(n)))
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(io.StringIO()), \
+            contextlib.suppress(SystemExit):
+        yak._dispatch(["batch", "--file", str(ops)])
+    return n, n - sum(json.loads(line)["ok"] for line in out.getvalue().splitlines())
+
+
+def bench_stress(args) -> dict:
+    """Hammer one task from many processes and check that no write was lost."""
+    base = Path(tempfile.mkdtemp(prefix="yaks-stress-"))
+    root = base / ".yaks"
+    make_tree(root, 0)
+    cfg = {"prefix": "bench", "retries": args.retries}
+    if args.fsync:
+        cfg["durability"] = "fsync"
+    (root / "config.yaml").write_text(yak.dump_yaml(cfg))
+    cwd = str(base)
+    os.chdir(cwd)
+    _yak(["create", "--title", "contended"])
+    [(_, target)] = yak.all_tasks(root.resolve())
+    tid = target["id"]
+
+    jobs = [(_label_writer, (cwd, tid, w, args.updates)) for w in range(args.writers)]
+    jobs.append((_mover, (cwd, tid, 0, args.updates)))
+    jobs += [(_creator, (cwd, tid, w, args.updates // 4)) for w in range(2)]
+    jobs.append((_batch_creator, (cwd, tid, 0, args.updates // 4)))
+    start = time.perf_counter()
+    with multiprocessing.Pool(len(jobs)) as pool:
+        results = [pool.apply_async(fn, (a,)) for fn, a in jobs]
+        counts = [r.get() for r in results]
+    elapsed = time.perf_counter() - start
+
+    yak._indexes.clear()
+    tasks = {t["id"]: (s, t) for s, t in yak.all_tasks(root.resolve())}
+    labels = set(tasks[tid][1].get("labels", []))
+    writer_failures = sum(f for _, f in counts[:args.writers])
+    expected = {f"w{w}-{i}" for w in range(args.writers) for i in range(args.updates)}
+    children = [t for t in tasks if t.startswith(tid + ".")]
+    copies = sum(1 for _ in root.rglob(f"{tid}.md"))
+    shutil.rmtree(base)
+    return {"stress": {
+        "writers": args.writers,
+        "operations": sum(n for n, _ in counts) + 1,
+        "seconds": elapsed,
+        "ops_per_second": (sum(n for n, _ in counts) + 1) / elapsed,
+        "failed_operations": sum(f for _, f in counts),
+        "lost_labels": len(expected - labels) - writer_failures,
+        "children_created": len(children),
+        "children_expected": sum(n - f for n, f in counts[-3:]),
+        "copies_of_task": copies,
+        "durability": "fsync" if args.fsync else "rename",
+    }}
+
+
+def _print_stress(results: dict) -> None:
+    r = results["stress"]
+    print(f"{r['operations']} operations from {r['writers'] + 4} processes in {r['seconds']:.2f}s "
+          f"({r['ops_per_second']:.0f}/s, durability={r['durability']})")
+    print(f"  failed (conflict after retries): {r['failed_operations']}")
+    print(f"  lost label updates:              {r['lost_labels']}")
+    print(f"  children created / expected:     {r['children_created']} / {r['children_expected']}")
+    print(f"  copies of the contended task:    {r['copies_of_task']}")
+    ok = r["lost_labels"] == 0 and r["copies_of_task"] == 1 and r["children_created"] == r["children_expected"]
+    print("OK" if ok else "FAILED")
+
+
+# ---------------------------------------------------------------------------
+# Startup
+# ---------------------------------------------------------------------------
+
+STARTUP_COMMANDS = [["--help"], ["show", "bench-000000"], ["list", "--limit", "1"], ["stats", "--json"]]
+
+
+def _run_yak(cwd: Path, argv: list[str], *flags: str) -> subprocess.CompletedProcess:
+    """Run yak.py as a fresh interpreter, as a shell or hook would."""
+    env = {**os.environ, "YAKS_NO_SERVER": "1"}
+    return subprocess.run([sys.executable, *flags, yak.__file__, *argv], cwd=cwd, env=env,
+                          capture_output=True, text=True)
+
+
+def _import_times(cwd: Path, argv: list[str]) -> list[tuple[str, int]]:
+    """Cumulative microseconds per top-level import, from `python -X importtime`."""
+    proc = _run_yak(cwd, argv, "-X", "importtime")
+    times = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (f.strip() for f in line[len("import time:"):].split("|"))
+        if not name.startswith(" "):
+            times.append((name.strip(), int(cumulative)))
+    return times
+
+
+def bench_startup(args) -> dict:
+    tmp = Path(tempfile.mkdtemp(prefix="yaks-bench-"))
+    try:
+        make_tree(tmp / ".yaks", args.tasks)
+        _run_yak(tmp, ["list"])  # build the index once; every run below is warm
+        commands = []
+        for argv in STARTUP_COMMANDS:
+            times = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                _run_yak(tmp, argv)
+                times.append(time.perf_counter() - start)
+            commands.append({"command": " ".join(argv), "seconds": statistics.median(times)})
+        baseline = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", "pass"])
+            baseline.append(time.perf_counter() - start)
+        imports = sorted(_import_times(tmp, ["show", "bench-000000"]), key=lambda t: -t[1])
+    finally:
+        shutil.rmtree(tmp)
+    return {"startup": {
+        "python_seconds": statistics.median(baseline),
+        "commands": commands,
+        "import_seconds": sum(us for _, us in imports) / 1e6,
+        "top_imports": [{"module": m, "seconds": us / 1e6} for m, us in imports[:args.top]],
+    }}
+
+
+def _print_startup(results: dict) -> None:
+    r = results["startup"]
+    print(f"{'command':<24} {'ms':>8}")
+    print(f"{'(python -c pass)':<24} {r['python_seconds'] * 1000:>8.1f}")
+    for c in r["commands"]:
+        print(f"{c['command']:<24} {c['seconds'] * 1000:>8.1f}")
+    print(f"\nimports for `show`: {r['import_seconds'] * 1000:.1f} ms")
+    for t in r["top_imports"]:
+        print(f"  {t['module']:<22} {t['seconds'] * 1000:>8.1f}")
+
+
+# ---------------------------------------------------------------------------
+# Git HEAD
+# ---------------------------------------------------------------------------
+
+
+def _git(cwd: Path, *argv: str, stdin: str | None = None) -> str:
+    proc = subprocess.run(["git", "-c", "user.name=bench", "-c", "user.email=bench@example.com",
+                           "-c", "init.defaultBranch=main", *argv],
+                          cwd=cwd, input=stdin, capture_output=True, text=True, check=True)
+    return proc.stdout.strip()
+
+
+def _commit(repo: Path, name: str) -> None:
+    (repo / name).write_text(name + "\n")
+    _git(repo, "add", name)
+    _git(repo, "commit", "-q", "-m", name)
+
+
+def _rev_parse_short(cwd: Path) -> str | None:
+    proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=cwd, capture_output=True, text=True)
+    return proc.stdout.strip() if proc.returncode == 0 else None
+
+
+def _write_blobs(repo: Path, n: int, packed: bool) -> None:
+    """Add *n* distinct blobs to *repo*, as one pack or as loose objects."""
+    tag = "packed" if packed else "loose"
+    if packed:
+        stream = "".join(f"blob\ndata {len(d)}\n{d}\n" for d in (f"{tag} {i}\n" for i in range(n)))
+        _git(repo, "fast-import", "--quiet", stdin=stream)
+        return
+    objects = repo / ".git" / "objects"
+    for i in range(n):
+        data = f"{tag} {i}\n".encode()
+        obj = b"blob %d\0" % len(data) + data
+        oid = hashlib.sha1(obj).hexdigest()
+        (objects / oid[:2]).mkdir(exist_ok=True)
+        (objects / oid[:2] / oid[2:]).write_bytes(zlib.compress(obj))
+
+
+def _git_layouts(tmp: Path):
+    """Yield (name, cwd) for each repository shape, building them under *tmp*."""
+    repo = tmp / "repo"
+    repo.mkdir()
+    yield "not a repository", repo
+    _git(repo, "init", "-q")
+    yield "unborn branch", repo
+    _commit(repo, "a")
+    yield "loose objects", repo
+    (repo / "sub" / "dir").mkdir(parents=True)
+    yield "subdirectory", repo / "sub" / "dir"
+    _git(repo, "gc", "-q")
+    yield "packed objects and refs", repo
+    _commit(repo, "b")
+    yield "loose ref over packed-refs", repo
+    _git(repo, "checkout", "-q", "--detach", "HEAD~1")
+    yield "detached HEAD", repo
+    _git(repo, "checkout", "-q", "main")
+    _git(repo, "worktree", "add", "-q", "-b", "side", str(tmp / "worktree"))
+    _commit(tmp / "worktree", "c")
+    yield "linked worktree", tmp / "worktree"
+    _git(tmp, "clone", "-q", "--bare", str(repo), str(tmp / "bare.git"))
+    yield "bare repository", tmp / "bare.git"
+    _git(tmp, "init", "-q", "--separate-git-dir", str(tmp / "store"), str(tmp / "gitfile"))
+    _commit(tmp / "gitfile", "d")
+    yield "gitdir file", tmp / "gitfile"
+    _git(tmp, "clone", "-q", "--shared", str(repo), str(tmp / "shared"))
+    yield "alternates (falls back)", tmp / "shared"
+    big = tmp / "big"
+    big.mkdir()
+    _git(big, "init", "-q")
+    _write_blobs(big, 17_000, packed=True)
+    _commit(big, "e")
+    yield "17k packed objects", big
+
+
+def bench_git(args) -> dict:
+    tmp = Path(tempfile.mkdtemp(prefix="yaks-bench-"))
+    cwd = Path.cwd()
+    results = {"layouts": [], "abbreviations": {}, "timing": {}}
+    try:
+        for name, where in _git_layouts(tmp):
+            os.chdir(where)
+            direct = yak.git_head_direct(where)
+            mine, theirs = yak.git_head_short(), _rev_parse_short(where)
+            results["layouts"].append({"layout": name, "direct": direct is not yak._Ask.GIT,
+                                       "yaks": mine, "git": theirs, "match": mine == theirs})
+        timed = tmp / "repo"
+        os.chdir(timed)
+        methods = (("direct", lambda: yak.git_head_direct(timed)), ("subprocess", lambda: _rev_parse_short(timed)))
+        for label, fn in methods:
+            times = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                fn()
+                times.append(time.perf_counter() - start)
+            results["timing"][label] = statistics.median(times)
+
+        # Every object of a store dense enough for 7-digit prefixes to collide,
+        # split between a pack and loose objects.
+        dense = tmp / "dense"
+        dense.mkdir()
+        _git(dense, "init", "-q")
+        _write_blobs(dense, args.objects * 3 // 10, packed=True)
+        _write_blobs(dense, args.objects - args.objects * 3 // 10, packed=False)
+        oids = sorted(_git(dense, "cat-file", "--batch-all-objects", "--batch-check=%(objectname)").split())
+        # `rev-parse --short` takes one object per call, so check every object
+        # sharing a 7-digit prefix with another, plus a random sample.
+        check = set(random.Random(args.seed).sample(oids, min(args.sample, len(oids))))
+        for a, b in zip(oids, oids[1:]):
+            if a[:7] == b[:7]:
+                check.update((a, b))
+        common = dense / ".git"
+        mismatches, longer = [], 0
+        for oid in sorted(check):
+            short, mine = _git(dense, "rev-parse", "--short", oid), yak._abbrev_oid(common, oid)
+            longer += len(short) > 7
+            if mine != short:
+                mismatches.append({"oid": oid, "yaks": mine, "git": short})
+        results["abbreviations"] = {"objects": len(oids), "checked": len(check),
+                                    "longer_than_7": longer, "mismatches": mismatches}
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp)
+    return {"git": results}
+
+
+def _print_git(results: dict) -> None:
+    r = results["git"]
+    print(f"{'layout':<28} {'path':<10} {'yaks':<10} {'git':<10}")
+    for row in r["layouts"]:
+        path = "direct" if row["direct"] else "git"
+        print(f"{row['layout']:<28} {path:<10} {row['yaks'] or '-':<10} {row['git'] or '-':<10}"
+              f"{'' if row['match'] else '  MISMATCH'}")
+    a = r["abbreviations"]
+    print(f"\nabbreviations: checked {a['checked']} of {a['objects']} objects, "
+          f"{a['longer_than_7']} needing more than 7 digits: {len(a['mismatches'])} mismatches")
+    t = r["timing"]
+    print(f"HEAD lookup: {t['direct'] * 1e6:.0f} us direct, {t['subprocess'] * 1e6:.0f} us via git rev-parse")
+    ok = all(row["match"] for row in r["layouts"]) and not a["mismatches"]
+    print("OK" if ok else "FAILED")
+
+
+# ---------------------------------------------------------------------------
+# Transition history
+# ---------------------------------------------------------------------------
+
+
+def _history_repo(repo: Path, commits: int, seed: int) -> None:
+    """A repository with *commits* commits, each creating a task or moving one on."""
+    rng = random.Random(seed)
+    where: dict[str, str] = {}
+    lines = []
+    t = 1_700_000_000
+    for i in range(commits):
+        t += rng.randrange(60, 7200)
+        movable = [tid for tid, s in where.items() if s != yak.SHORN]
+        lines += ["commit refs/heads/main", f"author b <b@example.com> {t} +0000",
+                  f"committer b <b@example.com> {t} +0000", "data 1", "x"]
+        if i and movable and rng.random() < 0.6:
+            tid = rng.choice(movable)
+            src = where[tid]
+            where[tid] = yak.STATUSES[yak.STATUSES.index(src) + 1]
+            lines.append(f"D .yaks/{src}/{tid}.md")
+        else:
+            tid = f"bench-{i:06x}"
+            where[tid] = yak.HAIRY
+        body = yak.render_task({"id": tid, "title": f"Task {tid}"})
+        lines += [f"M 644 inline .yaks/{where[tid]}/{tid}.md", f"data {len(body.encode())}", body]
+        if i == 0:
+            config = yak.dump_yaml({"prefix": "bench", "schema": yak.SCHEMA_VERSION}, yak.CONFIG_FIELDS)
+            lines += ["M 644 inline .yaks/config.yaml", f"data {len(config)}", config]
+    _git(repo, "init", "-q")
+    _git(repo, "fast-import", "--quiet", stdin="\n".join(lines) + "\n")
+    _git(repo, "checkout", "-q", "-f", "main")
+
+
+def _timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def bench_history(args) -> dict:
+    tmp = Path(tempfile.mkdtemp(prefix="yaks-bench-"))
+    try:
+        _history_repo(tmp, args.commits, args.seed)
+        root = tmp / ".yaks"
+        cold = _timed(lambda: yak.task_history(root))
+        warm = _timed(lambda: yak.task_history(root))
+        moved = next((root / yak.HAIRY).iterdir())
+        _git(tmp, "mv", str(moved), str(root / yak.SHAVING / moved.name))
+        _git(tmp, "commit", "-q", "-m", "move")
+        incremental = _timed(lambda: yak.task_history(root))
+        events = yak.task_history(root)
+        # The incremental result has to equal a from-scratch rebuild.
+        (root / yak.HISTORY_FILE).unlink()
+        rebuilt = yak.task_history(root)
+    finally:
+        shutil.rmtree(tmp)
+    return {"history": {
+        "commits": args.commits + 1,
+        "tasks": len(events),
+        "moves": sum(len(t) for t in events.values()),
+        "cold_seconds": cold,
+        "warm_seconds": warm,
+        "one_new_commit_seconds": incremental,
+        "matches_rebuild": events == rebuilt,
+    }}
+
+
+def _print_history(results: dict) -> None:
+    r = results["history"]
+    print(f"{r['commits']} commits, {r['tasks']} tasks, {r['moves']} moves")
+    print(f"  cold (full git log):  {r['cold_seconds'] * 1000:8.1f} ms")
+    print(f"  warm (no new commits): {r['warm_seconds'] * 1000:7.1f} ms")
+    print(f"  one new commit:       {r['one_new_commit_seconds'] * 1000:8.1f} ms")
+    print("OK" if r["matches_rebuild"] else "FAILED: incremental history differs from a rebuild")
+
+
+# ---------------------------------------------------------------------------
+# Task memory
+# ---------------------------------------------------------------------------
+
+
+def _traced_bytes(build):
+    """Run *build* and return (its result, bytes it left allocated)."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        return result, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def _per_task_us(fn, items) -> float:
+    start = time.perf_counter()
+    fn(items)
+    return (time.perf_counter() - start) / len(items) * 1e6
+
+
+def _read_fields(tasks) -> None:
+    """Read every known field of every task, as filtering, sorting and rendering do."""
+    for t in tasks:
+        for key in yak._TASK_ORDER:
+            t.get(key)
+
+
+def bench_memory(args) -> dict:
+    """Bytes per task held as parsed dicts vs Task records, and whether records round-trip.
+
+    Also measures what records would cost a process that keeps the index (`yak serve`):
+    entries loaded from .yaks/.index, every field read back, and the index written out.
+    """
+    results = []
+    for n in args.tasks:
+        base = Path(tempfile.mkdtemp(prefix="yaks-bench-"))
+        root = base / ".yaks"
+        try:
+            make_tree(root, n, args.seed)
+            paths = sorted(root.glob("*/*.md"))
+            texts = [p.read_text() for p in paths]
+            dicts, dict_bytes = _traced_bytes(lambda: [yak.parse_task(t) for t in texts])
+            eager, eager_bytes = _traced_bytes(lambda: [yak.Task.from_dict(yak.parse_task(t)) for t in texts])
+            lazy, lazy_bytes = _traced_bytes(
+                lambda: [yak.Task.from_dict(yak.parse_task(t), p) for t, p in zip(texts, paths)])
+            start = time.perf_counter()
+            for d in dicts:
+                yak.Task.from_dict(d)
+            build = time.perf_counter() - start
+            start = time.perf_counter()
+            for r in eager:
+                r.to_dict()
+            back = time.perf_counter() - start
+            # Lossless means equal values and the same key order.
+            mismatches = sum(r.to_dict() != d or list(r.to_dict()) != list(d)
+                             for records in (eager, lazy) for r, d in zip(records, dicts))
+            yak.task_index(root.resolve())
+            text = (root / yak.INDEX_FILE).read_text()
+            index, index_bytes = _traced_bytes(lambda: json.loads(text)["entries"])
+
+            def load_records():
+                entries = json.loads(text)["entries"]
+                for ent in entries.values():
+                    ent[2] = yak.Task.from_dict(ent[2])
+                return entries
+
+            index_records, index_record_bytes = _traced_bytes(load_records)
+            index_tasks = [ent[2] for ent in index.values()]
+            record_tasks = [ent[2] for ent in index_records.values()]
+            read_dict = _per_task_us(_read_fields, index_tasks)
+            read_record = _per_task_us(_read_fields, record_tasks)
+            dump_dict = _per_task_us(json.dumps, index)
+            dump_record = _per_task_us(lambda e: json.dumps(e, default=yak.Task.to_dict), index_records)
+        finally:
+            shutil.rmtree(base)
+        results.append({
+            "tasks": n,
+            "dict_bytes_per_task": dict_bytes / n,
+            "record_bytes_per_task": eager_bytes / n,
+            "lazy_record_bytes_per_task": lazy_bytes / n,
+            "from_dict_us": build / n * 1e6,
+            "to_dict_us": back / n * 1e6,
+            "round_trip_mismatches": mismatches,
+            "index_dict_bytes_per_task": index_bytes / n,
+            "index_record_bytes_per_task": index_record_bytes / n,
+            "read_fields_dict_us": read_dict,
+            "read_fields_record_us": read_record,
+            "index_dump_dict_us": dump_dict,
+            "index_dump_record_us": dump_record,
+        })
+    return {"memory": results}
+
+
+def _print_memory(results: dict) -> None:
+    print(f"{'tasks':>8} {'dict B':>8} {'record B':>9} {'lazy B':>8} {'from us':>8} {'to us':>7}  round trip")
+    for r in results["memory"]:
+        bad = r["round_trip_mismatches"]
+        print(f"{r['tasks']:>8} {r['dict_bytes_per_task']:>8.0f} {r['record_bytes_per_task']:>9.0f} "
+              f"{r['lazy_record_bytes_per_task']:>8.0f} {r['from_dict_us']:>8.2f} {r['to_dict_us']:>7.2f}  "
+              f"{f'{bad} MISMATCHES' if bad else 'OK'}")
+    print("As loaded from .yaks/.index (what `yak serve` keeps):")
+    print(f"{'tasks':>8} {'dict B':>8} {'record B':>9} {'read dict us':>13} {'read record us':>15} "
+          f"{'dump dict us':>13} {'dump record us':>15}")
+    for r in results["memory"]:
+        print(f"{r['tasks']:>8} {r['index_dict_bytes_per_task']:>8.0f} {r['index_record_bytes_per_task']:>9.0f} "
+              f"{r['read_fields_dict_us']:>13.2f} {r['read_fields_record_us']:>15.2f} "
+              f"{r['index_dump_dict_us']:>13.2f} {r['index_dump_record_us']:>15.2f}")
+
+
+# ---------------------------------------------------------------------------
+# Subcommand suite
+#
+# Every subcommand runs in a fresh interpreter, as a slash command would,
+# against a generated tree. "cold" runs start with no .yaks/.index (a fresh
+# clone); "warm" runs find it current. The OS page cache is warm in both.
+# ---------------------------------------------------------------------------
+
+SUITE_COMMANDS = ("list", "next", "tangled", "search", "stats", "create", "reparent", "import-beads")
+SUITE_MODES = ("cold", "warm")
+
+# Differences smaller than this are noise, whatever the ratio.
+_SUITE_NOISE_SECONDS = 0.005
+_SUITE_NOISE_BYTES = 1 << 20
+
+
+def _run_measured(cwd: Path, argv: list[str]) -> tuple[float, int]:
+    """Run yak.py as a fresh interpreter, returning (seconds, peak RSS in bytes)."""
+    env = {**os.environ, "YAKS_NO_SERVER": "1"}
+    with tempfile.TemporaryFile() as err:
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, yak.__file__, *argv], cwd=cwd, env=env,
+                                stdout=subprocess.DEVNULL, stderr=err)
+        # wait4 rather than wait: it reports the peak RSS of this child alone.
+        _, status, usage = os.wait4(proc.pid, 0)
+        elapsed = time.perf_counter() - start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        if proc.returncode:
+            err.seek(0)
+            raise RuntimeError(f"yak {' '.join(argv)} exited {proc.returncode}: {err.read().decode().strip()}")
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    return elapsed, usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+def _beads_file(path: Path, tag: str, n: int, rng: random.Random) -> None:
+    """Write a beads export of *n* new issues, some blocked on tasks already in the tree."""
+    with open(path, "w") as f:
+        for i in range(n):
+            bead = {"id": f"bead{tag}-{i:04x}", "title": f"Imported {i}", "issue_type": "task",
+                    "priority": rng.randint(0, 4), "status": rng.choice(("open", "in_progress", "closed")),
+                    "created_at": "2025-01-01T00:00:00Z", "description": "Imported from beads.\\n" * 3}
+            if i and rng.random() < 0.3:
+                bead["dependencies"] = [{"type": "blocks", "depends_on_id": f"bead{tag}-{rng.randrange(i):04x}"}]
+            f.write(json.dumps(bead) + "\n")
+
+
+def _suite_argvs(cmd: str, base: Path, n: int, args, rng: random.Random):
+    """Yield one argv per run of *cmd*; write commands get fresh targets each time."""
+    family = sum(args.fanout ** k for k in range(args.depth))
+    tops = [f"bench-{i:06x}" for i in range(1, -(-n // family))]
+    for run in itertools.count():
+        if cmd == "search":
+            yield ["search", "amet"]
+        elif cmd == "stats":
+            yield ["stats", "--json"]
+        elif cmd == "create":
+            yield ["create", "--title", f"Suite task {run}"]
+        elif cmd == "reparent":
+            # A different top-level family each time, moved under the first one.
+            if run >= len(tops):
+                raise RuntimeError(f"a tree of {n} has too few top-level tasks to reparent")
+            yield ["reparent", tops[run], "--parent", "bench-000000"]
+        elif cmd == "import-beads":
+            path = base / f"beads-{run}.jsonl"
+            _beads_file(path, str(run), args.import_size, rng)
+            yield ["import-beads", "--file", str(path)]
+        else:
+            yield [cmd]
+
+
+def _regressions(results: list[dict], baseline: list[dict], threshold: float) -> list[dict]:
+    """Rows slower or bigger than their baseline by more than *threshold* (a fraction)."""
+    before = {(r["tasks"], r["command"], r["mode"]): r for r in baseline}
+    found = []
+    for r in results:
+        b = before.get((r["tasks"], r["command"], r["mode"]))
+        if not b:
+            continue
+        for key, noise in (("seconds", _SUITE_NOISE_SECONDS), ("peak_rss", _SUITE_NOISE_BYTES)):
+            if r[key] > b[key] * (1 + threshold) and r[key] - b[key] > noise:
+                found.append({"tasks": r["tasks"], "command": r["command"], "mode": r["mode"],
+                              "metric": key, "baseline": b[key], "now": r[key], "ratio": r[key] / b[key]})
+    return found
+
+
+def bench_suite(args) -> dict:
+    commands = args.commands or SUITE_COMMANDS
+    rng = random.Random(args.seed)
+    results = []
+    for n in args.tasks:
+        base = Path(tempfile.mkdtemp(prefix="yaks-bench-"))
+        root = base / ".yaks"
+        try:
+            start = time.perf_counter()
+            make_tree(root, n, args.seed, mix=tuple(args.mix), depth=args.depth, fanout=args.fanout,
+                      deps=args.deps, desc=args.desc, layout=args.layout)
+            generated = time.perf_counter() - start
+            # Let the newest files age past the index's racy window, or the
+            # first warm runs would re-read them.
+            time.sleep(max(0.0, yak._RACY_NS / 1e9 - generated))
+            if not args.json:
+                print(f"generated {n} tasks in {generated:.1f}s", file=sys.stderr)
+            for cmd in commands:
+                argvs = _suite_argvs(cmd, base, n, args, rng)
+                for mode in SUITE_MODES:
+                    times, rss = [], []
+                    for _ in range(args.runs):
+                        if mode == "cold":
+                            (root / yak.INDEX_FILE).unlink(missing_ok=True)
+                        t, m = _run_measured(base, next(argvs))
+                        times.append(t)
+                        rss.append(m)
+                    results.append({"tasks": n, "command": cmd, "mode": mode,
+                                    "seconds": statistics.median(times), "peak_rss": max(rss)})
+        finally:
+            shutil.rmtree(base)
+    out = {
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "params": {"mix": args.mix, "depth": args.depth, "fanout": args.fanout, "deps": args.deps,
+                   "desc": args.desc, "layout": args.layout, "runs": args.runs, "seed": args.seed},
+        "results": results,
+    }
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())["suite"]["results"]
+        out["threshold"] = args.threshold
+        out["regressions"] = _regressions(results, baseline, args.threshold)
+    if args.output:
+        Path(args.output).write_text(json.dumps({"suite": out}, indent=2) + "\n")
+    return {"suite": out}
+
+
+def _print_suite(results: dict) -> None:
+    r = results["suite"]
+    print(f"{'tasks':>8} {'command':<14} {'cold ms':>9} {'warm ms':>9} {'peak MB':>8}")
+    rows: dict[tuple, dict] = {}
+    for row in r["results"]:
+        rows.setdefault((row["tasks"], row["command"]), {})[row["mode"]] = row
+    for (n, cmd), modes in rows.items():
+        peak = max(m["peak_rss"] for m in modes.values()) / (1 << 20)
+        cold, warm = (modes[m]["seconds"] * 1000 if m in modes else float("nan") for m in SUITE_MODES)
+        print(f"{n:>8} {cmd:<14} {cold:>9.1f} {warm:>9.1f} {peak:>8.1f}")
+    if "regressions" not in r:
+        return
+    for g in r["regressions"]:
+        unit = (lambda v: f"{v * 1000:.1f} ms") if g["metric"] == "seconds" else (lambda v: f"{v / (1 << 20):.1f} MB")
+        print(f"REGRESSION {g['tasks']} {g['command']} {g['mode']}: {g['metric']} "
+              f"{unit(g['baseline'])} -> {unit(g['now'])} ({g['ratio']:.2f}x)")
+    print("FAILED" if r["regressions"] else f"OK (threshold {r['threshold']:.0%})")
+
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="bench", description="Benchmarks for the yaks task tracker")
+    sub = p.add_subparsers(dest="bench")
+
+    sp = sub.add_parser("ids", help="ID allocation probes and collision rates")
+    sp.add_argument("--tasks", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                    help="Repository sizes to simulate")
+    sp.add_argument("--trials", type=int, default=1, help="Repetitions per size")
+    sp.add_argument("--seed", type=int, default=0, help="Random seed")
+    sp.add_argument("--cold", action="store_true", help="Give the allocator no task-count estimate")
+    sp.add_argument("--json", action="store_true", help="JSON output")
+
+    sp = sub.add_parser("load", help="Cold index rebuild: serial vs thread pool vs process pool")
+    sp.add_argument("--tasks", type=int, nargs="+", default=[1_000, 10_000], help="Repository sizes to generate")
+    sp.add_argument("--dir", help="Benchmark an existing .yaks directory instead (its load_* settings are overwritten)")
+    sp.add_argument("--processes", type=int, default=4, help="Parser processes for the process-pool run")
+    sp.add_argument("--trials", type=int, default=3, help="Repetitions per mode (best is reported)")
+    sp.add_argument("--seed", type=int, default=0, help="Random seed")
+    sp.add_argument("--json", action="store_true", help="JSON output")
+
+    sp = sub.add_parser("codec", help="Fast frontmatter codec vs PyYAML on edge cases and random documents")
+    sp.add_argument("--docs", type=int, default=20_000, help="Random documents besides the edge cases (default: 20000)")
+    sp.add_argument("--seed", type=int, default=0, help="Random seed")
+    sp.add_argument("--json", action="store_true", help="JSON output")
+
+    sp = sub.add_parser("stress", help="Concurrent writers on one task: check for lost updates")
+    sp.add_argument("--writers", type=int, default=4, help="Processes adding labels (default: 4)")
+    sp.add_argument("--updates", type=int, default=50, help="Operations per process (default: 50)")
+    sp.add_argument("--retries", type=int, default=20, help="CAS retries per operation (default: 20)")
+    sp.add_argument("--fsync", action="store_true", help="Use durability: fsync")
+    sp.add_argument("--json", action="store_true", help="JSON output")
+
+    sp = sub.add_parser("startup", help="Wall time and imports of trivial commands in fresh processes")
+    sp.add_argument("--tasks", type=int, default=1_000, help="Size of the generated repository (default: 1000)")
+    sp.add_argument("--runs", type=int, default=10, help="Runs per command (median is reported)")
+    sp.add_argument("--top", type=int, default=8, help="Slowest imports to list (default: 8)")
+    sp.add_argument("--json", action="store_true", help="JSON output")
+
+    sp = sub.add_parser("git", help="In-process HEAD lookup vs git rev-parse across repository layouts")
+    sp.add_argument("--objects", type=int, default=40_000,
+                    help="Objects in the abbreviation check (default: 40000)")
+    sp.add_argument("--sample", type=int, default=200, help="Random objects compared besides the colliding ones")
+    sp.add_argument("--seed", type=int, default=0, help="Random seed")
+    sp.add_argument("--runs", type=int, default=20, help="Timed lookups per method (median is reported)")
+    sp.add_argument("--json", action="store_true", help="JSON output")
+
+    sp = sub.add_parser("history", help="Transition history: full git log pass vs cached vs incremental")
+    sp.add_argument("--commits", type=int, default=10_000, help="Commits in the generated repository (default: 10000)")
+    sp.add_argument("--seed", type=int, default=0, help="Random seed")
+    sp.add_argument("--json", action="store_true", help="JSON output")
+
+    sp = sub.add_parser("memory", help="Memory per task: parsed dicts vs compact Task records")
+    sp.add_argument("--tasks", type=int, nargs="+", default=[10_000, 100_000], help="Tree sizes to generate")
+    sp.add_argument("--seed", type=int, default=0, help="Random seed")
+    sp.add_argument("--json", action="store_true", help="JSON output")
+
+    sp = sub.add_parser("suite", help="Time every subcommand, cold and warm, on generated trees")
+    sp.add_argument("--tasks", type=int, nargs="+", default=[1_000, 10_000],
+                    help="Tree sizes to generate (default: 1000 10000; up to 1000000)")
+    sp.add_argument("--commands", nargs="+", choices=SUITE_COMMANDS, help="Subcommands to time (default: all)")
+    sp.add_argument("--mix", type=int, nargs=3, default=[6, 1, 3], metavar=("HAIRY", "SHAVING", "SHORN"),
+                    help="Relative weights of the statuses (default: 6 1 3)")
+    sp.add_argument("--depth", type=int, default=1, help="Levels per family; 1 means no children (default: 1)")
+    sp.add_argument("--fanout", type=int, default=4, help="Children per task when --depth > 1 (default: 4)")
+    sp.add_argument("--deps", type=float, default=0.3, help="Chance a task depends on an earlier one (default: 0.3)")
+    sp.add_argument("--desc", type=int, default=19,
+                    help="Most sentences in a description, 28 bytes each; 0 for none (default: 19)")
+    sp.add_argument("--layout", choices=yak.LAYOUTS, default=yak.FLAT, help="On-disk layout (default: flat)")
+    sp.add_argument("--import-size", type=int, default=100, help="Issues per import-beads run (default: 100)")
+    sp.add_argument("--runs", type=int, default=3, help="Runs per command and mode (median is reported)")
+    sp.add_argument("--seed", type=int, default=0, help="Random seed")
+    sp.add_argument("--output", metavar="FILE", help="Also write the JSON results here")
+    sp.add_argument("--baseline", metavar="FILE", help="Earlier --output to compare against; exit 1 on a regression")
+    sp.add_argument("--threshold", type=float, default=0.25,
+                    help="Slowdown or RSS growth that counts as a regression, as a fraction (default: 0.25)")
+    sp.add_argument("--json", action="store_true", help="JSON output")
+
+    return p
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    if not args.bench:
+        parser.print_help()
+        sys.exit(1)
+
+    benches = {
+        "ids": (bench_ids, _print_ids),
+        "load": (bench_load, _print_load),
+        "codec": (bench_codec, _print_codec),
+        "stress": (bench_stress, _print_stress),
+        "startup": (bench_startup, _print_startup),
+        "git": (bench_git, _print_git),
+        "history": (bench_history, _print_history),
+        "memory": (bench_memory, _print_memory),
+        "suite": (bench_suite, _print_suite),
+    }
+    run, show = benches[args.bench]
+    results = run(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        show(results)
+    if results.get("suite", {}).get("regressions") or results.get("codec", {}).get("mismatches"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,16 +4,37 @@
 # ///
 """Filesystem-native task tracker. Markdown files with YAML frontmatter, no database, no daemon."""
 
-import argparse
+import base64
+import bisect
+import contextlib
+import enum
+import functools
+import heapq
+import io
+import itertools
 import json
-import random
-import string
-import subprocess
+import operator
+import os
+import re
 import sys
-from datetime import datetime, timezone
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
-import yaml
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# argparse, PyYAML, subprocess, socket, random, traceback and the executor
+# pools are imported where they are used: most commands never touch some of
+# them, and a command forwarded to `yak serve` needs none. Together they would
+# roughly double startup time (see `bench.py startup`). typing is one of them:
+# type checkers read the block below as true, the interpreter skips it.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import NoReturn
 
 # ---------------------------------------------------------------------------
 # Status constants
@@ -39,44 +60,447 @@ def _resolve_status(name: str) -> str:
 # YAML helpers
 # ---------------------------------------------------------------------------
 
-class _BlockScalarDumper(yaml.SafeDumper):
-    """Dumper that uses block scalars for multiline strings."""
+@functools.cache
+def _yaml_dumper():
+    """PyYAML's SafeDumper, set up to use block scalars for multiline strings."""
+    import yaml
+
+    class _BlockScalarDumper(yaml.SafeDumper):
+        pass
+
+    def _str_representer(dumper, data: str):
+        if "\n" in data:
+            return dumper.represent_scalar("tag:yaml.org,2002:str", data, style="|")
+        return dumper.represent_scalar("tag:yaml.org,2002:str", data)
 
+    _BlockScalarDumper.add_representer(str, _str_representer)
+    return _BlockScalarDumper
 
-def _str_representer(dumper: _BlockScalarDumper, data: str):
-    if "\n" in data:
-        return dumper.represent_scalar("tag:yaml.org,2002:str", data, style="|")
-    return dumper.represent_scalar("tag:yaml.org,2002:str", data)
 
+def load_yaml(text: str):
+    import yaml
 
-_BlockScalarDumper.add_representer(str, _str_representer)
+    # libyaml's emitter wraps and terminates documents differently from
+    # PyYAML's, so only the loader uses the C implementation; task files must
+    # stay byte-identical to what _yaml_dumper() writes.
+    return yaml.load(text, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
 
 
-def dump_yaml(data: dict) -> str:
-    return yaml.dump(data, Dumper=_BlockScalarDumper, default_flow_style=False,
+def dump_yaml(data: dict, fields: frozenset[str] | None = None) -> str:
+    fast = _fast_dump_frontmatter(data, fields or TASK_FIELDS)
+    if fast is not None:
+        return fast
+    import yaml
+
+    return yaml.dump(data, Dumper=_yaml_dumper(), default_flow_style=False,
                      sort_keys=False, allow_unicode=True)
 
 
+# ---------------------------------------------------------------------------
+# Frontmatter codec
+#
+# Task frontmatter is a flat mapping of a few known keys to strings, ints and
+# lists of strings. The fast path below parses and emits exactly that shape,
+# reproducing PyYAML's scalar style decisions, and returns None for anything
+# else so the caller falls back to the full YAML implementation.
+# ---------------------------------------------------------------------------
+
+TASK_FIELDS = frozenset({"id", "title", "type", "priority", "created", "updated", "depends_on", "labels", "commit"})
+# config.yaml keys the fast path may read and write; anything else goes through PyYAML.
+CONFIG_FIELDS = frozenset({"prefix", "schema", "layout", "default_type", "default_priority",
+                           "load_threads", "load_processes", "retries", "durability", "roots"})
+
+# YAML 1.1 implicit resolvers, as registered by yaml.resolver.Resolver.
+_YAML_BOOLS = frozenset("yes Yes YES no No NO true True TRUE false False FALSE on On ON off Off OFF".split())
+_YAML_NULLS = frozenset(("~", "null", "Null", "NULL"))
+_YAML_FLOAT_RE = re.compile(r"""^(?:[-+]?(?:[0-9][0-9_]*)\.[0-9_]*(?:[eE][-+][0-9]+)?
+                    |\.[0-9][0-9_]*(?:[eE][-+][0-9]+)?
+                    |[-+]?[0-9][0-9_]*(?::[0-5]?[0-9])+\.[0-9_]*
+                    |[-+]?\.(?:inf|Inf|INF)
+                    |\.(?:nan|NaN|NAN))$""", re.X)
+_YAML_INT_RE = re.compile(r"""^(?:[-+]?0b[0-1_]+
+                    |[-+]?0[0-7_]+
+                    |[-+]?(?:0|[1-9][0-9_]*)
+                    |[-+]?0x[0-9a-fA-F_]+
+                    |[-+]?[1-9][0-9_]*(?::[0-5]?[0-9])+)$""", re.X)
+_YAML_TIMESTAMP_RE = re.compile(r"""^(?:[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]
+                    |[0-9][0-9][0-9][0-9] -[0-9][0-9]? -[0-9][0-9]?
+                     (?:[Tt]|[ \t]+)[0-9][0-9]?
+                     :[0-9][0-9] :[0-9][0-9] (?:\.[0-9]*)?
+                     (?:[ \t]*(?:Z|[-+][0-9][0-9]?(?::[0-9][0-9])?))?)$""", re.X)
+_DECIMAL_RE = re.compile(r"-?(?:0|[1-9][0-9]*)")
+
+# Characters PyYAML (with allow_unicode) emits without escaping. The full
+# Unicode class takes milliseconds to compile, so it waits for non-ASCII input.
+_ASCII_PRINTABLE_RE = re.compile("[\x20-\x7e]*")
+
+
+@functools.cache
+def _unicode_printable_re() -> re.Pattern:
+    return re.compile("[\x20-\x7e\xa0-\u2027\u202a-\ud7ff\ue000-\ufefe\uff00-\ufffd\U00010000-\U0010ffff]*")
+
+
+def _printable(v: str) -> bool:
+    pattern = _ASCII_PRINTABLE_RE if v.isascii() else _unicode_printable_re()
+    return pattern.fullmatch(v) is not None
+
+
+_PLAIN_FIRST_BAD = frozenset("#,[]{}&*!|>'\"%@`")
+
+# Past this line length PyYAML starts folding scalars; leave those to it.
+_MAX_FAST_LINE = 80
+
+
+def _plain_resolves_to_str(v: str) -> bool:
+    """True if the plain scalar *v* would load back as a string."""
+    if not v:
+        return False
+    c = v[0]
+    if c in "yYnNtTfFoO" and v in _YAML_BOOLS:
+        return False
+    if c in "~nN" and v in _YAML_NULLS:
+        return False
+    if c in "-+0123456789." and (_YAML_FLOAT_RE.match(v) or _YAML_INT_RE.match(v)):
+        return False
+    if c in "0123456789" and _YAML_TIMESTAMP_RE.match(v):
+        return False
+    return v not in ("<<", "=", "!", "&", "*")
+
+
+def _fast_scalar(v: str) -> str | None:
+    """Render the single-line string *v* as _yaml_dumper() would, or None."""
+    if not _printable(v):
+        return None
+    plain = (
+        _plain_resolves_to_str(v)
+        and v[0] != " " and v[-1] != " "
+        and v[0] not in _PLAIN_FIRST_BAD
+        and not (v[0] in "?:-" and v[1:2] in ("", " "))
+        and not v.startswith(("---", "..."))
+        and ": " not in v and not v.endswith(":")
+        and " #" not in v
+    )
+    if plain:
+        return v
+    return "'" + v.replace("'", "''") + "'"
+
+
+def _fast_block(v: str) -> list[str] | None:
+    """Render the multiline string *v* as _yaml_dumper()'s literal block, or None."""
+    if v.endswith("\n\n") or v == "\n":
+        return None  # keep-chomping (|+) can also end the document with "..."
+    lines = v.split("\n")
+    if any(line.endswith(" ") or not _printable(line) for line in lines):
+        return None  # PyYAML double-quotes these instead
+    header = "|2" if v[0] in " \n" else "|"
+    if v.endswith("\n"):
+        lines.pop()
+    else:
+        header += "-"
+    return [header] + [f"  {line}" if line else "" for line in lines]
+
+
+def _fast_dump_frontmatter(data: dict, fields: frozenset[str] = TASK_FIELDS) -> str | None:
+    lines = []
+    for k, v in data.items():
+        if k not in fields:
+            return None
+        if type(v) is int:
+            lines.append(f"{k}: {v}")
+        elif type(v) is str and "\n" in v:
+            block = _fast_block(v)
+            if block is None:
+                return None
+            lines.append(f"{k}: {block[0]}")
+            lines.extend(block[1:])
+        elif type(v) is str:
+            r = _fast_scalar(v)
+            if r is None:
+                return None
+            lines.append(f"{k}: {r}")
+        elif type(v) is list:
+            if not v:
+                lines.append(f"{k}: []")
+                continue
+            lines.append(f"{k}:")
+            for item in v:
+                if type(item) is int:
+                    lines.append(f"- {item}")
+                elif type(item) is str and (r := _fast_scalar(item)) is not None:
+                    lines.append(f"- {r}")
+                else:
+                    return None
+        else:
+            return None
+    # Only the indented lines of literal blocks are exempt: PyYAML never folds those.
+    if not lines or any(len(line) > _MAX_FAST_LINE and line[:2] != "  " for line in lines):
+        return None
+    lines.append("")
+    return "\n".join(lines)
+
+
+_NO_VALUE = object()
+
+
+def _fast_parse_scalar(raw: str):
+    """Parse a single-line scalar as YAML would, or return _NO_VALUE if unsure."""
+    if not raw or raw != raw.strip() or not _printable(raw):
+        return _NO_VALUE
+    c = raw[0]
+    if c == "'":
+        inner = raw[1:-1]
+        if len(raw) < 2 or raw[-1] != "'" or "'" in inner.replace("''", ""):
+            return _NO_VALUE
+        return inner.replace("''", "'")
+    if c == '"':
+        inner = raw[1:-1]
+        if len(raw) < 2 or raw[-1] != '"' or '"' in inner or "\\" in inner:
+            return _NO_VALUE
+        return inner
+    if raw == "[]":
+        return []
+    if c in _PLAIN_FIRST_BAD or (c in "?:-" and raw[1:2] in ("", " ")):
+        return _NO_VALUE
+    if ": " in raw or raw.endswith(":") or " #" in raw:
+        return _NO_VALUE
+    if _DECIMAL_RE.fullmatch(raw):
+        return int(raw)
+    if _plain_resolves_to_str(raw):
+        return raw
+    return _NO_VALUE
+
+
+def _fast_load_frontmatter(fm: str, fields: frozenset[str] = TASK_FIELDS) -> dict | None:
+    task: dict = {}
+    seq_key = None  # key whose block sequence items we are collecting
+    seq_indent = -1
+    for line in fm.split("\n"):
+        if not line:
+            continue
+        stripped = line.lstrip(" ")
+        if stripped.startswith("- ") and seq_key is not None:
+            indent = len(line) - len(stripped)
+            if seq_indent < 0:
+                seq_indent = indent
+            elif indent != seq_indent:
+                return None
+            item = _fast_parse_scalar(stripped[2:])
+            if item is _NO_VALUE or type(item) is list:
+                return None
+            task[seq_key].append(item)
+            continue
+        if seq_key is not None and not task[seq_key]:
+            return None  # "key:" with no items is null, not a list
+        seq_key = None
+        key, sep, raw = line.partition(":")
+        if not sep or key not in fields or key in task:
+            return None
+        if not raw:
+            task[key] = []
+            seq_key = key
+            seq_indent = -1
+            continue
+        if raw[0] != " ":
+            return None
+        value = _fast_parse_scalar(raw[1:])
+        if value is _NO_VALUE:
+            return None
+        task[key] = value
+    if seq_key is not None and not task[seq_key]:
+        return None
+    return task
+
+
+def load_frontmatter(fm: str) -> dict:
+    """Parse a frontmatter block, using the fast path when the schema allows."""
+    task = _fast_load_frontmatter(fm)
+    if task is None:
+        task = load_yaml(fm) or {}
+        if _trace:
+            _trace.count("parsed_yaml")
+    elif _trace:
+        _trace.count("parsed_fast")
+    return task
+
+
+# ---------------------------------------------------------------------------
+# Tracing
+#
+# `--trace FILE` (or YAKS_TRACE=FILE) records how long each phase of a
+# command took, plus file, byte and parse counts, and writes them as JSON
+# or, with `--trace-format chrome`, as Chrome trace events for
+# chrome://tracing or Perfetto. While no trace is running `_trace` is None,
+# and every hook below is a global lookup and a branch.
+# ---------------------------------------------------------------------------
+
+TRACE_FORMATS = ("json", "chrome")
+
+
+class _Tracer:
+    """Nested phase timings and counters for one command."""
+
+    def __init__(self, argv: list[str], start_ns: int):
+        import threading
+
+        self.argv = argv
+        self.start = start_ns
+        self.events: list[dict] = []  # completed spans, as Chrome "X" events
+        self.phases: dict[str, list[int]] = {}  # name -> [calls, total ns, self ns]
+        self.counters: dict[str, int] = {}
+        self._open: list[int] = [0]  # ns spent in child phases, per open phase
+        self._lock = threading.Lock()  # counters are also bumped from reader threads
+        self._main = threading.get_ident()  # phases are only timed on this thread
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def _close(self, name: str, t0: int, t1: int, child: int, span: bool = True) -> None:
+        dur = t1 - t0
+        self._open[-1] += dur
+        ph = self.phases.setdefault(name, [0, 0, 0])
+        ph[0] += 1
+        ph[1] += dur
+        ph[2] += dur - child
+        if span:
+            self.events.append({"name": name, "ph": "X", "ts": (t0 - self.start) / 1000, "dur": dur / 1000,
+                                "pid": os.getpid(), "tid": 0})
+
+    def span(self, name: str, t0: int, t1: int) -> None:
+        """Record a phase that has already finished."""
+        self._close(name, t0, t1, 0)
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        import threading
+
+        if threading.get_ident() != self._main:
+            yield  # e.g. roots loaded in parallel; only their counters are kept
+            return
+        t0 = time.perf_counter_ns()
+        self._open.append(0)
+        try:
+            yield
+        finally:
+            child = self._open.pop()
+            self._close(name, t0, time.perf_counter_ns(), child)
+
+    def timed(self, name: str, fn):
+        """Wrap a per-task callback so its time is summed under *name* without a span per call."""
+        def inner(*a):
+            t0 = time.perf_counter_ns()
+            try:
+                return fn(*a)
+            finally:
+                self._close(name, t0, time.perf_counter_ns(), 0, span=False)
+        return inner
+
+    def summary(self, end_ns: int) -> dict:
+        ms = lambda ns: round(ns / 1e6, 3)  # noqa: E731
+        return {
+            "argv": self.argv,
+            "wall_ms": ms(end_ns - self.start),
+            "phases": {name: {"calls": c, "ms": ms(total), "self_ms": ms(own)}
+                       for name, (c, total, own) in sorted(self.phases.items(), key=lambda p: -p[1][2])},
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def write(self, path: str, fmt: str) -> None:
+        end = time.perf_counter_ns()
+        summary = self.summary(end)
+        if fmt == "chrome":
+            counters = {"name": "counters", "ph": "C", "ts": (end - self.start) / 1000, "pid": os.getpid(),
+                        "tid": 0, "args": summary["counters"]}
+            data = {"traceEvents": [*self.events, counters], "displayTimeUnit": "ms", "otherData": summary}
+        else:
+            data = summary
+        text = json.dumps(data, indent=2, default=str) + "\n"
+        if path == "-":
+            sys.stderr.write(text)
+        else:
+            Path(path).write_text(text)
+
+
+_trace: _Tracer | None = None
+_NO_PHASE = contextlib.nullcontext()
+
+
+def _phase(name: str):
+    """Context manager timing a phase of the running trace, if any."""
+    return _trace.phase(name) if _trace else _NO_PHASE
+
+
+def _traced(name: str):
+    """Decorator: time every call of the function as phase *name*."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*a, **kw):
+            if _trace is None:
+                return fn(*a, **kw)
+            with _trace.phase(name):
+                return fn(*a, **kw)
+        return inner
+    return wrap
+
+
+def _run_diagnosed(args, fn, start_ns: int, parsed_ns: int):
+    """Run command *fn* under --trace and/or --profile."""
+    global _trace
+
+    profiler = None
+    if args.trace:
+        _trace = _Tracer(sys.argv[1:], start_ns)
+        _trace.span("args", start_ns, parsed_ns)
+    if args.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+    try:
+        with _phase("command"):
+            if profiler:
+                return profiler.runcall(fn, args)
+            return fn(args)
+    finally:
+        if _trace:
+            _trace.write(args.trace, args.trace_format)
+            _trace = None
+        if profiler:
+            import pstats
+
+            profiler.dump_stats(args.profile)
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(20)
+
+
 # ---------------------------------------------------------------------------
 # Filesystem helpers
 # ---------------------------------------------------------------------------
 
 def find_tasks_root(start: Path | None = None) -> Path:
     """Walk up from *start* (default cwd) looking for a `.yaks/` directory."""
+    with _phase("discover"):
+        root = _locate_yaks_dir(start)
+    if root is None:
+        print("error: no .yaks/ directory found (run /yaks:init first)", file=sys.stderr)
+        sys.exit(1)
+    with _phase("schema"):
+        _check_schema(root)
+    with _phase("journal"):
+        _recover_journal(root)
+    return root
+
+
+def _locate_yaks_dir(start: Path | None = None) -> Path | None:
+    """Like find_tasks_root() but without migrating or exiting on failure."""
     p = (start or Path.cwd()).resolve()
     while True:
-        candidate = p / ".yaks"
-        if candidate.is_dir():
-            _auto_migrate(candidate)
-            return candidate
+        if (p / ".yaks").is_dir():
+            return p / ".yaks"
         if p.parent == p:
-            break
+            return None
         p = p.parent
-    print("error: no .yaks/ directory found (run /yaks:init first)", file=sys.stderr)
-    sys.exit(1)
 
 
-def _auto_migrate(root: Path) -> None:
+def _migrate_yaml_to_md(root: Path) -> None:
     """Migrate legacy .yaml task files to .md with frontmatter."""
     migrated = []
     for s in STATUSES:
@@ -84,19 +508,10 @@ def _auto_migrate(root: Path) -> None:
         if not d.exists():
             continue
         for f in sorted(d.glob("*.yaml")):
-            task = yaml.safe_load(f.read_text()) or {}
+            task = load_yaml(f.read_text()) or {}
             if not task:
                 continue
-            md_path = f.with_suffix(".md")
-            description = task.pop("description", None)
-            fm = dump_yaml(task)
-            parts = ["---\n", fm, "---\n"]
-            if description:
-                parts.append("\n")
-                parts.append(description)
-                if not description.endswith("\n"):
-                    parts.append("\n")
-            md_path.write_text("".join(parts))
+            f.with_suffix(".md").write_text(render_task(task))
             f.unlink()
             migrated.append(f"{s}/{f.stem}")
     if migrated:
@@ -105,86 +520,961 @@ def _auto_migrate(root: Path) -> None:
             print(f"  {name}")
 
 
+def _has_yaml_tasks(root: Path) -> bool:
+    return any(next((root / s).glob("*.yaml"), None) for s in STATUSES)
+
+
+# Storage schema, recorded as `schema:` in config.yaml. Trees without one are
+# version 1, which may still hold legacy .yaml task files.
+SCHEMA_VERSION = 2
+
+# (schema version it produces, whether the tree still needs it, migration,
+# safe to run unasked on startup). A migration that rewrites files people
+# may have open should not be automatic; startup then refuses to run until
+# `yak migrate` is used.
+_MIGRATIONS = [
+    (2, _has_yaml_tasks, _migrate_yaml_to_md, True),
+]
+
+# Roots found to need no migration despite an old `schema:`, so the check
+# is not repeated for every request a resident server handles.
+_schema_current: set[Path] = set()
+
+
+def schema_version(root: Path) -> int:
+    return int(cached_config(root).get("schema", 1))
+
+
+def migrate(root: Path) -> list[int]:
+    """Run every pending migration in order, recording each new schema version as it lands."""
+    applied = []
+    with repo_lock(root):
+        current = schema_version(root)
+        for version, needed, fn, _ in _MIGRATIONS:
+            if version > current:
+                if needed(root):
+                    fn(root)
+                    applied.append(version)
+                _set_config_line(root, "schema", version)
+    return applied
+
+
+def _check_schema(root: Path) -> None:
+    """On startup, bring an old tree up to date if that is safe, or say how to."""
+    current = schema_version(root)
+    if current == SCHEMA_VERSION or root in _schema_current:
+        return
+    if current > SCHEMA_VERSION:
+        print(f"error: .yaks/ uses storage schema {current}, but this yak.py only knows up to "
+              f"{SCHEMA_VERSION}; upgrade yaks", file=sys.stderr)
+        sys.exit(1)
+    pending = [auto for version, needed, _, auto in _MIGRATIONS if version > current and needed(root)]
+    if not pending:
+        # Nothing to convert, so run as current without touching config.yaml:
+        # it may be read-only, and read commands should not dirty a checkout.
+        _schema_current.add(root)
+        return
+    if not all(pending):
+        print(f"error: .yaks/ is at storage schema {current} and needs `yak migrate` "
+              f"(to {SCHEMA_VERSION}) before use", file=sys.stderr)
+        sys.exit(1)
+    try:
+        migrate(root)
+    except OSError as e:
+        print(f"error: .yaks/ needs upgrading to storage schema {SCHEMA_VERSION} but cannot be "
+              f"written: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
 def load_config(root: Path) -> dict:
     cfg_path = root / "config.yaml"
     if cfg_path.exists():
-        return yaml.safe_load(cfg_path.read_text()) or {}
+        text = cfg_path.read_text()
+        cfg = _fast_load_frontmatter(text, CONFIG_FIELDS)
+        return cfg if cfg is not None else load_yaml(text) or {}
     return {}
 
 
+def save_config(root: Path, cfg: dict) -> None:
+    _atomic_write(root / "config.yaml", dump_yaml(cfg, CONFIG_FIELDS))
+    _configs.pop(root, None)
+
+
+def _set_config_line(root: Path, key: str, value) -> None:
+    """Set top-level *key* in config.yaml by rewriting only its line, keeping comments and order."""
+    path = root / "config.yaml"
+    text = path.read_text() if path.exists() else ""
+    line = f"{key}: {value}"
+    text, n = re.subn(rf"^{re.escape(key)}:.*$", line, text, count=1, flags=re.M)
+    if not n:
+        text += ("\n" if text and not text.endswith("\n") else "") + line + "\n"
+    _atomic_write(path, text)
+    _configs.pop(root, None)
+
+
+# Storage layouts. "flat" keeps every task directly in its status dir;
+# "sharded" fans each status dir out into 256 hashed subdirectories.
+FLAT = "flat"
+SHARDED = "sharded"
+LAYOUTS = (FLAT, SHARDED)
+
+# In-process cache: root -> ((config.yaml mtime_ns, size), config).
+_configs: dict[Path, tuple[tuple[int, int], dict]] = {}
+
+
+def cached_config(root: Path) -> dict:
+    """load_config() for hot paths: re-read only when config.yaml changes. Do not mutate."""
+    try:
+        st = (root / "config.yaml").stat()
+    except FileNotFoundError:
+        return {}
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _configs.get(root)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    cfg = load_config(root)
+    _configs[root] = (stamp, cfg)
+    return cfg
+
+
+def storage_layout(root: Path) -> str:
+    """Return the layout recorded in config.yaml (default: flat)."""
+    return cached_config(root).get("layout", FLAT)
+
+
+def shard_of(task_id: str) -> str:
+    """Shard directory for a task, hashed from its top-level ancestor so a family stays together."""
+    top = task_id.split(".", 1)[0]
+    return f"{zlib.crc32(top.encode()) & 0xff:02x}"
+
+
+def task_path(root: Path, status: str, task_id: str) -> Path:
+    """Where the task file for *task_id* belongs in *status* under the current layout."""
+    if storage_layout(root) == SHARDED:
+        return root / status / shard_of(task_id) / f"{task_id}.md"
+    return root / status / f"{task_id}.md"
+
+
+def _task_paths(root: Path, status: str, task_id: str) -> tuple[Path, ...]:
+    """Every place *task_id* may live in *status*: its layout path, then the flat path.
+
+    Checking the flat path too keeps a half-finished `yak layout` migration
+    readable, since files are moved into shards one at a time.
+    """
+    flat = root / status / f"{task_id}.md"
+    if storage_layout(root) == SHARDED:
+        return root / status / shard_of(task_id) / f"{task_id}.md", flat
+    return (flat,)
+
+
+def _task_rel(path: Path) -> tuple[Path, str]:
+    """Split a task file path into (tasks root, index key relative to it)."""
+    d = path.parent if path.parent.name in STATUSES else path.parent.parent
+    return d.parent, f"{d.name}/{path.relative_to(d).as_posix()}"
+
+
+def split_task(text: str) -> tuple[str, str] | None:
+    """Split a `.md` task file into (frontmatter, description), or None without frontmatter."""
+    # Frontmatter sits between --- fences
+    if not text.startswith("---"):
+        return None
+    end = text.find("\n---", 3)
+    if end < 0:
+        return None
+    fm = text[4:end]  # skip opening "---\n"
+    body = text[end + 4:]  # skip closing "\n---"
+    return fm, body.strip()
+
+
+def parse_task(text: str) -> dict:
+    """Parse the contents of a `.md` task file into a task dict."""
+    parts = split_task(text)
+    if parts is None:
+        return {}
+    fm, body = parts
+    task = load_frontmatter(fm)
+    if body:
+        task["description"] = body
+    return task
+
+
 def load_task(path: Path) -> dict:
     text = path.read_text()
     if path.suffix == ".md":
-        # Parse frontmatter between --- fences
-        if not text.startswith("---"):
-            return {}
-        end = text.find("\n---", 3)
-        if end < 0:
-            return {}
-        fm = text[4:end]  # skip opening "---\n"
-        body = text[end + 4:]  # skip closing "\n---"
-        task = yaml.safe_load(fm) or {}
-        body = body.strip()
-        if body:
-            task["description"] = body
-        return task
+        return parse_task(text)
     # Legacy .yaml fallback (for migration)
-    return yaml.safe_load(text) or {}
+    return load_yaml(text) or {}
 
 
-def save_task(path: Path, task: dict) -> None:
+def render_task(task: dict) -> str:
+    """Return the file contents for *task*: frontmatter, then the description body."""
     task = dict(task)  # shallow copy
     description = task.pop("description", None)
     fm = dump_yaml(task)
+    if not fm.endswith("\n"):
+        fm += "\n"  # PyYAML may end on a Unicode line break, which would hide the closing fence
     parts = ["---\n", fm, "---\n"]
     if description:
         parts.append("\n")
         parts.append(description)
         if not description.endswith("\n"):
             parts.append("\n")
-    path.write_text("".join(parts))
+    return "".join(parts)
 
 
-def all_tasks(root: Path, status: str | None = None) -> list[tuple[str, dict]]:
-    """Return list of (status, task_dict) for tasks in the given status dir(s)."""
-    dirs = []
-    for s in STATUSES:
-        if status is None or status == s:
-            dirs.append((s, root / s))
+def save_task(path: Path, task: dict) -> None:
+    _atomic_write(path, render_task(task), _fsync_writes(_task_rel(path)[0]))
+    _index_put(path, dict(task))
+
+
+def _atomic_write(path: Path, text: str, sync: bool = False) -> None:
+    """Replace *path* with *text* via a temp file, so readers never see a partial write.
+
+    With *sync*, the data and the rename are flushed to disk before returning.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        f.write(text)
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+    if sync:
+        _fsync_dir(path.parent)
+
+
+def _fsync_dir(d: Path) -> None:
+    fd = os.open(d, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _fsync_writes(root: Path) -> bool:
+    """True if config.yaml asks for `durability: fsync` (default: atomic renames, no fsync)."""
+    return cached_config(root).get("durability") == "fsync"
+
+
+# ---------------------------------------------------------------------------
+# Locking and compare-and-swap writes
+#
+# Writers take `.yaks/.lock` (flock) only around the moment they check and
+# replace files. Single-task edits are optimistic: the new contents are
+# computed outside the lock and written only if the file is unchanged.
+# ---------------------------------------------------------------------------
+
+LOCK_FILE = ".lock"
+
+# root -> [fd, depth] for locks this process holds, so nested critical
+# sections (a move that first unarchives, say) don't wait on themselves.
+_locks: dict[Path, list[int]] = {}
+
+
+@contextlib.contextmanager
+def repo_lock(root: Path):
+    """Hold the repository write lock for the duration of the block. Keep blocks short."""
+    held = _locks.get(root)
+    if held:
+        held[1] += 1
+        try:
+            yield
+        finally:
+            held[1] -= 1
+        return
+    if fcntl is None:  # no flock on this platform
+        yield
+        return
+    path = root / LOCK_FILE
+    created = not path.exists()
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        _locks[root] = [fd, 1]
+        try:
+            if created:
+                _ensure_gitignore(root, LOCK_FILE)
+            yield
+        finally:
+            del _locks[root]
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def mutate_task(root: Path, task_id: str, edit, dest_status: str | None = None,
+                expect_updated: str | None = None) -> dict | None:
+    """Read-modify-write one task without losing concurrent updates.
+
+    *edit(status, task)* changes the task dict in place, or returns False to
+    skip the write. It runs outside the lock; the result is written under
+    it, and only if the file is still exactly what *edit* saw (`updated`
+    has one-second resolution, too coarse to tell writers apart). Otherwise
+    *edit* is re-run on the new contents, up to `retries` times from
+    config.yaml (default 3), before failing with a conflict error.
+    *expect_updated* is an explicit compare-and-swap on the `updated` field
+    and is never retried. With *dest_status* the file also moves there.
+
+    Returns the task as written, or None if *edit* declined.
+    """
+    retries = int(cached_config(root).get("retries", 3))
+    for _ in range(retries + 1):
+        found = find_task_file(root, task_id)
+        if not found:
+            # It may have been mid-move between the directories we probed.
+            with repo_lock(root):
+                found = find_task_file(root, task_id)
+            if not found:
+                _task_not_found(root, task_id)
+        status, path = found
+        try:
+            text = path.read_text()
+        except FileNotFoundError:
+            continue  # moved since we looked it up
+        task = parse_task(text)
+        if expect_updated is not None and str(task.get("updated")) != expect_updated:
+            print(f"error: conflict: {task_id} was updated at {task.get('updated')}, "
+                  f"not {expect_updated}; re-read it and try again", file=sys.stderr)
+            sys.exit(1)
+        if edit(status, task) is False:
+            return None
+        task["updated"] = now_iso()
+        with repo_lock(root):
+            try:
+                if path.read_text() != text:
+                    continue
+            except FileNotFoundError:
+                continue
+            dest = path
+            if dest_status and dest_status != status:
+                dest = task_path(root, dest_status, task_id)
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                path.rename(dest)
+                _index_forget(path)
+            save_task(dest, task)
+            return task
+    print(f"error: conflict: {task_id} kept changing under other writers; try again", file=sys.stderr)
+    sys.exit(1)
+
+
+# ---------------------------------------------------------------------------
+# Journaled multi-file operations
+#
+# An operation that touches several task files (reparent) first records the
+# complete set of writes and deletes in `.yaks/.journal`, then applies them.
+# Replaying a journal is idempotent, so a crash at any point after it is
+# written is finished by the next command to find the tasks root.
+# ---------------------------------------------------------------------------
+
+JOURNAL_FILE = ".journal"
+
+
+def _apply_journal(root: Path, journal: dict) -> None:
+    sync = _fsync_writes(root)
+    for rel, text in journal["writes"]:
+        _atomic_write(root / rel, text, sync)
+    for rel in journal["deletes"]:
+        (root / rel).unlink(missing_ok=True)
+
+
+def run_journaled(root: Path, writes: list[tuple[Path, dict]], deletes: list[Path]) -> None:
+    """Write every (path, task) in *writes*, then delete *deletes*, as one recoverable unit."""
+    journal = {
+        "writes": [(str(p.relative_to(root)), render_task(t)) for p, t in writes],
+        "deletes": [str(p.relative_to(root)) for p in deletes],
+    }
+    jpath = root / JOURNAL_FILE
+    tmp = root / f"{JOURNAL_FILE}.{os.getpid()}.tmp"
+    with repo_lock(root):
+        with open(tmp, "w") as f:
+            json.dump(journal, f)
+            f.flush()
+            os.fsync(f.fileno())
+        _ensure_gitignore(root, JOURNAL_FILE)
+        os.replace(tmp, jpath)  # commit point
+        _apply_journal(root, journal)
+        jpath.unlink()
+    for p, t in writes:
+        _index_put(p, dict(t))
+    for p in deletes:
+        _index_forget(p)
+
+
+def _recover_journal(root: Path) -> None:
+    """Finish an operation interrupted after its journal was committed."""
+    jpath = root / JOURNAL_FILE
+    if not jpath.exists():
+        return
+    with repo_lock(root):
+        try:  # the writer may have finished while we waited for the lock
+            journal = json.loads(jpath.read_text())
+        except FileNotFoundError:
+            return
+        _apply_journal(root, journal)
+        jpath.unlink()
+    print(f"(completed an interrupted operation: {len(journal['writes'])} write(s), "
+          f"{len(journal['deletes'])} delete(s))", file=sys.stderr)
+
+
+# ---------------------------------------------------------------------------
+# Frontmatter index
+# ---------------------------------------------------------------------------
+
+INDEX_FILE = ".index"
+_INDEX_VERSION = 3
+# Query postings live apart from the index, so only `query` pays to load them.
+POSTINGS_FILE = ".postings"
+_POSTINGS_VERSION = 1
+
+# Files modified this recently are re-parsed on the next scan even if their
+# mtime and size match, since a same-size rewrite within the filesystem's
+# timestamp granularity would otherwise go unnoticed.
+_RACY_NS = 2_000_000_000
+
+# In-process cache of loaded indexes, keyed by tasks root.
+_indexes: dict[Path, dict] = {}
+_postings: dict[Path, dict] = {}
+
+# Roots whose in-memory index is authoritative for the rest of this process
+# (see _trusted_index); scans are skipped and writes update it directly.
+_trusted: set[Path] = set()
+
+
+def _index_trusted(root: Path) -> bool:
+    """True if lookups under *root* may skip the filesystem.
+
+    Never while this process holds the repo lock: whatever a write decides
+    there (is this ID free, what is the next child number) must see other
+    writers' files, not a view that may be stale.
+    """
+    return root in _trusted and root not in _locks
+
+
+# Temp files are written next to their targets and renamed over them
+# (`.NAME.PID.tmp`, see _atomic_write); a crash can leave one behind.
+_TMP_PATTERN = ".*.tmp"
+
+
+def _ensure_gitignore(root: Path, name: str) -> None:
+    """Make sure *name*, and the temp-file pattern, are listed in `.yaks/.gitignore`."""
+    gi = root / ".gitignore"
+    wanted = (name, _TMP_PATTERN)
+    if gi.exists() and all(n in gi.read_text().splitlines() for n in wanted):
+        return
+    with repo_lock(root):  # re-read under the lock so concurrent additions aren't lost
+        lines = gi.read_text().splitlines() if gi.exists() else []
+        missing = [n for n in wanted if n not in lines]
+        if missing:
+            _atomic_write(gi, "\n".join(lines + missing) + "\n")
+
+
+@_traced("index.read")
+def _read_index(root: Path) -> dict:
+    try:
+        text = (root / INDEX_FILE).read_text()
+        if _trace:
+            _trace.count("index_bytes", len(text))
+        idx = json.loads(text)
+    except (OSError, ValueError):
+        return {"version": _INDEX_VERSION, "entries": {}}
+    if not isinstance(idx, dict) or idx.get("version") != _INDEX_VERSION:
+        return {"version": _INDEX_VERSION, "entries": {}}
+    return idx
+
+
+def _write_cache(root: Path, name: str, data: dict) -> None:
+    tmp = root / f"{name}.{os.getpid()}.tmp"
+    try:
+        # default=sorted writes the query postings' sets as sorted lists.
+        tmp.write_text(json.dumps(data, separators=(",", ":"), default=sorted))
+        os.replace(tmp, root / name)
+    except OSError:
+        # Caches only; a read-only checkout still works.
+        tmp.unlink(missing_ok=True)
+        return
+    _ensure_gitignore(root, name)
+
+
+@_traced("index.write")
+def _write_index(root: Path, idx: dict) -> None:
+    _write_cache(root, INDEX_FILE, idx)
+
+
+# Fewer stale files than this are loaded serially: pool startup would cost
+# more than the reads it overlaps.
+_PARALLEL_MIN = 64
+# Default reader threads. Reads mostly wait on the filesystem, so this is
+# sized for latency rather than core count.
+_LOAD_THREADS = 16
+# Files per pool job; one future per file costs more than a local read.
+_LOAD_CHUNK = 16
+
+
+def _read_texts(paths: list[Path]) -> list[str]:
+    texts = [p.read_text() for p in paths]
+    if _trace:
+        _trace.count("files_read", len(texts))
+        _trace.count("bytes_read", sum(map(len, texts)))  # characters; the same as bytes for ASCII
+    return texts
+
+
+def load_tasks(root: Path, paths: list[Path]) -> list[dict]:
+    """Load many `.md` task files, returning their task dicts in the order given.
+
+    Large batches are read on a thread pool so per-file latency (cold page
+    cache, network filesystems) overlaps, while this thread parses chunks as
+    they arrive. config.yaml can tune this: `load_threads` sets the pool size
+    (default 16; 1 forces serial loading), and `load_processes: N` moves
+    parsing onto N worker processes, which only pays off when parsing rather
+    than I/O dominates on a multi-core machine.
+    """
+    cfg = cached_config(root)
+    threads = int(cfg.get("load_threads") or _LOAD_THREADS)
+    processes = int(cfg.get("load_processes") or 0)
+    if len(paths) < _PARALLEL_MIN or threads <= 1:
+        return [parse_task(text) for text in _read_texts(paths)]
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    chunks = [paths[i:i + _LOAD_CHUNK] for i in range(0, len(paths), _LOAD_CHUNK)]
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        texts = pool.map(_read_texts, chunks)
+        if processes <= 1:
+            return [parse_task(text) for chunk in texts for text in chunk]
+        texts = [text for chunk in texts for text in chunk]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        chunk = max(1, len(texts) // (processes * 4))
+        return list(pool.map(parse_task, texts, chunksize=chunk))
+
+
+def _status_files(root: Path, status: str) -> list[tuple[str, os.DirEntry]]:
+    """List the task files in one status dir, shard subdirectories included, as (index key, entry)."""
+    found = []
+
+    def scan(d: str, prefix: str) -> None:
+        try:
+            it = os.scandir(d)
+        except FileNotFoundError:
+            return
+        with it:
+            for e in it:
+                if e.name.endswith(".md"):
+                    found.append((prefix + e.name, e))
+                elif e.is_dir() and prefix.count("/") == 1:
+                    scan(e.path, f"{prefix}{e.name}/")  # shard subdirectory
+
+    scan(str(root / status), f"{status}/")
+    return found
+
+
+def _load_index(root: Path) -> dict:
+    idx = _indexes.get(root)
+    if idx is None:
+        idx = _indexes[root] = _read_index(root)
+    return idx
+
+
+def task_index(root: Path) -> dict[str, list]:
+    """Return the frontmatter index for *root*, refreshed against the filesystem.
+
+    Maps each task file's path relative to the root ("status/name.md", or
+    "status/shard/name.md" when sharded) to [mtime_ns, size, task_dict]. Only files whose
+    mtime or size changed since the last scan are re-parsed; the result is
+    persisted to `.yaks/.index` whenever anything changed.
+    """
+    idx = _load_index(root)
+    entries = idx["entries"]
+    if _index_trusted(root):
+        return entries
+    racy_after = time.time_ns() - _RACY_NS
+    seen = set()
+    dirty = False
+    stale: list[tuple[str, Path, int, int]] = []
+    with _phase("scan"):
+        for s in STATUSES:
+            for rel, e in _status_files(root, s):
+                seen.add(rel)
+                st = e.stat()
+                ent = entries.get(rel)
+                if ent and ent[0] == st.st_mtime_ns and ent[1] == st.st_size:
+                    continue
+                mtime = 0 if st.st_mtime_ns >= racy_after else st.st_mtime_ns
+                stale.append((rel, Path(e.path), mtime, st.st_size))
+    if _trace:
+        _trace.count("files_listed", len(seen))
+    if stale:
+        with _phase("load"):
+            tasks = load_tasks(root, [path for _, path, _, _ in stale])
+        for (rel, _, mtime, size), task in zip(stale, tasks):
+            _set_entry(idx, rel, [mtime, size, task])
+        dirty = True
+    for rel in entries.keys() - seen:
+        _del_entry(idx, rel)
+        dirty = True
+    if dirty:
+        _write_index(root, idx)
+    return entries
+
+
+def _index_put(path: Path, task: dict) -> None:
+    """Record a task we just wrote in the in-memory index, if one is loaded."""
+    root, rel = _task_rel(path)
+    idx = _indexes.get(root)
+    if idx is not None:
+        # mtime 0: a file we just wrote is always racy, so the next
+        # untrusted scan re-parses it rather than trusting this entry.
+        _set_entry(idx, rel, [0, path.stat().st_size, task])
+
+
+def _index_forget(path: Path) -> None:
+    """Drop a task file we just renamed or deleted from the in-memory index."""
+    root, rel = _task_rel(path)
+    idx = _indexes.get(root)
+    if idx is not None:
+        _del_entry(idx, rel)
+
+
+def _day(value) -> str | None:
+    dt = parse_timestamp(value)
+    return dt.date().isoformat() if dt else None
+
+
+def _stats_keys(status: str, task: dict) -> list[tuple[str, str]]:
+    """The (aggregate, key) counters one task contributes to `stats`."""
+    keys = [("status", status),
+            ("type", str(task.get("type", "unknown"))),
+            ("priority", str(task.get("priority", 0)))]
+    keys += [("label", str(label)) for label in task.get("labels") or ()]
+    tid = str(task.get("id", ""))
+    if "." in tid:
+        top = tid.split(".", 1)[0]
+        keys.append(("family", top))
+        if status != SHORN:
+            keys.append(("family_open", top))
+    created = _day(task.get("created"))
+    if created:
+        keys.append(("created", created))
+        if status != SHORN:
+            keys.append((f"created_{status}", created))
+    if status == SHORN:
+        shorn = _day(task.get("updated"))
+        if shorn:
+            keys.append(("shorn", shorn))
+    return keys
+
+
+def _stats_add(stats: dict, rel: str, task: dict, sign: int) -> None:
+    if not task:
+        return
+    for kind, key in _stats_keys(rel[:rel.index("/")], task):
+        counts = stats.setdefault(kind, {})
+        n = counts.get(key, 0) + sign
+        if n:
+            counts[key] = n
+        else:
+            del counts[key]
+            if not counts:
+                del stats[kind]
+
+
+# Fields whose presence `has:FIELD` queries can answer from the postings.
+_POSTED_HAS = ("depends_on", "labels", "commit")
+
+
+def _posting_keys(status: str, task: dict) -> list[tuple[str, str]]:
+    """The (posting, value) lists one task is filed under for `query`."""
+    keys = [("status", status),
+            ("type", str(task.get("type", ""))),
+            ("priority", str(task.get("priority", "")))]
+    keys += [("label", str(label)) for label in task.get("labels") or ()]
+    for field in ("created", "updated"):
+        day = _day(task.get(field))
+        if day:
+            keys.append((field, day))
+    keys += [("has", field) for field in _POSTED_HAS if task.get(field)]
+    return keys
+
+
+def _posting(values: dict, key: str) -> set[str]:
+    """The set of index keys filed under *key*; lists loaded from disk become sets on first use."""
+    rels = values.get(key)
+    if isinstance(rels, set):
+        return rels
+    loaded: set[str] = set(rels or ())
+    values[key] = loaded
+    return loaded
+
+
+def _postings_add(postings: dict, rel: str, task: dict) -> None:
+    if not task:
+        return
+    for kind, key in _posting_keys(rel[:rel.index("/")], task):
+        _posting(postings.setdefault(kind, {}), key).add(rel)
+
+
+def _postings_drop(postings: dict, rels: set[str]) -> None:
+    """Remove *rels* from every posting list, dropping lists left empty."""
+    for kind, values in list(postings.items()):
+        for key in list(values):
+            left = _posting(values, key)
+            left -= rels
+            if not left:
+                del values[key]
+        if not values:
+            del postings[kind]
+
+
+def _set_entry(idx: dict, rel: str, entry: list) -> None:
+    """Store an index entry, keeping the stats aggregates (if built) in step.
+
+    Only frontmatter is indexed: the task's description is dropped from the
+    stored dict, and commands that need it read the file.
+    """
+    if entry[2]:
+        entry[2].pop("description", None)
+    old = idx["entries"].get(rel)
+    stats = idx.get("stats")
+    if stats is not None:
+        if old:
+            _stats_add(stats, rel, old[2], -1)
+        _stats_add(stats, rel, entry[2], 1)
+    idx["entries"][rel] = entry
+
+
+def _del_entry(idx: dict, rel: str) -> None:
+    old = idx["entries"].pop(rel, None)
+    stats = idx.get("stats")
+    if old and stats is not None:
+        _stats_add(stats, rel, old[2], -1)
+
+
+def index_stats(root: Path) -> dict[str, dict[str, int]]:
+    """Return aggregate counters over every task, refreshed against the filesystem.
+
+    The counters live in the index next to the entries and are adjusted as
+    entries change, so reading them costs a scan but never a walk over
+    every task. They are built from the entries the first time they're asked for.
+    """
+    task_index(root)
+    idx = _indexes[root]
+    if "stats" not in idx:
+        stats: dict[str, dict[str, int]] = {}
+        for rel, ent in idx["entries"].items():
+            _stats_add(stats, rel, ent[2], 1)
+        idx["stats"] = stats
+        _write_index(root, idx)
+    return idx["stats"]
+
+
+def _read_postings(root: Path) -> dict:
+    try:
+        cache = json.loads((root / POSTINGS_FILE).read_text())
+    except (OSError, ValueError):
+        cache = None
+    if not isinstance(cache, dict) or cache.get("version") != _POSTINGS_VERSION:
+        return {"version": _POSTINGS_VERSION, "stamps": {}, "postings": {}}
+    return cache
+
+
+def index_postings(root: Path) -> dict[str, dict[str, set[str]]]:
+    """Return the query postings, {kind: {value: index keys}}, refreshed against the filesystem.
+
+    They are kept in `.yaks/.postings`, which only `query` reads, with the
+    [mtime_ns, size] each index key was filed at. Keys whose stamp no longer
+    matches the refreshed index are re-filed, and the file is rewritten only
+    when something was.
+    """
+    entries = task_index(root)
+    cache = _postings.get(root)
+    if cache is None:
+        cache = _postings[root] = _read_postings(root)
+    stamps, postings = cache["stamps"], cache["postings"]
+    changed = [rel for rel, ent in entries.items() if stamps.get(rel) != ent[:2]]
+    gone = stamps.keys() - entries.keys()
+    if not changed and not gone:
+        return postings
+    if len(changed) + len(gone) > len(entries) // 8:
+        postings.clear()  # cheaper to file everything again than to pick out this much
+        stamps.clear()
+        changed = list(entries)
+    else:
+        _postings_drop(postings, gone.union(changed))
+        for rel in gone:
+            del stamps[rel]
+    for rel in changed:
+        ent = entries[rel]
+        _postings_add(postings, rel, ent[2])
+        stamps[rel] = ent[:2]
+    _write_cache(root, POSTINGS_FILE, cache)
+    return postings
+
+
+@contextlib.contextmanager
+def _trusted_index(root: Path):
+    """Scan *root* once and treat the in-memory index as authoritative inside the block.
+
+    Reads inside the block don't notice changes made by other processes.
+    Lookups made under repo_lock still go to the filesystem (see
+    _index_trusted), so writes never act on a stale view.
+    """
+    task_index(root)
+    _trusted.add(root)
+    try:
+        yield
+    finally:
+        _trusted.discard(root)
+        _write_index(root, _indexes[root])
+
+
+def _indexed(root: Path, status: str | None = None) -> list[tuple[str, str, dict, Path]]:
+    """Return (status, stem, task_dict, path) from the index, sorted by status dir then filename."""
+    entries = task_index(root)
     results = []
-    for s, d in dirs:
-        if not d.exists():
-            continue
-        for f in sorted(d.glob("*.md")):
-            task = load_task(f)
-            if task:
-                results.append((s, task))
+    for rel in entries:
+        s = rel[:rel.index("/")]
+        if status is None or status == s:
+            name = rel[rel.rindex("/") + 1:]
+            results.append((s, name[:-3], entries[rel][2], root / rel))
+    # "hairy" < "shaving" < "shorn" matches STATUSES order
+    results.sort(key=lambda r: (r[0], r[1]))
     return results
 
 
+# Files per step when streaming: big enough for load_tasks() to overlap
+# reads, small enough that output starts almost immediately.
+_STREAM_WINDOW = 256
+
+
+def iter_tasks(root: Path, status: str | None = None, id_prefix: str = "", where=None):
+    """Lazily yield (status, task_dict) in all_tasks() order, filtering as early as possible.
+
+    Only the requested status dirs are listed, and files whose name doesn't
+    start with *id_prefix* are skipped before they are opened. The rest come
+    from the index when fresh or are parsed a window at a time, then must
+    satisfy *where(task)*. Stopping early leaves later files unread; whatever
+    was parsed is still saved to the index.
+    """
+    if _index_trusted(root):
+        for s, stem, task, _ in _indexed(root, status):
+            if task and stem.startswith(id_prefix) and (where is None or where(task)):
+                yield s, task
+        return
+    idx = _load_index(root)
+    entries = idx["entries"]
+    racy_after = time.time_ns() - _RACY_NS
+    dirty = False
+    if _trace and where is not None:
+        where = _trace.timed("filter", where)
+    try:
+        for s in STATUSES if status is None else (status,):
+            with _phase("scan"):
+                files = sorted((e.name[:-3], rel, e) for rel, e in _status_files(root, s)
+                               if e.name.startswith(id_prefix))
+            if _trace:
+                _trace.count("files_listed", len(files))
+            for i in range(0, len(files), _STREAM_WINDOW):
+                tasks = []
+                stale = []
+                for _, rel, e in files[i:i + _STREAM_WINDOW]:
+                    st = e.stat()
+                    ent = entries.get(rel)
+                    if ent and ent[0] == st.st_mtime_ns and ent[1] == st.st_size:
+                        tasks.append(ent[2])
+                        continue
+                    mtime = 0 if st.st_mtime_ns >= racy_after else st.st_mtime_ns
+                    stale.append((len(tasks), rel, Path(e.path), mtime, st.st_size))
+                    tasks.append(None)
+                if stale:
+                    with _phase("load"):
+                        loaded = load_tasks(root, [path for _, _, path, _, _ in stale])
+                    for (j, rel, _, mtime, size), task in zip(stale, loaded):
+                        _set_entry(idx, rel, [mtime, size, task])
+                        tasks[j] = task
+                    dirty = True
+                for task in tasks:
+                    if task and (where is None or where(task)):
+                        yield s, task
+    finally:
+        if dirty:
+            _write_index(root, idx)
+
+
+def all_tasks(root: Path, status: str | None = None) -> list[tuple[str, dict]]:
+    """Return list of (status, task_dict) for tasks in the given status dir(s)."""
+    return [(s, t) for s, _, t, _ in _indexed(root, status) if t]
+
+
+def reverse_deps(root: Path) -> dict[str, list[tuple[str, Path]]]:
+    """Map each task ID to the (status, path) of every task whose depends_on names it."""
+    rev: dict[str, list[tuple[str, Path]]] = {}
+    for s, _, task, path in _indexed(root):
+        for d in task.get("depends_on") or ():
+            rev.setdefault(d, []).append((s, path))
+    return rev
+
+
 def find_task_file(root: Path, task_id: str) -> tuple[str, Path] | None:
     """Locate a task file by ID, searching all dirs. Returns (status, path)."""
+    if _index_trusted(root):
+        entries = _indexes[root]["entries"]
+        for status_dir in STATUSES:
+            for p in _task_paths(root, status_dir, task_id):
+                if _task_rel(p)[1] in entries:
+                    return status_dir, p
+        return None
     for status_dir in STATUSES:
-        p = root / status_dir / f"{task_id}.md"
-        if p.exists():
-            return status_dir, p
+        for p in _task_paths(root, status_dir, task_id):
+            if p.exists():
+                return status_dir, p
+    return None
+
+
+# Random ID suffixes start at this many hex digits and widen as the tree
+# grows, keeping the chance that a fresh suffix is taken under 1/16.
+_MIN_ID_WIDTH = 4
+_MAX_ID_WIDTH = 16
+_ID_LOAD_FACTOR = 16
+# Collisions tolerated at one width before widening by a digit.
+_ID_ATTEMPTS_PER_WIDTH = 4
+
+
+def _id_width(known: int) -> int:
+    """Smallest suffix width whose space is at least _ID_LOAD_FACTOR times *known*."""
+    width = _MIN_ID_WIDTH
+    while width < _MAX_ID_WIDTH and known * _ID_LOAD_FACTOR > 16 ** width:
+        width += 1
+    return width
+
+
+def allocate_id(prefix: str, taken, known: int = 0) -> str | None:
+    """Pick a random `{prefix}-{hex}` ID for which taken(id) is false.
+
+    *known* is an estimate of how many tasks exist and only sets the starting
+    width; repeated collisions widen the suffix on their own, so a stale or
+    missing estimate costs a few extra probes rather than a failure.
+    """
+    import random
+
+    for width in range(_id_width(known), _MAX_ID_WIDTH + 1):
+        for _ in range(_ID_ATTEMPTS_PER_WIDTH):
+            tid = f"{prefix}-{random.getrandbits(4 * width):0{width}x}"
+            if not taken(tid):
+                return tid
     return None
 
 
 def generate_id(root: Path, prefix: str) -> str:
-    """Generate a collision-free task ID."""
-    existing = set()
-    for d in (root / s for s in STATUSES):
-        if d.exists():
-            for f in d.glob("*.md"):
-                existing.add(f.stem)
-    for _ in range(100):
-        suffix = "".join(random.choices(string.hexdigits[:16], k=4))
-        tid = f"{prefix}-{suffix}"
-        if tid not in existing:
-            return tid
-    print("error: could not generate unique ID after 100 attempts", file=sys.stderr)
-    sys.exit(1)
+    """Generate a collision-free task ID, probing candidates individually."""
+    idx = _indexes.get(root)
+    # Size the suffix from the index when this process already holds one.
+    # create loads none, so it starts at the minimum width and lets
+    # collisions widen it rather than listing every status directory.
+    known = len(idx["entries"]) if idx else 0
+    tid = allocate_id(prefix, lambda t: task_exists(root, t), known)
+    if tid is None:
+        print("error: could not generate a unique ID", file=sys.stderr)
+        sys.exit(1)
+    return tid
 
 
 def now_iso() -> str:
@@ -206,56 +1496,334 @@ def find_children(root: Path, task_id: str) -> list[tuple[str, dict]]:
     """Return (status, task_dict) for all direct children of task_id, sorted by child number."""
     prefix = task_id + "."
     children = []
-    for s in STATUSES:
-        d = root / s
-        if not d.exists():
+    for s, rel, e in _named_files(root, prefix):
+        # Only direct children: stem after prefix must be a plain integer
+        suffix = e.name[len(prefix):-3]
+        if not suffix.isdigit():
             continue
-        for f in d.glob(f"{prefix}*.md"):
-            # Only direct children: stem after prefix must be a plain integer
-            suffix = f.stem[len(prefix):]
-            if suffix.isdigit():
-                task = load_task(f)
-                if task:
-                    children.append((s, task, int(suffix)))
+        try:
+            task = _listed_task(root, rel, e)
+        except FileNotFoundError:
+            continue  # moved since the listing
+        if task:
+            children.append((s, task, int(suffix)))
+    for task in iter_archived(root, prefix):
+        suffix = task.get("id", "")[len(prefix):]
+        if suffix.isdigit():
+            children.append((SHORN, task, int(suffix)))
     children.sort(key=lambda x: x[2])
     return [(s, t) for s, t, _ in children]
 
 
+def _named_files(root: Path, prefix: str) -> list[tuple[str, str, os.DirEntry]]:
+    """(status, index key, entry) for every task file whose name starts with *prefix*, from listings alone."""
+    return [(s, rel, e) for s in STATUSES for rel, e in _status_files(root, s) if e.name.startswith(prefix)]
+
+
+def _listed_task(root: Path, rel: str, e: os.DirEntry) -> dict:
+    """One listed task: its entry in a loaded index while still fresh, else parsed from the file.
+
+    For commands that only need a handful of tasks, where reading and
+    refreshing the whole index would cost far more than the files.
+    """
+    idx = _indexes.get(root)
+    ent = idx["entries"].get(rel) if idx else None
+    if ent:
+        st = e.stat()
+        if ent[0] == st.st_mtime_ns and ent[1] == st.st_size:
+            return ent[2]
+    return load_task(Path(e.path))
+
+
 def next_child_number(root: Path, task_id: str) -> int:
     """Return the next available child number for task_id."""
     prefix = task_id + "."
     max_n = 0
-    for s in STATUSES:
-        d = root / s
-        if not d.exists():
+    stems = [e.name[:-3] for _, _, e in _named_files(root, prefix)]
+    for stem in stems + list(archive_index(root)):
+        if not stem.startswith(prefix):
             continue
-        for f in d.glob(f"{prefix}*.md"):
-            suffix = f.stem[len(prefix):]
-            # Only count direct children (plain integer suffix)
-            if suffix.isdigit():
-                max_n = max(max_n, int(suffix))
+        suffix = stem[len(prefix):]
+        # Only count direct children (plain integer suffix)
+        if suffix.isdigit():
+            max_n = max(max_n, int(suffix))
     return max_n + 1
 
 
 def find_descendants(root: Path, task_id: str) -> list[tuple[str, Path]]:
     """Return (status, path) for all descendants of task_id at any depth."""
     prefix = task_id + "."
-    descendants = []
-    for s in STATUSES:
-        d = root / s
-        if not d.exists():
+    return sorted((s, Path(e.path)) for s, _, e in _named_files(root, prefix))
+
+
+def _child_number(task_id: str) -> int:
+    return int(task_id[task_id.rfind(".") + 1:])
+
+
+@_traced("hierarchy")
+def task_hierarchy(root: Path) -> tuple[dict[str, tuple[str, dict | None]], dict[str, list[str]], list[str]]:
+    """Build the whole parent/child forest from one pass over the index.
+
+    Returns (nodes, children, tops): nodes maps every ID to (status, task),
+    with task None for archived tasks (not decompressed here); children maps
+    a parent to its direct children in child-number order; tops lists, in ID
+    order, the tasks whose parent does not exist.
+    """
+    nodes: dict[str, tuple[str, dict | None]] = {tid: (SHORN, None) for tid in archive_index(root)}
+    # Straight from the index: the order is fixed up below, so all_tasks()'s sort is not needed.
+    for rel, (_, _, t) in task_index(root).items():
+        if t and t.get("id"):
+            nodes[t["id"]] = (rel[:rel.index("/")], t)
+    children: dict[str, list[str]] = {}
+    tops = []
+    for tid in nodes:
+        pid = parent_id(tid)
+        if pid in nodes:
+            children.setdefault(pid, []).append(tid)
+        else:
+            tops.append(tid)
+    for kids in children.values():
+        kids.sort(key=_child_number)
+    tops.sort()
+    return nodes, children, tops
+
+
+def tree_rollups(nodes: dict[str, tuple[str, dict | None]]) -> dict[str, list[int]]:
+    """Return id -> [tasks, shorn, blocked] for each task's subtree, itself included.
+
+    Blocked means tangled: hairy with a dependency that is not shorn. A
+    child's ID is its parent's plus a suffix, so visiting longer IDs (by dot
+    count) first settles every child before its parent, at any depth.
+    """
+    roll = {}
+    for tid, (s, t) in nodes.items():
+        # Archived tasks (t is None) are shorn, so never blocked.
+        blocked = s == HAIRY and t is not None and any(nodes.get(d, (None,))[0] != SHORN
+                                                       for d in t.get("depends_on") or ())
+        roll[tid] = [1, int(s == SHORN), int(blocked)]
+    for tid in sorted((t for t in nodes if "." in t), key=lambda t: t.count("."), reverse=True):
+        parent = roll.get(parent_id(tid))
+        if parent:
+            mine = roll[tid]
+            parent[0] += mine[0]
+            parent[1] += mine[1]
+            parent[2] += mine[2]
+    return roll
+
+
+# ---------------------------------------------------------------------------
+# Git HEAD
+#
+# `shorn` records the short hash of HEAD. Spawning `git rev-parse` costs more
+# than the rest of the command, so the common repository shapes are read
+# directly: HEAD, loose and packed refs, `.git` files pointing elsewhere
+# (linked worktrees, submodules), and the pack indexes and loose objects that
+# decide how long an unambiguous abbreviation must be. Anything else --
+# reftable, alternates, a multi-pack index, abbrev or include settings, GIT_DIR
+# and friends, a repository owned by someone else -- is left to git itself.
+# ---------------------------------------------------------------------------
+
+_GIT_ENV = frozenset({
+    "GIT_DIR", "GIT_WORK_TREE", "GIT_COMMON_DIR", "GIT_OBJECT_DIRECTORY",
+    "GIT_ALTERNATE_OBJECT_DIRECTORIES", "GIT_CEILING_DIRECTORIES",
+    "GIT_DISCOVERY_ACROSS_FILESYSTEM", "GIT_NAMESPACE", "GIT_CONFIG",
+    "GIT_CONFIG_GLOBAL", "GIT_CONFIG_SYSTEM", "GIT_CONFIG_COUNT", "GIT_CONFIG_PARAMETERS",
+})
+# Config that changes what `rev-parse --short` prints, or where it looks.
+_GIT_CONFIG_KEYS = ("abbrev", "include", "refstorage", "objectformat")
+# Refs kept in each worktree's own gitdir rather than the shared one.
+_PER_WORKTREE_REFS = ("refs/bisect/", "refs/worktree/", "refs/rewritten/")
+_OID_RE = re.compile("[0-9a-f]{40}")
+
+
+class _Ask(enum.Enum):
+    """What the in-process git readers return for a setup only git itself should judge."""
+    GIT = "git"
+
+
+def _read_git_file(path: Path) -> str | None:
+    try:
+        return path.read_text()
+    except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+        return None
+
+
+def _common_git_dir(git_dir: Path) -> Path:
+    common = _read_git_file(git_dir / "commondir")
+    return git_dir / common.strip() if common else git_dir
+
+
+def _is_git_dir(path: Path) -> bool:
+    """Roughly git's is_git_directory(): a HEAD plus objects/ and refs/."""
+    if not (path / "HEAD").is_file():
+        return False
+    common = _common_git_dir(path)
+    return (common / "objects").is_dir() and (common / "refs").is_dir()
+
+
+def _find_git_dir(start: Path) -> Path | _Ask | None:
+    """The gitdir git would discover from *start*, None outside a repo, or _Ask.GIT."""
+    dev = start.stat().st_dev
+    for d in (start, *start.parents):
+        if d.stat().st_dev != dev:
+            return None  # git stops at filesystem boundaries
+        dot = d / ".git"
+        if dot.is_file():
+            text = _read_git_file(dot) or ""
+            if not text.startswith("gitdir: "):
+                return _Ask.GIT
+            git_dir = d / text[len("gitdir: "):].strip()
+        elif dot.is_dir() and _is_git_dir(dot):
+            git_dir = dot
+        elif _is_git_dir(d):
+            git_dir = d  # inside a bare repository
+        else:
             continue
-        for f in d.glob(f"{prefix}*.md"):
-            descendants.append((s, f))
-    return descendants
+        if not _is_git_dir(git_dir):
+            return _Ask.GIT
+        if hasattr(os, "geteuid") and d.stat().st_uid != os.geteuid():
+            return _Ask.GIT  # safe.directory territory
+        return git_dir
+    return None
 
 
-def git_head_short() -> str | None:
-    """Return the short hash of HEAD, or None if not in a git repo."""
+def _plain_git_setup(git_dir: Path, common: Path) -> bool:
+    """True if nothing in the environment, config or object store needs real git."""
+    if _GIT_ENV.intersection(os.environ):
+        return False
+    if (common / "reftable").exists() or (common / "objects" / "info" / "alternates").exists():
+        return False
+    if (common / "objects" / "pack" / "multi-pack-index").exists():
+        return False
+    xdg = Path(os.environ.get("XDG_CONFIG_HOME") or Path.home() / ".config")
+    configs = (Path("/etc/gitconfig"), xdg / "git" / "config", Path.home() / ".gitconfig",
+               common / "config", git_dir / "config.worktree")
+    for path in configs:
+        text = (_read_git_file(path) or "").lower()
+        if any(key in text for key in _GIT_CONFIG_KEYS):
+            return False
+    return True
+
+
+def _packed_refs(common: Path) -> dict[str, str]:
+    refs = {}
+    for line in (_read_git_file(common / "packed-refs") or "").splitlines():
+        if line and line[0] not in "#^":
+            oid, _, name = line.partition(" ")
+            refs[name] = oid
+    return refs
+
+
+def _resolve_git_ref(git_dir: Path, common: Path, ref: str) -> str | _Ask | None:
+    """Follow *ref* to an object ID: None if it is unborn, _Ask.GIT if unreadable."""
+    for _ in range(5):
+        per_worktree = "/" not in ref or ref.startswith(_PER_WORKTREE_REFS)
+        value = _read_git_file((git_dir if per_worktree else common) / ref)
+        if value is None:
+            value = _packed_refs(common).get(ref)
+            if value is None:
+                return None
+        value = value.strip()
+        if value.startswith("ref: "):
+            ref = value[len("ref: "):].strip()
+        else:
+            return value if _OID_RE.fullmatch(value) else _Ask.GIT
+    return _Ask.GIT
+
+
+def _pack_neighbours(idx: Path, oid: bytes) -> tuple[int, list[bytes]]:
+    """Object count of pack index *idx*, and the IDs sorted either side of *oid*.
+
+    Reads only the fan-out table and the slice of names sharing oid's first
+    byte (plus one either side), not the whole index.
+    """
+    with open(idx, "rb") as f:
+        magic = f.read(8)
+        if magic[:4] == b"\xfftOc":  # version 2: fan-out, then bare 20-byte names
+            if int.from_bytes(magic[4:], "big") != 2:
+                raise ValueError(f"{idx}: unsupported pack index version")
+            fanout_at, stride, skip = 8, 20, 0
+        else:  # version 1: fan-out, then 4-byte offset + name pairs
+            fanout_at, stride, skip = 0, 24, 4
+        f.seek(fanout_at)
+        fanout = f.read(1024)
+        count = int.from_bytes(fanout[1020:], "big")
+        b = oid[0]
+        lo = int.from_bytes(fanout[4 * b - 4:4 * b], "big") if b else 0
+        hi = int.from_bytes(fanout[4 * b:4 * b + 4], "big")
+        start, stop = max(lo - 1, 0), min(hi + 1, count)
+        f.seek(fanout_at + 1024 + start * stride)
+        chunk = f.read((stop - start) * stride)
+    names = [chunk[i + skip:i + skip + 20] for i in range(0, len(chunk), stride)]
+    pos = bisect.bisect_left(names, oid)
+    after = pos + 1 if pos < len(names) and names[pos] == oid else pos
+    return count, names[max(pos - 1, 0):pos] + names[after:after + 1]
+
+
+def _abbrev_oid(common: Path, oid: str) -> str:
+    """Shorten *oid* the way `git rev-parse --short` does with core.abbrev unset.
+
+    The minimum length grows with the packed object count (7 below 2**14
+    objects, 8 below 2**16, ...), then stretches past any object sharing the
+    prefix: the neighbours in each pack index, and loose objects in the
+    matching fan-out directory.
+    """
+    objects = common / "objects"
+    raw = bytes.fromhex(oid)
+    count = 0
+    shared = []
+    for idx in (objects / "pack").glob("*.idx"):
+        if idx.with_suffix(".pack").exists():
+            n, neighbours = _pack_neighbours(idx, raw)
+            count += n
+            shared += [len(os.path.commonprefix((oid, other.hex()))) for other in neighbours]
+    length = max(7, (count.bit_length() + 1) // 2)
+    # Prefixes of 32+ digits are ignored, just as git ignores them.
+    length = max([length] + [n + 1 for n in shared if n < 32])
+    try:
+        loose = os.listdir(objects / oid[:2])
+    except FileNotFoundError:
+        loose = []
+    for name in loose:
+        if len(name) == 38 and name.startswith(oid[2:length]):
+            n = len(os.path.commonprefix((oid, oid[:2] + name)))
+            if length <= n < 32:
+                length = n + 1
+    return oid[:length]
+
+
+def git_head_direct(cwd: Path, short: bool = True) -> str | _Ask | None:
+    """HEAD's object ID (abbreviated if *short*) read straight from the repository around *cwd*.
+
+    None outside a repository or on an unborn branch, like a failing
+    `git rev-parse`; _Ask.GIT when the setup is one only git should judge.
+    """
+    git_dir = _find_git_dir(cwd)
+    if git_dir is None or git_dir is _Ask.GIT:
+        return git_dir
+    common = _common_git_dir(git_dir)
+    if not _plain_git_setup(git_dir, common):
+        return _Ask.GIT
+    oid = _resolve_git_ref(git_dir, common, "HEAD")
+    if oid is None or oid is _Ask.GIT or not short:
+        return oid
+    return _abbrev_oid(common, oid)
+
+
+def git_head(cwd: Path, short: bool = True) -> str | None:
+    """Return HEAD's object ID (abbreviated if *short*), or None if not in a git repo."""
+    try:
+        head = git_head_direct(cwd, short)
+    except (OSError, ValueError, RuntimeError):
+        head = _Ask.GIT
+    if head is not _Ask.GIT:
+        return head
+    import subprocess
+
     try:
         result = subprocess.run(
-            ["git", "rev-parse", "--short", "HEAD"],
-            capture_output=True, text=True, timeout=5,
+            ["git", "rev-parse", *(["--short"] if short else []), "HEAD"],
+            cwd=cwd, capture_output=True, text=True, timeout=5,
         )
         if result.returncode == 0:
             return result.stdout.strip()
@@ -264,6 +1832,1045 @@ def git_head_short() -> str | None:
     return None
 
 
+def git_head_short() -> str | None:
+    """Return the short hash of HEAD, or None if not in a git repo."""
+    return git_head(Path.cwd())
+
+
+# ---------------------------------------------------------------------------
+# Shorn archive
+#
+# `yak archive` packs old shorn tasks into `.yaks/archive.pack`: an
+# append-only run of zlib-compressed task files, located through the small
+# JSON ID -> [offset, length] map in `.yaks/archive.idx`. Archived tasks
+# count as shorn for dependency checks without the pack ever being opened.
+# ---------------------------------------------------------------------------
+
+ARCHIVE_PACK = "archive.pack"
+ARCHIVE_INDEX = "archive.idx"
+
+# In-process cache: root -> (mtime_ns, size, entries) of archive.idx.
+_archives: dict[Path, tuple[int, int, dict[str, list[int]]]] = {}
+
+
+def archive_index(root: Path) -> dict[str, list[int]]:
+    """Return the archive's ID -> [offset, length] map (empty if nothing is archived)."""
+    path = root / ARCHIVE_INDEX
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return {}
+    cached = _archives.get(root)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    entries = json.loads(path.read_text())["entries"]
+    _archives[root] = (st.st_mtime_ns, st.st_size, entries)
+    return entries
+
+
+def _write_archive_index(root: Path, entries: dict[str, list[int]]) -> None:
+    _atomic_write(root / ARCHIVE_INDEX, json.dumps({"version": 1, "entries": entries}, sort_keys=True) + "\n")
+    _archives.pop(root, None)
+
+
+def _read_archived_text(root: Path, tids: list[str]):
+    """Yield (id, file text) for each archived ID, opening the pack once."""
+    entries = archive_index(root)
+    with open(root / ARCHIVE_PACK, "rb") as f:
+        for tid in tids:
+            offset, length = entries[tid]
+            f.seek(offset)
+            yield tid, zlib.decompress(f.read(length)).decode()
+
+
+def read_archived(root: Path, tid: str) -> dict | None:
+    """Return the archived task *tid*, or None if it is not in the archive."""
+    if tid not in archive_index(root):
+        return None
+    [(_, text)] = _read_archived_text(root, [tid])
+    return parse_task(text)
+
+
+def iter_archived(root: Path, prefix: str = ""):
+    """Lazily yield archived tasks whose ID starts with *prefix*, in ID order."""
+    tids = sorted(t for t in archive_index(root) if t.startswith(prefix))
+    if not tids:
+        return
+    for _, text in _read_archived_text(root, tids):
+        task = parse_task(text)
+        if task:
+            yield task
+
+
+def task_exists(root: Path, tid: str) -> bool:
+    """True if *tid* names a task file or an archived task."""
+    return find_task_file(root, tid) is not None or tid in archive_index(root)
+
+
+def read_description(root: Path, status: str, tid: str) -> str:
+    """The description of task *tid* in *status*, read from its file ("" if it has none or is gone)."""
+    for p in _task_paths(root, status, tid):
+        try:
+            parts = split_task(p.read_text())
+        except FileNotFoundError:
+            continue
+        return parts[1] if parts else ""
+    return ""
+
+
+def lookup_task(root: Path, tid: str) -> tuple[str, dict] | None:
+    """Return (status, task_dict) for *tid* from its file or, failing that, the archive."""
+    result = find_task_file(root, tid)
+    if result:
+        return result[0], load_task(result[1])
+    task = read_archived(root, tid)
+    return (SHORN, task) if task is not None else None
+
+
+def _unarchive(root: Path, tid: str) -> Path:
+    """Restore archived task *tid* into shorn/ and drop it from the archive index."""
+    path = task_path(root, SHORN, tid)
+    with repo_lock(root):
+        entries = dict(archive_index(root))
+        if tid not in entries:  # another writer restored it first
+            return path
+        [(_, text)] = _read_archived_text(root, [tid])
+        _atomic_write(path, text, _fsync_writes(root))
+        del entries[tid]
+        _write_archive_index(root, entries)
+    return path
+
+
+def _task_not_found(root: Path, tid: str, what: str = "task") -> "NoReturn":
+    if tid in archive_index(root):
+        print(f"error: {what} {tid} is archived (regrow it to change it)", file=sys.stderr)
+    else:
+        print(f"error: {what} {tid} not found", file=sys.stderr)
+    sys.exit(1)
+
+
+# ---------------------------------------------------------------------------
+# Transition history
+#
+# Status is the directory a task file sits in, so git already records every
+# transition: a commit that deletes hairy/x.md and adds shaving/x.md moved x.
+# `git log --name-status` over `.yaks/` is streamed once and the transitions
+# cached in `.yaks/.history` (git-ignored) along with the commit they run up
+# to; later runs only read commits made since, and start over if history was
+# rewritten underneath the cache.
+# ---------------------------------------------------------------------------
+
+HISTORY_FILE = ".history"
+_HISTORY_VERSION = 1
+
+# Percentiles reported by `yak cycle-time`.
+_PERCENTILES = (50, 85, 95)
+
+
+def _history_path(path: str) -> tuple[str, str] | None:
+    """(status, id) for a task file path relative to the root, else None."""
+    parts = path.split("/")
+    if len(parts) not in (2, 3) or parts[0] not in STATUSES:
+        return None
+    for ext in (".md", ".yaml"):
+        if parts[-1].endswith(ext):
+            return parts[0], parts[-1][:-len(ext)]
+    return None
+
+
+def _git_log_transitions(root: Path, revs: str):
+    """Yield (author time, commit, [(id, from, to)]) for each commit in *revs*, newest first.
+
+    *from* is None when the task appeared and *to* is None when it went away.
+    Moves are matched up by ID within a commit rather than by git's rename
+    detection, which is slower and misses moves whose content changed a lot.
+    """
+    import subprocess
+
+    proc = subprocess.Popen(
+        ["git", "log", "--full-history", "--no-renames", "--name-status", "-z", "--relative",
+         "--format=%x01%H%x00%at", revs, "--", "."],
+        cwd=root, stdout=subprocess.PIPE, text=True,
+    )
+    out = proc.stdout
+    if out is None:  # unreachable with stdout=PIPE; narrows the type
+        return
+    pending = ""
+    while True:
+        chunk = out.read(1 << 16)
+        records = (pending + chunk).split("\x01")
+        pending = records.pop() if chunk else ""
+        for record in records:
+            if not record:
+                continue
+            fields = record.split("\0")
+            added: dict[str, str] = {}
+            removed: dict[str, str] = {}
+            for i in range(2, len(fields) - 1, 2):
+                found = _history_path(fields[i + 1])
+                code = fields[i].strip()
+                if found and code in ("A", "D"):
+                    (added if code == "A" else removed)[found[1]] = found[0]
+            moves = [(tid, removed.get(tid), added.get(tid)) for tid in added.keys() | removed.keys()]
+            # A layout change or .yaml -> .md rename moves files within a status.
+            moves = [m for m in moves if m[1] != m[2]]
+            if moves:
+                yield int(fields[1]), fields[0][:12], sorted(moves, key=lambda m: m[0])
+        if not chunk:
+            break
+    if proc.wait() != 0:
+        print("error: git log failed", file=sys.stderr)
+        sys.exit(1)
+
+
+def _git_is_ancestor(root: Path, old: str, new: str) -> bool:
+    import subprocess
+
+    return subprocess.run(["git", "merge-base", "--is-ancestor", old, new], cwd=root,
+                          capture_output=True).returncode == 0
+
+
+def task_history(root: Path) -> dict[str, list[list]]:
+    """Return {id: [[time, from, to, commit], ...]} oldest first, updated from git."""
+    head = git_head(root, short=False)
+    if head is None:
+        print("error: .yaks/ is not in a git repository with commits", file=sys.stderr)
+        sys.exit(1)
+    try:
+        cache = json.loads((root / HISTORY_FILE).read_text())
+        if cache.get("version") != _HISTORY_VERSION:
+            raise ValueError
+    except (OSError, ValueError, AttributeError):
+        cache = None
+    if cache and cache["head"] == head:
+        return cache["events"]
+    if cache and _git_is_ancestor(root, cache["head"], head):
+        events, revs = cache["events"], f"{cache['head']}..{head}"
+    else:
+        events, revs = {}, head
+    # git lists newest first; replay oldest first so ties in time keep commit order.
+    new = list(_git_log_transitions(root, revs))
+    for when, commit, moves in reversed(new):
+        for tid, src, dst in moves:
+            timeline = events.setdefault(tid, [])
+            # A cherry-picked move keeps its author time; count it once.
+            if not any(e[0] == when and e[1] == src and e[2] == dst for e in timeline):
+                timeline.append([when, src, dst, commit])
+    for timeline in events.values():
+        timeline.sort(key=lambda e: e[0])
+    try:
+        _atomic_write(root / HISTORY_FILE, json.dumps(
+            {"version": _HISTORY_VERSION, "head": head, "events": events}, separators=(",", ":")))
+        _ensure_gitignore(root, HISTORY_FILE)
+    except OSError:
+        pass  # only a cache
+    return events
+
+
+def _lead_and_cycle(timeline: list[list]) -> tuple[int, int | None, int | None] | None:
+    """(shorn at, lead seconds, cycle seconds) for a task whose last move was to shorn.
+
+    Lead time runs from creation, cycle time from the first move into
+    shaving; either is None if the history doesn't show that start.
+    """
+    moves = [e for e in timeline if e[2] is not None]
+    if not moves or moves[-1][2] != SHORN or moves[-1][1] is None:
+        return None
+    done = moves[-1][0]
+    created = timeline[0][0] if timeline[0][1] is None and timeline[0][2] != SHORN else None
+    started = next((e[0] for e in moves if e[2] == SHAVING), None)
+    return (done, None if created is None else done - created,
+            None if started is None else done - started)
+
+
+def _time_in_status(timeline: list[list], now: int) -> dict[str, int]:
+    """Seconds spent in each status, counting the current one up to *now*."""
+    spent = {s: 0 for s in STATUSES}
+    for e, nxt in zip(timeline, timeline[1:] + [None]):
+        if e[2] is not None:
+            spent[e[2]] += (nxt[0] if nxt else now) - e[0]
+    return spent
+
+
+def _percentiles(values: list[int]) -> dict[str, int]:
+    """Nearest-rank percentiles of *values*."""
+    values = sorted(values)
+    return {f"p{p}": values[max(0, -(-p * len(values) // 100) - 1)] for p in _PERCENTILES} if values else {}
+
+
+def format_duration(seconds: int) -> str:
+    """Render *seconds* as its two largest units, e.g. "3d 4h" or "12m"."""
+    minutes = seconds // 60
+    days, hours, minutes = minutes // 1440, minutes // 60 % 24, minutes % 60
+    if days:
+        return f"{days}d {hours}h" if hours else f"{days}d"
+    if hours:
+        return f"{hours}h {minutes}m" if minutes else f"{hours}h"
+    return f"{minutes}m"
+
+
+# ---------------------------------------------------------------------------
+# Dependency graph
+# ---------------------------------------------------------------------------
+
+@_traced("graph")
+def dep_graph(root: Path) -> tuple[dict[str, str], dict[str, list[str]]]:
+    """Return (status_by_id, deps_by_id) for every task, in one pass over the index."""
+    status: dict[str, str] = {}
+    deps: dict[str, list[str]] = {}
+    for tid in archive_index(root):
+        status[tid] = SHORN
+    for s, t in all_tasks(root):
+        tid = t.get("id")
+        if tid:
+            status[tid] = s
+            deps[tid] = t.get("depends_on") or []
+    return status, deps
+
+
+def _dfs(nodes, succ) -> tuple[list[str], list[list[str]]]:
+    """Iterative depth-first search over *nodes*.
+
+    Returns (postorder, cycles): every node reachable from *nodes* in
+    post-order, and one [a, b, ..., a] path per back edge found.
+    """
+    color: dict[str, int] = {}  # 1 = on the stack, 2 = finished
+    order: list[str] = []
+    cycles: list[list[str]] = []
+    for start in nodes:
+        if start in color:
+            continue
+        color[start] = 1
+        path = [start]
+        stack = [iter(succ(start))]
+        while stack:
+            for d in stack[-1]:
+                c = color.get(d)
+                if c is None:
+                    color[d] = 1
+                    path.append(d)
+                    stack.append(iter(succ(d)))
+                    break
+                if c == 1:
+                    cycles.append(path[path.index(d):] + [d])
+            else:
+                stack.pop()
+                v = path.pop()
+                color[v] = 2
+                order.append(v)
+    return order, cycles
+
+
+def dangling_deps(status: dict[str, str], deps: dict[str, list[str]]) -> list[tuple[str, str]]:
+    """Return (task_id, missing_dep_id) for every reference to a task that does not exist."""
+    return [(tid, d) for tid in sorted(deps) for d in deps[tid] if d not in status]
+
+
+def dep_cycles(deps: dict[str, list[str]]) -> list[list[str]]:
+    """Return one cycle path per back edge in the full dependency graph."""
+    return _dfs(sorted(deps), lambda v: deps.get(v, ()))[1]
+
+
+def dep_path(deps: dict[str, list[str]], src: str, dst: str) -> list[str] | None:
+    """Return a depends_on path from *src* to *dst*, or None if there is none."""
+    prev: dict[str, str | None] = {src: None}
+    frontier = [src]
+    while frontier:
+        nxt = []
+        for v in frontier:
+            if v == dst:
+                path = []
+                node: str | None = v
+                while node is not None:
+                    path.append(node)
+                    node = prev[node]
+                return path[::-1]
+            for d in deps.get(v, ()):
+                if d not in prev:
+                    prev[d] = v
+                    nxt.append(d)
+        frontier = nxt
+    return None
+
+
+def blocking_analysis(status: dict[str, str], deps: dict[str, list[str]], want_roots: bool = True) -> dict:
+    """Analyse what blocks every unshorn task, in time linear in the graph.
+
+    A task is blocked by each dependency that is not shorn, including IDs
+    that do not exist. Returns a dict with:
+
+      depth  -- id -> length of the longest chain of blockers below it
+      next   -- id -> the blocker that continues that chain
+      roots  -- id -> sorted root causes: transitive blockers that are not
+                themselves blocked (missing IDs count as root causes);
+                empty unless *want_roots*, since it costs more than the rest
+      cycles -- cycles among unshorn tasks, which can never be unblocked
+    """
+    blockers = {
+        tid: [d for d in deps.get(tid, ()) if status.get(d) != SHORN]
+        for tid in sorted(status) if status[tid] != SHORN
+    }
+    order, cycles = _dfs(blockers, lambda v: blockers.get(v, ()))
+    depth: dict[str, int] = {}
+    nxt: dict[str, str] = {}
+    roots: dict[str, frozenset] = {}
+    for v in order:  # post-order: a node's blockers are settled before it
+        direct = blockers.get(v, ())
+        below = [d for d in direct if d in depth]
+        if not below:
+            depth[v] = 0
+            if want_roots:
+                roots[v] = frozenset() if direct else frozenset((v,))
+            continue
+        best = max(below, key=depth.__getitem__)
+        depth[v] = depth[best] + 1
+        nxt[v] = best
+        if want_roots:
+            roots[v] = roots[best] if len(below) == 1 else frozenset().union(*(roots[d] for d in below))
+    return {
+        "depth": depth,
+        "next": nxt,
+        "roots": {v: sorted(r) for v, r in roots.items() if blockers.get(v)},
+        "cycles": cycles,
+    }
+
+
+def blocking_chain(analysis: dict, tid: str) -> list[str]:
+    """Follow the longest blocking chain down from *tid*."""
+    chain = [tid]
+    while chain[-1] in analysis["next"]:
+        chain.append(analysis["next"][chain[-1]])
+    return chain
+
+
+# ---------------------------------------------------------------------------
+# Federation
+#
+# A monorepo can keep one .yaks/ per service. With --all-roots, list, next,
+# tangled and stats read them together: the roots listed under `roots:` in
+# the nearest config.yaml, or else every .yaks/ found at most --scan-depth
+# directories below the project. Roots load on a thread pool, each result
+# carries the root it came from, and depends_on resolves across roots.
+# ---------------------------------------------------------------------------
+
+FEDERATION_SCAN_DEPTH = 3
+# Directories the discovery scan never descends into (hidden ones are skipped too).
+_SCAN_SKIP = frozenset({"node_modules", "venv", "__pycache__", "target", "build", "dist"})
+
+
+def discover_roots(base: Path, depth: int) -> list[Path]:
+    """Return every `.yaks/` at most *depth* directories below *base*, breadth first."""
+    found = []
+    level = [str(base)]
+    for d in range(depth + 1):
+        below = []
+        for path in level:
+            try:
+                it = os.scandir(path)
+            except OSError:
+                continue
+            with it:
+                for e in it:
+                    if not e.is_dir(follow_symlinks=False):
+                        continue
+                    if e.name == ".yaks":
+                        found.append(Path(e.path))
+                    elif d < depth and not e.name.startswith(".") and e.name not in _SCAN_SKIP:
+                        below.append(e.path)
+        level = below
+    return sorted(found)
+
+
+def federation_roots(scan_depth: int) -> tuple[Path, list[Path]]:
+    """Return (base directory, member roots), the nearest root first when there is one."""
+    home = _locate_yaks_dir()
+    base = home.parent if home else Path.cwd().resolve()
+    listed = cached_config(home).get("roots") if home else None
+    if home and listed:
+        roots = [home]
+        for entry in listed:
+            p = (base / str(entry)).resolve()
+            if p.name != ".yaks":
+                p = p / ".yaks"
+            if p.is_dir():
+                roots.append(p)
+            else:
+                print(f"warning: no .yaks/ at {entry} (listed in {home / 'config.yaml'})", file=sys.stderr)
+    else:
+        roots = discover_roots(base, scan_depth)
+        if home in roots:
+            roots.remove(home)
+            roots.insert(0, home)
+    roots = list(dict.fromkeys(roots))
+    if not roots:
+        print(f"error: no .yaks/ directory found within {scan_depth} levels of {base}", file=sys.stderr)
+        sys.exit(1)
+    return base, roots
+
+
+def _load_member(root: Path, load):
+    _check_schema(root)
+    _recover_journal(root)
+    return load(root)
+
+
+@_traced("federation")
+def load_federation(scan_depth: int, load) -> list[tuple]:
+    """Run *load(root)* on every member root in parallel, returning (label, root, result) in root order.
+
+    The label is the root's project directory relative to the base, "." for the nearest one.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    base, roots = federation_roots(scan_depth)
+    with ThreadPoolExecutor(max_workers=min(len(roots), _LOAD_THREADS)) as pool:
+        results = list(pool.map(lambda r: _load_member(r, load), roots))
+    return [(os.path.relpath(r.parent, base), r, result) for r, result in zip(roots, results)]
+
+
+def _member_tasks(root: Path) -> tuple[list[tuple[str, dict]], list[str]]:
+    return all_tasks(root), list(archive_index(root))
+
+
+def federated_graph(members: list) -> tuple[dict[str, str], dict[str, list[str]]]:
+    """dep_graph() over every member loaded with _member_tasks; an ID in two roots resolves to the first."""
+    status: dict[str, str] = {}
+    deps: dict[str, list[str]] = {}
+    for _, _, (tasks, archived) in members:
+        for tid in archived:
+            status.setdefault(tid, SHORN)
+        for s, t in tasks:
+            tid = t.get("id")
+            if tid and tid not in deps:
+                status[tid] = s
+                deps[tid] = t.get("depends_on") or []
+    return status, deps
+
+
+def federated_tasks(members: list, status: str | None = None) -> list[tuple[str, dict]]:
+    """Every member's (status, task), each task copied with a "root" field naming its root."""
+    return [(s, {"root": label, **t}) for label, _, (tasks, _) in members
+            for s, t in tasks if status is None or s == status]
+
+
+def federated_dep_graph() -> tuple[dict[str, str], dict[str, list[str]]]:
+    """federated_graph() over the roots next --all-roots reads, at the default scan depth."""
+    return federated_graph(load_federation(FEDERATION_SCAN_DEPTH, _member_tasks))
+
+
+def _merge_stats(aggs) -> dict[str, dict[str, int]]:
+    """Sum index_stats() aggregates from several roots."""
+    out: dict[str, dict[str, int]] = {}
+    for agg in aggs:
+        for kind, counts in agg.items():
+            merged = out.setdefault(kind, {})
+            for key, n in counts.items():
+                merged[key] = merged.get(key, 0) + n
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Sorting and paging
+# ---------------------------------------------------------------------------
+
+SORT_FIELDS = ("priority", "updated", "created", "id")
+
+
+def parse_sort(spec: str) -> list[tuple[str, bool]]:
+    """Parse a --sort value like "priority,-updated" into [(field, descending)]."""
+    order = []
+    for part in spec.split(","):
+        part = part.strip()
+        desc = part.startswith("-") or part.endswith(":desc")
+        field = part.lstrip("-").removesuffix(":desc").removesuffix(":asc")
+        if field not in SORT_FIELDS:
+            import argparse
+
+            raise argparse.ArgumentTypeError(
+                f"unknown sort field {field!r} (choose from {', '.join(SORT_FIELDS)})")
+        order.append((field, desc))
+    return order
+
+
+def _sort_values(item: tuple[str, dict], order: list[tuple[str, bool]] | None) -> list:
+    """The JSON-safe values *item* is ordered by; the last is always its ID."""
+    s, t = item
+    if not order:
+        return [STATUSES.index(s), t.get("id", "")]
+    values = []
+    for field, _ in order:
+        v = t.get(field)
+        if field in ("updated", "created"):
+            dt = parse_timestamp(v)
+            v = dt.timestamp() if dt else None
+        elif field == "priority" and not isinstance(v, int):
+            v = None
+        values.append(v)
+    values.append(t.get("id", ""))
+    return values
+
+
+class _Reversed:
+    """Wraps a string so it sorts in descending order."""
+    __slots__ = ("s",)
+
+    def __init__(self, s: str):
+        self.s = s
+
+    def __lt__(self, other):
+        return other.s < self.s
+
+    def __eq__(self, other):
+        return self.s == other.s
+
+
+def _sort_key(values: list, order: list[tuple[str, bool]] | None) -> tuple:
+    """Turn _sort_values() into a comparable tuple; missing values sort last either way."""
+    if not order:
+        return tuple(values)
+    key = []
+    for (field, desc), v in zip(order, values):
+        if v is None:
+            key.append((1, 0))
+        elif not desc:
+            key.append((0, v))
+        else:
+            key.append((0, _Reversed(v) if isinstance(v, str) else -v))
+    key.append(values[-1])  # ID breaks ties, so the order is total
+    return tuple(key)
+
+
+def _sort_spec(order: list[tuple[str, bool]] | None) -> str:
+    return ",".join(("-" if desc else "") + field for field, desc in order or ())
+
+
+def make_cursor(item: tuple[str, dict], order: list[tuple[str, bool]] | None) -> str:
+    """An opaque token for --after that resumes the listing just past *item*."""
+    raw = json.dumps([_sort_spec(order), _sort_values(item, order)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _read_cursor(cursor: str, order: list[tuple[str, bool]] | None) -> tuple:
+    try:
+        spec, values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        print("error: invalid --after cursor", file=sys.stderr)
+        sys.exit(1)
+    if spec != _sort_spec(order):
+        print(f"error: cursor was made with --sort {spec or '(default)'}; pass the same --sort",
+              file=sys.stderr)
+        sys.exit(1)
+    return _sort_key(values, order)
+
+
+def paginate(tasks, order: list[tuple[str, bool]] | None, after: str | None, limit: int | None,
+             presorted: bool = True):
+    """Order, resume and truncate an iterable of (status, task) pairs.
+
+    With no *order* the input is assumed to already be in the default
+    (status, ID) order when *presorted*, so it streams through untouched.
+    Otherwise a *limit* keeps only the best N in a bounded heap instead of
+    sorting everything.
+    """
+    def key(item):
+        return _sort_key(_sort_values(item, order), order)
+
+    if after:
+        start = _read_cursor(after, order)
+        tasks = (item for item in tasks if key(item) > start)
+    if order or not presorted:
+        if limit is not None:
+            return heapq.nsmallest(limit, tasks, key=key)
+        return sorted(tasks, key=key)
+    return tasks if limit is None else itertools.islice(tasks, limit)
+
+
+def print_cursor(shown: int, last: tuple[str, dict] | None, args) -> None:
+    """After a full page, tell the caller how to fetch the next one (on stderr, so output stays clean)."""
+    if args.limit is not None and shown == args.limit and last is not None:
+        print(f"next page: --after {make_cursor(last, args.sort)}", file=sys.stderr)
+
+
+# ---------------------------------------------------------------------------
+# Queries
+#
+# `yak query` filters with a small boolean language over task fields:
+#
+#     priority<=2 and label:auth and not type:task and updated>2026-09-01 and has:depends_on
+#
+# The text is parsed once into a tree that yields both a predicate and a
+# plan. Terms the index's postings can answer (status, type, priority,
+# labels, created/updated day, has:) narrow the candidate set -- AND
+# intersects, OR unions -- and only the candidates are tested.
+# ---------------------------------------------------------------------------
+
+_QUERY_TOKEN_RE = re.compile(r"""\s*(?:
+    (?P<paren>[()])
+  | (?P<field>[A-Za-z_]+)\s*(?P<op><=|>=|!=|=|<|>|:|~)\s*(?P<value>"[^"]*"|'[^']*'|[^\s()"']+)
+  | (?P<word>[^\s()]+)
+)""", re.VERBOSE)
+
+_QUERY_ALIASES = {"labels": "label", "dep": "depends_on", "deps": "depends_on"}
+_QUERY_LIST_FIELDS = ("label", "depends_on")
+_QUERY_TIME_FIELDS = ("created", "updated")
+_QUERY_STRING_FIELDS = ("id", "title", "type", "commit", "description")
+_QUERY_OPS = {
+    "=": operator.eq, ":": operator.eq, "!=": operator.ne,
+    "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+}
+_QUERY_AGO_RE = re.compile(r"(\d+)([hdw])")
+_QUERY_AGO_UNITS = {"h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def _query_tokens(text: str) -> list[tuple]:
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = _QUERY_TOKEN_RE.match(text, pos)
+        if m is None:
+            raise ValueError(f"cannot read the query at column {pos + 1}: {text[pos:]!r}")
+        if m["paren"]:
+            tokens.append((m["paren"], m.start("paren")))
+        elif m["field"]:
+            value = m["value"]
+            if value[0] in "\"'":
+                value = value[1:-1]
+            tokens.append(("term", m.start("field"), m["field"].lower(), m["op"], value,
+                           text[m.start("field"):m.end()]))
+        elif m["word"].lower() in ("and", "or", "not"):
+            tokens.append((m["word"].lower(), m.start("word")))
+        else:
+            raise ValueError(f"expected FIELD:VALUE, FIELD<VALUE, and/or/not or a parenthesis "
+                             f"at column {m.start('word') + 1}, got {m['word']!r}")
+        pos = m.end()
+    return tokens
+
+
+def _query_time(field: str, op: str, value: str):
+    """A time term's operand: ("day", "YYYY-MM-DD") or ("at", epoch seconds)."""
+    m = _QUERY_AGO_RE.fullmatch(value)
+    if m:
+        return "at", time.time() - int(m[1]) * _QUERY_AGO_UNITS[m[2]]
+    dt = parse_timestamp(value)
+    if dt is None:
+        raise ValueError(f"{field}{op}{value}: expected a date, a timestamp, or an age like 7d")
+    return ("day", value) if len(value) == 10 else ("at", dt.timestamp())
+
+
+def _query_term(token: tuple) -> tuple:
+    """Validate a parsed term and normalise its operand: ("term", field, op, operand, text)."""
+    _, _, field, op, value, text = token
+    field = _QUERY_ALIASES.get(field, field)
+    if field == "has":
+        if op != ":":
+            raise ValueError(f"{text}: use has:FIELD")
+        return "term", field, op, _QUERY_ALIASES.get(value, value), text
+    if field == "status":
+        if op not in (":", "=", "!="):
+            raise ValueError(f"{text}: status only supports :, = and !=")
+        if value not in _STATUS_ALIASES:
+            raise ValueError(f"{text}: unknown status (choose from {', '.join(STATUSES)})")
+        return "term", field, op, _STATUS_ALIASES[value], text
+    if field == "priority":
+        if op == "~":
+            raise ValueError(f"{text}: priority is compared with : = != < <= > >=")
+        try:
+            return "term", field, op, int(value), text
+        except ValueError:
+            raise ValueError(f"{text}: priority must be a number") from None
+    if field in _QUERY_TIME_FIELDS:
+        if op == "~":
+            raise ValueError(f"{text}: {field} is compared with : = != < <= > >=")
+        return "term", field, op, _query_time(field, op, value), text
+    if field in _QUERY_LIST_FIELDS or field in _QUERY_STRING_FIELDS:
+        if op not in (":", "=", "!=", "~"):
+            raise ValueError(f"{text}: {field} only supports :, =, != and ~ (contains)")
+        return "term", field, op, value, text
+    fields = ["has", "status", "priority", *_QUERY_TIME_FIELDS, *_QUERY_LIST_FIELDS, *_QUERY_STRING_FIELDS]
+    raise ValueError(f"{text}: unknown field {field!r} (choose from {', '.join(fields)})")
+
+
+def parse_query(text: str) -> tuple:
+    """Parse query *text* into a tree of ("and"|"or", [nodes]), ("not", node) and term nodes.
+
+    Raises ValueError with a readable message on bad input.
+    """
+    tokens = _query_tokens(text)
+    pos = 0
+
+    def peek() -> str | None:
+        return tokens[pos][0] if pos < len(tokens) else None
+
+    def take():
+        nonlocal pos
+        pos += 1
+        return tokens[pos - 1]
+
+    def parse_or():
+        items = [parse_and()]
+        while peek() == "or":
+            take()
+            items.append(parse_and())
+        return items[0] if len(items) == 1 else ("or", items)
+
+    def parse_and():
+        items = [parse_not()]
+        while peek() not in (None, ")", "or"):
+            if peek() == "and":
+                take()
+            items.append(parse_not())
+        return items[0] if len(items) == 1 else ("and", items)
+
+    def parse_not():
+        if peek() is None:
+            raise ValueError("query ends too early")
+        token = take()
+        if token[0] == "not":
+            return "not", parse_not()
+        if token[0] == "(":
+            node = parse_or()
+            if peek() != ")":
+                raise ValueError(f"unclosed parenthesis at column {token[1] + 1}")
+            take()
+            return node
+        if token[0] == "term":
+            return _query_term(token)
+        raise ValueError(f"unexpected {token[0]!r} at column {token[1] + 1}")
+
+    if not tokens:
+        raise ValueError("empty query")
+    tree = parse_or()
+    if pos < len(tokens):
+        raise ValueError(f"unexpected {tokens[pos][0]!r} at column {tokens[pos][1] + 1}")
+    return tree
+
+
+def query_text(node: tuple) -> str:
+    """Render a query tree back to text, parenthesised where it matters."""
+    if node[0] == "term":
+        return node[4]
+    if node[0] == "not":
+        inner = query_text(node[1])
+        return f"not {inner}" if node[1][0] in ("term", "not") else f"not ({inner})"
+    parts = [query_text(c) if c[0] != "or" or node[0] == "or" else f"({query_text(c)})" for c in node[1]]
+    return f" {node[0]} ".join(parts)
+
+
+def _term_test(field: str, op: str, value):
+    """Compile one term into a test(status, task) -> bool."""
+    cmp = _QUERY_OPS.get(op, operator.eq)  # "~" never reaches cmp; each field tests it separately
+    if field == "has":
+        return lambda s, t: bool(t.get(value))
+    if field == "status":
+        return lambda s, t: cmp(s, value)
+    if field in _QUERY_LIST_FIELDS:
+        key = "labels" if field == "label" else field
+        if op == "~":
+            needle = value.lower()
+            return lambda s, t: any(needle in str(v).lower() for v in t.get(key) or ())
+        if op == "!=":
+            return lambda s, t: value not in (t.get(key) or ())
+        return lambda s, t: value in (t.get(key) or ())
+    if field == "priority":
+        return lambda s, t: cmp(t["priority"], value) if isinstance(t.get("priority"), int) else op == "!="
+    if field in _QUERY_TIME_FIELDS:
+        kind, bound = value
+
+        def test(s, t):
+            dt = parse_timestamp(t.get(field))
+            if dt is None:
+                return op == "!="
+            return cmp(dt.date().isoformat() if kind == "day" else dt.timestamp(), bound)
+        return test
+    # Plain strings: ~ is a case-insensitive substring, a trailing * a prefix.
+    if op == "~":
+        needle = value.lower()
+        return lambda s, t: needle in str(t.get(field, "")).lower()
+    if value.endswith("*"):
+        prefix = value[:-1]
+        return lambda s, t: str(t.get(field, "")).startswith(prefix) == (op != "!=")
+    return lambda s, t: cmp(str(t.get(field, "")), value)
+
+
+def query_predicate(node: tuple):
+    """Compile a query tree into a single test(status, task) -> bool."""
+    if node[0] == "term":
+        return _term_test(node[1], node[2], node[3])
+    if node[0] == "not":
+        inner = query_predicate(node[1])
+        return lambda s, t: not inner(s, t)
+    tests = [query_predicate(c) for c in node[1]]
+    if node[0] == "and":
+        return lambda s, t: all(test(s, t) for test in tests)
+    return lambda s, t: any(test(s, t) for test in tests)
+
+
+def query_fields(node: tuple) -> set[str]:
+    """Every field a query tree tests; has:FIELD counts as FIELD."""
+    if node[0] == "term":
+        return {node[3] if node[1] == "has" else node[1]}
+    if node[0] == "not":
+        return query_fields(node[1])
+    return set().union(*map(query_fields, node[1]))
+
+
+def _term_postings(node: tuple, postings: dict) -> tuple[set[str] | None, str]:
+    """(index keys the term can only match among, or None if unindexed; how they were found)."""
+    _, field, op, value, _ = node
+    if field == "has":
+        if value not in _POSTED_HAS:
+            return None, f"no index for has:{value}"
+        return _posting(postings.get("has", {}), value), "index has"
+    if field in ("status", "type", "label") and op in (":", "=") and not str(value).endswith("*"):
+        return _posting(postings.get(field, {}), value), f"index {field}"
+    if field in _QUERY_TIME_FIELDS and op == "!=":
+        return None, f"no index for {field}!="
+    if field in ("status", "priority") or field in _QUERY_TIME_FIELDS:
+        values = postings.get(field, {})
+        if field == "status":
+            keys = [k for k in values if k != value]
+        elif field == "priority":
+            # Tasks without a numeric priority are filed under "" and match only !=.
+            keys = [k for k in values
+                    if (_QUERY_OPS[op](int(k), value) if k.lstrip("-").isdigit() else op == "!=")]
+        else:
+            keys = [k for k in values if _day_may_match(k, op, value)]
+        found: set[str] = set()
+        for k in keys:
+            found |= _posting(values, k)
+        unit = "days" if field in _QUERY_TIME_FIELDS else "values"
+        return found, f"index {field}, {len(keys)} {unit}"
+    if field == "label" and op == "~":
+        values = postings.get("label", {})
+        keys = [k for k in values if value.lower() in k.lower()]
+        found = set()
+        for k in keys:
+            found |= _posting(values, k)
+        return found, f"index label, {len(keys)} labels"
+    return None, f"no index for {field}{op}"
+
+
+def _day_may_match(day: str, op: str, value: tuple) -> bool:
+    """Whether tasks on *day* can satisfy a time comparison; exact for date operands."""
+    kind, bound = value
+    if kind == "at":
+        bound = datetime.fromtimestamp(bound, timezone.utc).date().isoformat()
+        op = {">": ">=", "<": "<="}.get(op, op)
+    return _QUERY_OPS[op](day, bound)
+
+
+def query_plan(node: tuple, postings: dict, notes: list, depth: int = 0) -> set[str] | None:
+    """The index keys *node* can only match among, or None to test every task.
+
+    Appends (depth, description) lines for --explain to *notes*.
+    """
+    at = len(notes)
+    if node[0] == "term":
+        found, how = _term_postings(node, postings)
+        notes.append((depth, f"{node[4]}: {how}" + ("" if found is None else f" -> {len(found)}")))
+        return found
+    if node[0] == "not":
+        notes.append((depth, f"{query_text(node)}: no index for negation"))
+        return None
+    children = [query_plan(c, postings, notes, depth + 1) for c in node[1]]
+    sets = sorted((c for c in children if c is not None), key=len)
+    if node[0] == "and":
+        found = sets[0].intersection(*sets[1:]) if sets else None
+    else:
+        found = set().union(*sets) if len(sets) == len(children) else None
+    summary = "test every task" if found is None else f"{len(found)} candidates"
+    notes.insert(at, (depth, f"{node[0]}: {summary}"))
+    return found
+
+
+# ---------------------------------------------------------------------------
+# Beads import
+#
+# Exports can run to hundreds of thousands of lines, so the importer streams
+# the file, writes tasks in locked batches, and after each batch records how
+# far it got in `.yaks/.import` (git-ignored). Rerunning on the same,
+# unchanged file resumes from there; a changed file is re-read from the top,
+# skipping IDs that already exist.
+# ---------------------------------------------------------------------------
+
+IMPORT_CHECKPOINT = ".import"
+_IMPORT_VERSION = 1
+_IMPORT_BATCH = 500
+# Seconds between progress lines on stderr; shorter imports print none.
+_IMPORT_PROGRESS = 2.0
+
+_BEAD_SKIP_TYPES = {"message", "molecule", "merge-request"}
+_BEAD_SKIP_STATUSES = {"tombstone", "pinned"}
+_BEAD_PRIORITIES = {0: 1, 1: 1, 2: 2, 3: 3, 4: 3}
+_BEAD_TYPES = {"bug": "bug", "feature": "feature"}
+# Map beads status → yaks directory
+_BEAD_STATUSES = {"in_progress": SHAVING, "closed": SHORN}
+
+
+def bead_task(bead: dict) -> tuple[str, dict] | None:
+    """Map one beads issue to (status, task), or None if it should not be imported."""
+    # Skip non-task types and soft-deleted/pinned
+    if bead.get("issue_type") in _BEAD_SKIP_TYPES or bead.get("status") in _BEAD_SKIP_STATUSES:
+        return None
+    bead_id = bead.get("id", "")
+    if not bead_id:
+        return None
+
+    task: dict = {"id": bead_id}
+    if bead.get("title"):
+        task["title"] = bead["title"]
+    task["type"] = _BEAD_TYPES.get(bead.get("issue_type", ""), "task")
+    task["priority"] = _BEAD_PRIORITIES.get(bead.get("priority", 2), 2)
+
+    # Timestamps
+    task["created"] = bead.get("created_at") or now_iso()
+    task["updated"] = bead.get("updated_at") or task["created"]
+
+    # Dependencies — only "blocks" type
+    dep_ids = [d["depends_on_id"] for d in bead.get("dependencies") or []
+               if d.get("type") == "blocks" and d.get("depends_on_id")]
+    if dep_ids:
+        task["depends_on"] = dep_ids
+
+    # Labels
+    if bead.get("labels"):
+        task["labels"] = bead["labels"]
+
+    # Description — unescape literal \n sequences left by beads export,
+    # and strip trailing whitespace so the YAML dumper uses block scalars.
+    if bead.get("description"):
+        desc = bead["description"]
+        desc = desc.replace("\\n", "\n").replace("\\t", "\t")
+        desc = "\n".join(line.rstrip() for line in desc.split("\n"))
+        task["description"] = desc
+
+    return _BEAD_STATUSES.get(bead.get("status", ""), HAIRY), task
+
+
+def _read_import_checkpoint(root: Path, source: dict) -> dict | None:
+    """The saved progress for *source* (path, size, mtime), if it is still that file."""
+    try:
+        state = json.loads((root / IMPORT_CHECKPOINT).read_text())
+    except (OSError, ValueError):
+        return None
+    if state.get("version") != _IMPORT_VERSION or any(state.get(k) != v for k, v in source.items()):
+        return None
+    return state
+
+
+def _find_beads_file() -> Path:
+    p = Path.cwd().resolve()
+    while True:
+        candidate = p / ".beads" / "issues.jsonl"
+        if candidate.is_file():
+            return candidate
+        if p.parent == p:
+            print("error: no .beads/issues.jsonl found (use --file to specify)", file=sys.stderr)
+            sys.exit(1)
+        p = p.parent
+
+
 # ---------------------------------------------------------------------------
 # Subcommands
 # ---------------------------------------------------------------------------
@@ -280,8 +2887,8 @@ def cmd_init(args):
     target.mkdir()
     for s in STATUSES:
         (target / s).mkdir()
-    config = {"prefix": prefix}
-    (target / "config.yaml").write_text(dump_yaml(config))
+    config = {"prefix": prefix, "schema": SCHEMA_VERSION}
+    (target / "config.yaml").write_text(dump_yaml(config, CONFIG_FIELDS))
     print(f"Initialized .yaks/ in {Path.cwd()} (prefix: {prefix})")
 
 
@@ -290,19 +2897,8 @@ def cmd_create(args):
     cfg = load_config(root)
     prefix = cfg.get("prefix", "yak")
 
-    parent = getattr(args, "parent", None)
-    if parent:
-        # Verify parent exists
-        if not find_task_file(root, parent):
-            print(f"error: parent task {parent} not found", file=sys.stderr)
-            sys.exit(1)
-        tid = f"{parent}.{next_child_number(root, parent)}"
-    else:
-        tid = generate_id(root, prefix)
-
     now = now_iso()
     task = {
-        "id": tid,
         "title": args.title,
         "type": args.type or cfg.get("default_type", "task"),
         "priority": args.priority if args.priority is not None else cfg.get("default_priority", 2),
@@ -316,58 +2912,134 @@ def cmd_create(args):
     if args.description:
         task["description"] = args.description
 
-    path = root / HAIRY / f"{tid}.md"
-    save_task(path, task)
+    parent = getattr(args, "parent", None)
+    # Allocate the ID and write the file in one critical section, so two
+    # writers can't both claim the same free ID.
+    with repo_lock(root):
+        if parent:
+            # Verify parent exists
+            if not find_task_file(root, parent):
+                print(f"error: parent task {parent} not found", file=sys.stderr)
+                sys.exit(1)
+            tid = f"{parent}.{next_child_number(root, parent)}"
+        else:
+            tid = generate_id(root, prefix)
+        task = {"id": tid, **task}
+        save_task(task_path(root, HAIRY, tid), task)
     print(f"Created {tid}: {args.title}")
+    return tid
+
+
+@_traced("render")
+def print_tasks(tasks, args, presorted: bool = True) -> None:
+    """Print (status, task) pairs as `list` does: text lines, a JSON array, or NDJSON.
+
+    --sort, --after and --limit are applied first. Text and NDJSON are
+    written as each task arrives, so an unsorted listing of a lazy *tasks*
+    starts producing output before the scan is done.
+    """
+    tasks = paginate(tasks, args.sort, args.after, args.limit, presorted)
+    shown, last = 0, None
+    if args.json:
+        out = []
+        for s, t in tasks:
+            out.append({"status": s, **t})
+            shown, last = shown + 1, (s, t)
+        print(json.dumps(out, indent=2))
+    elif args.ndjson:
+        for s, t in tasks:
+            sys.stdout.write(json.dumps({"status": s, **t}) + "\n")
+            sys.stdout.flush()
+            shown, last = shown + 1, (s, t)
+    else:
+        _status_char = {HAIRY: "H", SHAVING: "S", SHORN: "N"}
+        for status, t in tasks:
+            pri = t.get("priority", "-")
+            ttype = t.get("type", "-")
+            labels = ",".join(t.get("labels", []))
+            deps = t.get("depends_on", [])
+            dep_str = f" (deps: {','.join(deps)})" if deps else ""
+            label_str = f" [{labels}]" if labels else ""
+            ch = _status_char.get(status, status[0].upper())
+            where = f"{t['root']}: " if "root" in t else ""
+            print(f"  [{ch}] {where}{t['id']}  p{pri} {ttype:8s} {t.get('title', '')}{label_str}{dep_str}")
+            shown, last = shown + 1, (status, t)
+        if not shown:
+            print("No tasks found.")
+    print_cursor(shown, last, args)
 
 
 def cmd_list(args):
-    root = find_tasks_root()
     status_filter = _resolve_status(args.status) if args.status else None
-    tasks = all_tasks(root, status_filter)
 
-    # Apply filters
+    checks = []
     if args.type:
-        tasks = [(s, t) for s, t in tasks if t.get("type") == args.type]
+        checks.append(lambda t: t.get("type") == args.type)
     if args.priority is not None:
-        tasks = [(s, t) for s, t in tasks if t.get("priority") == args.priority]
+        checks.append(lambda t: t.get("priority") == args.priority)
     if args.label:
-        tasks = [(s, t) for s, t in tasks if args.label in t.get("labels", [])]
+        checks.append(lambda t: args.label in t.get("labels", []))
 
-    if args.json:
-        out = [{"status": s, **t} for s, t in tasks]
-        print(json.dumps(out, indent=2))
-        return
+    def where(t):
+        return all(check(t) for check in checks)
 
-    if not tasks:
-        print("No tasks found.")
+    if args.all_roots:
+        members = load_federation(args.scan_depth, lambda r: (
+            list(iter_tasks(r, status_filter, args.id_prefix, where if checks else None)), []))
+        print_tasks(federated_tasks(members), args, presorted=False)
         return
+    root = find_tasks_root()
+    print_tasks(iter_tasks(root, status_filter, args.id_prefix, where if checks else None), args)
 
-    _status_char = {HAIRY: "H", SHAVING: "S", SHORN: "N"}
-    for status, t in tasks:
-        pri = t.get("priority", "-")
-        ttype = t.get("type", "-")
-        labels = ",".join(t.get("labels", []))
-        deps = t.get("depends_on", [])
-        dep_str = f" (deps: {','.join(deps)})" if deps else ""
-        label_str = f" [{labels}]" if labels else ""
-        ch = _status_char.get(status, status[0].upper())
-        print(f"  [{ch}] {t['id']}  p{pri} {ttype:8s} {t.get('title', '')}{label_str}{dep_str}")
+
+def cmd_query(args):
+    root = find_tasks_root()
+    try:
+        tree = parse_query(" ".join(args.query))
+    except ValueError as e:
+        print(f"error: query: {e}", file=sys.stderr)
+        sys.exit(1)
+    test = query_predicate(tree)
+    # The index holds no descriptions; a query on them reads each candidate's file.
+    with_description = "description" in query_fields(tree)
+    postings = index_postings(root)
+    entries = _indexes[root]["entries"]
+    notes: list[tuple[int, str]] = []
+    candidates = query_plan(tree, postings, notes)
+    matched = []
+    for rel in entries if candidates is None else candidates:
+        ent = entries.get(rel)
+        if not ent or not ent[2]:
+            continue
+        status, task = rel[:rel.index("/")], ent[2]
+        if with_description:
+            desc = read_description(root, status, task.get("id", ""))
+            task = {**task, "description": desc} if desc else task
+        if test(status, task):
+            matched.append((status, ent[2]))
+    if args.explain:
+        for depth, line in notes:
+            print("  " * depth + line, file=sys.stderr)
+        checked = len(entries) if candidates is None else len(candidates)
+        print(f"tested {checked} of {len(entries)} tasks, {len(matched)} matched", file=sys.stderr)
+    print_tasks(matched, args, presorted=False)
 
 
 def cmd_show(args):
     root = find_tasks_root()
-    result = find_task_file(root, args.id)
-    if not result:
+    found = lookup_task(root, args.id)
+    if not found:
         print(f"error: task {args.id} not found", file=sys.stderr)
         sys.exit(1)
-    status, path = result
-    task = load_task(path)
+    status, task = found
+    archived = find_task_file(root, args.id) is None
 
     if args.json:
         out = {"status": status, **task}
+        if archived:
+            out["archived"] = True
         pid = parent_id(args.id)
-        if pid and find_task_file(root, pid):
+        if pid and task_exists(root, pid):
             out["parent"] = pid
         children = find_children(root, args.id)
         if children:
@@ -375,15 +3047,14 @@ def cmd_show(args):
         print(json.dumps(out, indent=2))
         return
 
-    print(f"Status: {status}")
-    print(dump_yaml(task), end="")
+    print(f"Status: {status}{' (archived)' if archived else ''}")
+    print(dump_yaml(task, TASK_FIELDS | {"description"}), end="")
 
     _status_char = {HAIRY: "H", SHAVING: "S", SHORN: "N"}
     pid = parent_id(args.id)
-    parent_result = find_task_file(root, pid) if pid else None
+    parent_result = lookup_task(root, pid) if pid else None
     if parent_result:
-        ps, pp = parent_result
-        pt = load_task(pp)
+        ps, pt = parent_result
         ch = _status_char.get(ps, ps[0].upper())
         print(f"\nParent:\n  [{ch}] {pid}  {pt.get('title', '')}")
 
@@ -395,48 +3066,95 @@ def cmd_show(args):
             print(f"  [{ch}] {ct['id']}  {ct.get('title', '')}")
 
 
+def cmd_tree(args):
+    root = find_tasks_root()
+    nodes, children, tops = task_hierarchy(root)
+    if args.id:
+        if args.id not in nodes:
+            _task_not_found(root, args.id)
+        tops = [args.id]
+    roll = tree_rollups(nodes)
+
+    # Pre-order walk with an explicit stack, so depth is only limited by memory.
+    shown = []
+    stack = [(tid, 0) for tid in reversed(tops)]
+    while stack:
+        tid, depth = stack.pop()
+        shown.append((tid, depth))
+        if args.depth is None or depth < args.depth:
+            stack.extend((c, depth + 1) for c in reversed(children.get(tid, ())))
+    archived = [tid for tid, _ in shown if nodes[tid][1] is None]
+    titles = {}
+    if archived:  # only the archived tasks on display are decompressed
+        titles = {tid: parse_task(text).get("title", "") for tid, text in _read_archived_text(root, archived)}
+
+    with _phase("render"):
+        if args.json:
+            out = []
+            for tid, depth in shown:
+                s, t = nodes[tid]
+                total, shorn, blocked = roll[tid]
+                entry = {"id": tid, "status": s, "title": titles[tid] if t is None else t.get("title", ""),
+                         "depth": depth, "parent": parent_id(tid) if parent_id(tid) in nodes else None,
+                         "children": len(children.get(tid, ())), "total": total, "shorn": shorn,
+                         "blocked": blocked}
+                if t is None:
+                    entry["archived"] = True
+                out.append(entry)
+            print(json.dumps(out, indent=2))
+            return
+        if not shown:
+            print("No tasks found.")
+            return
+        _status_char = {HAIRY: "H", SHAVING: "S", SHORN: "N"}
+        lines = []
+        for tid, depth in shown:
+            s, t = nodes[tid]
+            total, shorn, blocked = roll[tid]
+            title = f"{titles[tid]} (archived)" if t is None else t.get("title", "")
+            rollup = f"  ({shorn}/{total} shorn{f', {blocked} blocked' if blocked else ''})" if total > 1 else ""
+            if total == 1 and blocked:
+                rollup = "  (blocked)"
+            lines.append(f"{'  ' * depth}[{_status_char.get(s, s[0].upper())}] {tid}  {title}{rollup}")
+        print("\n".join(lines))
+
+
 def cmd_update(args):
     root = find_tasks_root()
-    result = find_task_file(root, args.id)
-    if not result:
-        print(f"error: task {args.id} not found", file=sys.stderr)
-        sys.exit(1)
-    _, path = result
-    task = load_task(path)
-
-    changed = False
-    if args.title is not None:
-        task["title"] = args.title
-        changed = True
-    if args.type is not None:
-        task["type"] = args.type
-        changed = True
-    if args.priority is not None:
-        task["priority"] = args.priority
-        changed = True
-    if args.description is not None:
-        task["description"] = args.description
-        changed = True
-    if args.add_label:
-        labels = task.get("labels", [])
-        for lbl in args.add_label:
-            if lbl not in labels:
-                labels.append(lbl)
-        task["labels"] = labels
-        changed = True
-    if args.remove_label:
-        labels = task.get("labels", [])
-        for lbl in args.remove_label:
-            if lbl in labels:
-                labels.remove(lbl)
-        task["labels"] = labels if labels else []
-        if not task["labels"]:
-            del task["labels"]
-        changed = True
-
-    if changed:
-        task["updated"] = now_iso()
-        save_task(path, task)
+
+    def edit(_, task):
+        changed = False
+        if args.title is not None:
+            task["title"] = args.title
+            changed = True
+        if args.type is not None:
+            task["type"] = args.type
+            changed = True
+        if args.priority is not None:
+            task["priority"] = args.priority
+            changed = True
+        if args.description is not None:
+            task["description"] = args.description
+            changed = True
+        if args.add_label:
+            labels = task.get("labels", [])
+            for lbl in args.add_label:
+                if lbl not in labels:
+                    labels.append(lbl)
+            task["labels"] = labels
+            changed = True
+        if args.remove_label:
+            labels = task.get("labels", [])
+            for lbl in args.remove_label:
+                if lbl in labels:
+                    labels.remove(lbl)
+            task["labels"] = labels if labels else []
+            if not task["labels"]:
+                del task["labels"]
+            changed = True
+        return changed
+
+    if mutate_task(root, args.id, edit, expect_updated=args.if_updated):
         print(f"Updated {args.id}")
     else:
         print("No changes specified.")
@@ -446,21 +3164,21 @@ def _move_task(args, dest_status: str, already_msg: str, done_msg: str,
                extra_fields: dict | None = None):
     """Shared logic for shave/shorn/regrow."""
     root = find_tasks_root()
-    result = find_task_file(root, args.id)
-    if not result:
-        print(f"error: task {args.id} not found", file=sys.stderr)
-        sys.exit(1)
-    status, path = result
-    if status == dest_status:
+    if not find_task_file(root, args.id) and args.id in archive_index(root):
+        if dest_status == SHORN:
+            print(f"{args.id} is {already_msg}")
+            return
+        _unarchive(root, args.id)
+
+    def edit(status, task):
+        if status == dest_status:
+            return False
+        if extra_fields:
+            task.update(extra_fields)
+
+    if mutate_task(root, args.id, edit, dest_status, getattr(args, "if_updated", None)) is None:
         print(f"{args.id} is {already_msg}")
         return
-    dest = root / dest_status / path.name
-    path.rename(dest)
-    task = load_task(dest)
-    task["updated"] = now_iso()
-    if extra_fields:
-        task.update(extra_fields)
-    save_task(dest, task)
     print(f"{done_msg} {args.id}")
 
 
@@ -483,44 +3201,58 @@ def cmd_regrow(args):
 
 
 def cmd_next(args):
-    root = find_tasks_root()
-    hairy_tasks = all_tasks(root, HAIRY)
-    shorn_ids = {t["id"] for _, t in all_tasks(root, SHORN)}
-
-    ready = []
-    for _, task in hairy_tasks:
-        deps = task.get("depends_on", [])
-        if not deps or all(d in shorn_ids for d in deps):
-            ready.append(task)
-
-    if args.json:
-        print(json.dumps(ready, indent=2))
-        return
-
-    if not ready:
-        print("No yaks ready to shave.")
-        return
-
-    print("Ready to shave (all dependencies met):")
-    for t in ready:
-        pri = t.get("priority", "-")
-        print(f"  {t['id']}  p{pri} {t.get('type', '-'):8s} {t.get('title', '')}")
+    if args.all_roots:
+        members = load_federation(args.scan_depth, _member_tasks)
+        status, _ = federated_graph(members)
+        hairy = federated_tasks(members, HAIRY)
+    else:
+        root = find_tasks_root()
+        status, _ = dep_graph(root)
+        hairy = all_tasks(root, HAIRY)
+    with _phase("filter"):
+        ready = [(s, task) for s, task in hairy
+                 if all(status.get(d) == SHORN for d in task.get("depends_on", []))]
+        ready = list(paginate(ready, args.sort, args.after, args.limit, presorted=not args.all_roots))
+
+    with _phase("render"):
+        if args.json:
+            print(json.dumps([t for _, t in ready], indent=2))
+        elif not ready:
+            print("No yaks ready to shave.")
+        else:
+            print("Ready to shave (all dependencies met):")
+            for _, t in ready:
+                pri = t.get("priority", "-")
+                where = f"{t['root']}: " if "root" in t else ""
+                print(f"  {where}{t['id']}  p{pri} {t.get('type', '-'):8s} {t.get('title', '')}")
+        print_cursor(len(ready), ready[-1] if ready else None, args)
 
 
 def cmd_tangled(args):
-    root = find_tasks_root()
-    hairy_tasks = all_tasks(root, HAIRY)
-    shorn_ids = {t["id"] for _, t in all_tasks(root, SHORN)}
+    if args.all_roots:
+        members = load_federation(args.scan_depth, _member_tasks)
+        status, deps = federated_graph(members)
+        hairy = sorted(federated_tasks(members, HAIRY), key=lambda item: item[1]["id"])
+    else:
+        root = find_tasks_root()
+        status, deps = dep_graph(root)
+        hairy = all_tasks(root, HAIRY)
+    analysis = blocking_analysis(status, deps) if args.root_cause else None
 
     tangled = []
-    for _, task in hairy_tasks:
-        deps = task.get("depends_on", [])
-        unshorn = [d for d in deps if d not in shorn_ids]
+    for _, task in hairy:
+        unshorn = [d for d in task.get("depends_on", []) if status.get(d) != SHORN]
         if unshorn:
-            tangled.append({**task, "_unshorn_deps": unshorn})
+            tangled.append((task, unshorn))
 
     if args.json:
-        out = [{"unshorn_deps": t.pop("_unshorn_deps"), **t} for t in tangled]
+        out = []
+        for t, unshorn in tangled:
+            entry = {"unshorn_deps": unshorn, **t}
+            if analysis:
+                entry["root_causes"] = analysis["roots"].get(t["id"], [])
+                entry["chain"] = blocking_chain(analysis, t["id"])
+            out.append(entry)
         print(json.dumps(out, indent=2))
         return
 
@@ -529,328 +3261,1288 @@ def cmd_tangled(args):
         return
 
     print("Tangled yaks:")
-    for t in tangled:
-        unshorn = t.pop("_unshorn_deps")
-        print(f"  {t['id']}  {t.get('title', '')}  (waiting on: {', '.join(unshorn)})")
+    for t, unshorn in tangled:
+        where = f"{t['root']}: " if "root" in t else ""
+        line = f"  {where}{t['id']}  {t.get('title', '')}  (waiting on: {', '.join(unshorn)})"
+        if analysis:
+            roots = analysis["roots"].get(t["id"], [])
+            missing = [r for r in roots if r not in status]
+            present = [r for r in roots if r in status]
+            causes = present + [f"{r} (missing)" for r in missing]
+            line += f"\n      root cause: {', '.join(causes) or 'dependency cycle'}"
+            chain = blocking_chain(analysis, t["id"])
+            if len(chain) > 2:
+                line += f"\n      longest chain: {' → '.join(chain)}"
+        print(line)
+
+
+def _dep_check(root: Path, as_json: bool) -> None:
+    status, deps = dep_graph(root)
+    dangling = dangling_deps(status, deps)
+    if dangling:
+        # A reference this root can't resolve may name a task in another root.
+        fed_status, _ = federated_dep_graph()
+        dangling = [(t, d) for t, d in dangling if d not in fed_status]
+    cycles = dep_cycles(deps)
+    analysis = blocking_analysis(status, deps, want_roots=False)
+    chain: list[str] = []
+    if analysis["depth"]:
+        deepest = max(sorted(analysis["depth"]), key=lambda v: analysis["depth"][v])
+        chain = blocking_chain(analysis, deepest)
+
+    if as_json:
+        print(json.dumps({
+            "dangling": [{"id": t, "depends_on": d} for t, d in dangling],
+            "cycles": cycles,
+            "longest_chain": chain if len(chain) > 1 else [],
+        }, indent=2))
+        return
+
+    if dangling:
+        print("Dangling references:")
+        for tid, d in dangling:
+            print(f"  {tid} -> {d}")
+    if cycles:
+        print("Cycles:")
+        for cycle in cycles:
+            print(f"  {' -> '.join(cycle)}")
+    if len(chain) > 1:
+        print(f"Longest blocking chain ({len(chain) - 1}): {' -> '.join(chain)}")
+    if not dangling and not cycles:
+        print("Dependency graph OK.")
 
 
 def cmd_dep(args):
     root = find_tasks_root()
-    result = find_task_file(root, args.id)
-    if not result:
-        print(f"error: task {args.id} not found", file=sys.stderr)
+    if args.action == "check":
+        _dep_check(root, args.json)
+        return
+    if not args.id or not args.dep_id:
+        print(f"error: dep {args.action} needs TASK_ID and DEP_ID", file=sys.stderr)
         sys.exit(1)
-    _, path = result
-    task = load_task(path)
 
     if args.action == "add":
-        # Verify dep exists
-        if not find_task_file(root, args.dep_id):
-            print(f"error: dependency task {args.dep_id} not found", file=sys.stderr)
-            sys.exit(1)
-        deps = task.get("depends_on", [])
-        if args.dep_id in deps:
+        # Verify dep exists, here or in another root of the federation
+        graph = None
+        if not task_exists(root, args.dep_id):
+            fed_status, graph = federated_dep_graph()
+            if args.dep_id not in fed_status:
+                print(f"error: dependency task {args.dep_id} not found", file=sys.stderr)
+                sys.exit(1)
+
+        def add(_, task):
+            deps = task.get("depends_on", [])
+            if args.dep_id in deps:
+                return False
+            cycle = dep_path(graph if graph is not None else dep_graph(root)[1], args.dep_id, args.id)
+            if cycle:
+                print(f"error: {args.id} -> {args.dep_id} would create a cycle: "
+                      f"{' -> '.join([args.id] + cycle)}", file=sys.stderr)
+                sys.exit(1)
+            deps.append(args.dep_id)
+            task["depends_on"] = deps
+
+        if mutate_task(root, args.id, add) is None:
             print(f"{args.dep_id} is already a dependency of {args.id}")
-            return
-        deps.append(args.dep_id)
-        task["depends_on"] = deps
-        task["updated"] = now_iso()
-        save_task(path, task)
-        print(f"Added dependency: {args.id} -> {args.dep_id}")
+        else:
+            print(f"Added dependency: {args.id} -> {args.dep_id}")
 
     elif args.action == "remove":
-        deps = task.get("depends_on", [])
-        if args.dep_id not in deps:
+        def remove(_, task):
+            deps = task.get("depends_on", [])
+            if args.dep_id not in deps:
+                return False
+            deps.remove(args.dep_id)
+            if deps:
+                task["depends_on"] = deps
+            else:
+                task.pop("depends_on", None)
+
+        if mutate_task(root, args.id, remove) is None:
             print(f"{args.dep_id} is not a dependency of {args.id}")
-            return
-        deps.remove(args.dep_id)
-        if deps:
-            task["depends_on"] = deps
         else:
-            task.pop("depends_on", None)
-        task["updated"] = now_iso()
-        save_task(path, task)
-        print(f"Removed dependency: {args.id} -> {args.dep_id}")
+            print(f"Removed dependency: {args.id} -> {args.dep_id}")
 
 
 def cmd_reparent(args):
     root = find_tasks_root()
     old_id = args.id
 
-    result = find_task_file(root, old_id)
-    if not result:
-        print(f"error: task {old_id} not found", file=sys.stderr)
-        sys.exit(1)
-
-    new_parent = getattr(args, "parent", None)
-    unparent = getattr(args, "unparent", False)
-
-    if new_parent:
-        # Can't reparent under self or own descendant
-        if new_parent == old_id or new_parent.startswith(old_id + "."):
-            print(f"error: cannot reparent under own descendant", file=sys.stderr)
+    # The new ID, the plan and the writes must all see the same tree.
+    with repo_lock(root):
+        result = find_task_file(root, old_id)
+        if not result:
+            _task_not_found(root, old_id)
+        archived = sorted(t for t in archive_index(root) if t.startswith(old_id + "."))
+        if archived:
+            print(f"error: {old_id} has archived descendants ({', '.join(archived)}); regrow them first",
+                  file=sys.stderr)
             sys.exit(1)
-        # Already a child of this parent?
-        if parent_id(old_id) == new_parent:
-            print(f"{old_id} is already a child of {new_parent}")
-            return
-        if not find_task_file(root, new_parent):
-            print(f"error: parent task {new_parent} not found", file=sys.stderr)
-            sys.exit(1)
-        new_id = f"{new_parent}.{next_child_number(root, new_parent)}"
-    elif unparent:
-        if parent_id(old_id) is None:
-            print(f"error: {old_id} is already a top-level task", file=sys.stderr)
-            sys.exit(1)
-        cfg = load_config(root)
-        prefix = cfg.get("prefix", "yak")
-        new_id = generate_id(root, prefix)
-    else:
-        print("error: specify --parent TASK_ID or --unparent", file=sys.stderr)
-        sys.exit(1)
 
-    # Build old→new ID mapping for target + all descendants
-    id_map = {old_id: new_id}
-    for _, path in find_descendants(root, old_id):
-        desc_old = path.stem
-        desc_new = new_id + desc_old[len(old_id):]
-        id_map[desc_old] = desc_new
+        new_parent = getattr(args, "parent", None)
+        unparent = getattr(args, "unparent", False)
+
+        if new_parent:
+            # Can't reparent under self or own descendant
+            if new_parent == old_id or new_parent.startswith(old_id + "."):
+                print(f"error: cannot reparent under own descendant", file=sys.stderr)
+                sys.exit(1)
+            # Already a child of this parent?
+            if parent_id(old_id) == new_parent:
+                print(f"{old_id} is already a child of {new_parent}")
+                return
+            if not find_task_file(root, new_parent):
+                print(f"error: parent task {new_parent} not found", file=sys.stderr)
+                sys.exit(1)
+            new_id = f"{new_parent}.{next_child_number(root, new_parent)}"
+        elif unparent:
+            if parent_id(old_id) is None:
+                print(f"error: {old_id} is already a top-level task", file=sys.stderr)
+                sys.exit(1)
+            cfg = load_config(root)
+            prefix = cfg.get("prefix", "yak")
+            new_id = generate_id(root, prefix)
+        else:
+            print("error: specify --parent TASK_ID or --unparent", file=sys.stderr)
+            sys.exit(1)
 
-    # Rename files, update id fields and internal deps
-    now = now_iso()
-    for old, new in id_map.items():
-        res = find_task_file(root, old)
-        if not res:
-            continue
-        _, path = res
-        task = load_task(path)
-        task["id"] = new
-        task["updated"] = now
-        deps = task.get("depends_on", [])
-        if deps:
-            task["depends_on"] = [id_map.get(d, d) for d in deps]
-        save_task(path.parent / f"{new}.md", task)
-        path.unlink()
-
-    # Scan all remaining tasks for depends_on references to renamed IDs
-    renamed_stems = set(id_map.values())
-    for s in STATUSES:
-        d = root / s
-        if not d.exists():
-            continue
-        for f in d.glob("*.md"):
-            if f.stem in renamed_stems:
-                continue
-            task = load_task(f)
+        # Build old→new ID mapping for target + all descendants
+        subtree = [result] + find_descendants(root, old_id)
+        id_map = {p.stem: new_id + p.stem[len(old_id):] for _, p in subtree}
+
+        # Plan every write up front: renamed files with their id and internal
+        # deps rewritten, plus the tasks that depend on a renamed ID. The files
+        # themselves are read, since the index holds no descriptions.
+        now = now_iso()
+        writes: list[tuple[Path, dict]] = []
+        deletes: list[Path] = []
+        for s, path in subtree:
+            old = path.stem
+            task = load_task(path)
+            task["id"] = id_map[old]
+            task["updated"] = now
             deps = task.get("depends_on", [])
-            if not deps:
-                continue
-            new_deps = [id_map.get(d, d) for d in deps]
-            if new_deps != deps:
-                task["depends_on"] = new_deps
-                task["updated"] = now
-                save_task(f, task)
-                print(f"  updated dep in {task['id']}")
+            if deps:
+                task["depends_on"] = [id_map.get(d, d) for d in deps]
+            writes.append((task_path(root, s, id_map[old]), task))
+            deletes.append(path)
+
+        rev = reverse_deps(root)
+        dependents = sorted({ref for old in id_map for ref in rev.get(old, ()) if ref[1].stem not in id_map})
+        for s, path in dependents:
+            task = load_task(path)
+            task["depends_on"] = [id_map.get(d, d) for d in task["depends_on"]]
+            task["updated"] = now
+            writes.append((path, task))
+
+        run_journaled(root, writes, deletes)
+    for _, path in dependents:
+        print(f"  updated dep in {path.stem}")
 
     print(f"Reparented {old_id} → {new_id}")
     if len(id_map) > 1:
         for old, new in sorted(id_map.items()):
             if old != old_id:
                 print(f"  {old} → {new}")
+    return new_id
 
 
 def cmd_search(args):
     root = find_tasks_root()
     status_filter = _resolve_status(args.status) if args.status else None
-    tasks = all_tasks(root, status_filter)
-
     query = args.query.lower()
-    matches = []
-    for s, t in tasks:
-        title = t.get("title", "").lower()
-        desc = t.get("description", "").lower()
-        if query in title or query in desc:
-            matches.append((s, t))
-
-    if args.json:
-        out = [{"status": s, **t} for s, t in matches]
-        print(json.dumps(out, indent=2))
-        return
-
-    if not matches:
-        print("No tasks found.")
-        return
 
-    _status_char = {HAIRY: "H", SHAVING: "S", SHORN: "N"}
-    for status, t in matches:
-        pri = t.get("priority", "-")
-        ttype = t.get("type", "-")
-        labels = ",".join(t.get("labels", []))
-        deps = t.get("depends_on", [])
-        dep_str = f" (deps: {','.join(deps)})" if deps else ""
-        label_str = f" [{labels}]" if labels else ""
-        ch = _status_char.get(status, status[0].upper())
-        print(f"  [{ch}] {t['id']}  p{pri} {ttype:8s} {t.get('title', '')}{label_str}{dep_str}")
+    def where(t):
+        return query in t.get("title", "").lower() or query in t.get("description", "").lower()
+
+    # The index holds no descriptions, so a task whose title doesn't match is
+    # checked against its file.
+    tasks = ((s, t) for s, t in iter_tasks(root, status_filter, args.id_prefix)
+             if where(t) or query in read_description(root, s, t["id"]).lower())
+    if status_filter == SHORN:
+        # Archived tasks are only decompressed when shorn work is asked for.
+        # Both streams are in ID order, so merging keeps the default order.
+        archived = ((SHORN, t) for t in iter_archived(root, args.id_prefix) if where(t))
+        tasks = heapq.merge(tasks, archived, key=lambda item: item[1]["id"])
+    print_tasks(tasks, args)
+
+
+# Upper bounds (in days) of the age buckets for unshorn tasks.
+_AGE_BUCKETS = ((1, "<1d"), (7, "1-7d"), (30, "7-30d"), (90, "30-90d"), (None, ">90d"))
+
+
+def _period(day: str, by: str) -> str:
+    """The period a YYYY-MM-DD day falls in: the day itself, or its week's Monday."""
+    if by == "day":
+        return day
+    d = datetime.fromisoformat(day)
+    return (d - timedelta(days=d.weekday())).date().isoformat()
+
+
+def _series(counts: dict[str, int], by: str, periods: int) -> dict[str, int]:
+    """Sum per-day counts into the last *periods* days or weeks, oldest first, zero-filled."""
+    today = datetime.now(timezone.utc).date().isoformat()
+    step = timedelta(days=1 if by == "day" else 7)
+    last = datetime.fromisoformat(_period(today, by))
+    out = {(last - step * i).date().isoformat(): 0 for i in range(periods - 1, -1, -1)}
+    for day, n in counts.items():
+        key = _period(day, by)
+        if key in out:
+            out[key] += n
+    return out
+
+
+def _age_histogram(counts: dict[str, int]) -> dict[str, int]:
+    today = datetime.now(timezone.utc).date()
+    out = {label: 0 for _, label in _AGE_BUCKETS}
+    for day, n in counts.items():
+        age = (today - datetime.fromisoformat(day).date()).days
+        for bound, label in _AGE_BUCKETS:
+            if bound is None or age < bound:
+                out[label] += n
+                break
+    return out
 
 
 def cmd_stats(args):
-    root = find_tasks_root()
-    tasks = all_tasks(root)
-
-    hairy_count = sum(1 for s, _ in tasks if s == HAIRY)
-    shaving_count = sum(1 for s, _ in tasks if s == SHAVING)
-    shorn_count = sum(1 for s, _ in tasks if s == SHORN)
-
-    by_type: dict[str, int] = {}
-    by_priority: dict[int, int] = {}
-    for _, t in tasks:
-        ttype = t.get("type", "unknown")
-        by_type[ttype] = by_type.get(ttype, 0) + 1
-        pri = t.get("priority", 0)
-        by_priority[pri] = by_priority.get(pri, 0) + 1
+    per_root = None
+    if args.all_roots:
+        members = load_federation(args.scan_depth, lambda r: (index_stats(r), len(archive_index(r))))
+        agg = _merge_stats(a for _, _, (a, _) in members)
+        archived_count = sum(n for _, _, (_, n) in members)
+        per_root = {label: sum(a.get("status", {}).values()) for label, _, (a, _) in members}
+    else:
+        root = find_tasks_root()
+        agg = index_stats(root)
+        archived_count = len(archive_index(root))
+    by_status = agg.get("status", {})
+    hairy_count = by_status.get(HAIRY, 0)
+    shaving_count = by_status.get(SHAVING, 0)
+    shorn_count = by_status.get(SHORN, 0)
+    total = hairy_count + shaving_count + shorn_count
+    by_type = dict(sorted(agg.get("type", {}).items()))
+    by_priority = {int(k) if k.lstrip("-").isdigit() else k: v for k, v in agg.get("priority", {}).items()}
+    by_priority = dict(sorted(by_priority.items(), key=lambda kv: (isinstance(kv[0], str), kv[0])))
+    by_label = dict(sorted(agg.get("label", {}).items(), key=lambda kv: (-kv[1], kv[0])))
+    families = sorted(agg.get("family", {}).items(), key=lambda kv: (-kv[1], kv[0]))[:args.top]
+    family_open = agg.get("family_open", {})
+    by_family = {top: {"descendants": n, "open": family_open.get(top, 0)} for top, n in families}
+    created = _series(agg.get("created", {}), args.by, args.periods)
+    shorn = _series(agg.get("shorn", {}), args.by, args.periods)
+    age = {s: _age_histogram(agg.get(f"created_{s}", {})) for s in (HAIRY, SHAVING)}
 
     if args.json:
-        print(json.dumps({
-            "total": len(tasks),
+        out = {
+            "total": total,
             "hairy": hairy_count,
             "shaving": shaving_count,
             "shorn": shorn_count,
+            "archived": archived_count,
             "by_type": by_type,
-            "by_priority": dict(sorted(by_priority.items())),
-        }, indent=2))
+            "by_priority": by_priority,
+            "by_label": by_label,
+            "by_family": by_family,
+            f"created_per_{args.by}": created,
+            f"shorn_per_{args.by}": shorn,
+            "age": age,
+        }
+        if per_root is not None:
+            out["roots"] = per_root
+        print(json.dumps(out, indent=2))
         return
 
-    print(f"Total: {len(tasks)}  Hairy: {hairy_count}  Shaving: {shaving_count}  Shorn: {shorn_count}")
+    print(f"Total: {total}  Hairy: {hairy_count}  Shaving: {shaving_count}  Shorn: {shorn_count}")
+    if per_root is not None:
+        print("Roots: " + "  ".join(f"{label}: {n}" for label, n in per_root.items()))
+    if archived_count:
+        print(f"Archived (shorn): {archived_count}")
     if by_type:
         print("By type:")
-        for k, v in sorted(by_type.items()):
+        for k, v in by_type.items():
             print(f"  {k}: {v}")
     if by_priority:
         print("By priority:")
-        for k, v in sorted(by_priority.items()):
+        for k, v in by_priority.items():
             print(f"  p{k}: {v}")
+    if by_label:
+        print("By label:")
+        for k, v in list(by_label.items())[:args.top]:
+            print(f"  {k}: {v}")
+    if by_family:
+        print("Largest families (descendants, open):")
+        for top, f in by_family.items():
+            print(f"  {top}: {f['descendants']}, {f['open']} open")
+    if total:
+        print(f"Created / shorn per {args.by}:")
+        for period, n in created.items():
+            print(f"  {period}: +{n} / -{shorn[period]}")
+    for s, hist in age.items():
+        if any(hist.values()):
+            print(f"Age of {s}: " + "  ".join(f"{label}: {n}" for label, n in hist.items()))
 
 
-def cmd_import_beads(args):
+def parse_since(value: str) -> int:
+    """Parse a --since date or timestamp into epoch seconds."""
+    dt = parse_timestamp(value)
+    if dt is None:
+        import argparse
+
+        raise argparse.ArgumentTypeError(f"expected a date like 2025-01-31, got {value!r}")
+    return int(dt.timestamp())
+
+
+def _history_when(t: int, fmt: str = "%Y-%m-%d %H:%M") -> str:
+    return datetime.fromtimestamp(t, timezone.utc).strftime(fmt)
+
+
+def _move_json(e: list, **extra) -> dict:
+    return {"time": _history_when(e[0], "%Y-%m-%dT%H:%M:%SZ"), **extra, "from": e[1], "to": e[2], "commit": e[3]}
+
+
+def _describe_move(root: Path, tid: str, src: str | None, dst: str | None) -> str:
+    if src is None:
+        return f"added to {dst}"
+    if dst is None:
+        return "archived" if src == SHORN and tid in archive_index(root) else f"removed from {src}"
+    return f"{src} -> {dst}"
+
+
+def cmd_history(args):
     root = find_tasks_root()
+    events = task_history(root)
+    if not args.id:
+        moves = [(e[0], tid, e) for tid, timeline in events.items() for e in timeline
+                 if args.since is None or e[0] >= args.since]
+        moves = heapq.nlargest(args.limit, moves, key=lambda m: (m[0], m[1]))
+        if args.json:
+            print(json.dumps([_move_json(e, id=tid) for _, tid, e in moves], indent=2))
+            return
+        for t, tid, e in moves:
+            print(f"{_history_when(t)}  {tid}  {_describe_move(root, tid, e[1], e[2])}  {e[3]}")
+        return
+
+    timeline = events.get(args.id)
+    if not timeline:
+        if not task_exists(root, args.id):
+            _task_not_found(root, args.id)
+        print(f"No committed moves for {args.id} yet")
+        return
+    timeline = [e for e in timeline if args.since is None or e[0] >= args.since]
+    spent = _time_in_status(events[args.id], int(time.time()))
+    done = _lead_and_cycle(events[args.id])
+    if args.json:
+        print(json.dumps({
+            "id": args.id,
+            "events": [_move_json(e) for e in timeline],
+            "time_in_status": spent,
+            "lead_time": done and done[1],
+            "cycle_time": done and done[2],
+        }, indent=2))
+        return
+
+    print(args.id)
+    prev = None
+    for e in timeline:
+        after = f"  (after {format_duration(e[0] - prev)})" if prev is not None else ""
+        print(f"  {_history_when(e[0])}  {_describe_move(root, args.id, e[1], e[2]):<18} {e[3]}{after}")
+        prev = e[0]
+    spans = [f"{s}: {format_duration(n)}" for s, n in spent.items() if n]
+    if spans:
+        print("Time in " + "  ".join(spans))
+    if done:
+        parts = [f"{label} {format_duration(n)}"
+                 for label, n in (("lead", done[1]), ("cycle", done[2])) if n is not None]
+        if parts:
+            print("Shorn after: " + ", ".join(parts))
+
+
+def cmd_cycle_time(args):
+    root = find_tasks_root()
+    events = task_history(root)
+    tasks = None
+    if args.type or args.label:
+        tasks = {t["id"]: t for _, _, t, _ in _indexed(root)}
+        tasks.update((t["id"], t) for t in iter_archived(root))
+    lead, cycle = [], []
+    count = 0
+    for tid, timeline in events.items():
+        done = _lead_and_cycle(timeline)
+        if done is None or (args.since is not None and done[0] < args.since):
+            continue
+        if tasks is not None:
+            task = tasks.get(tid)
+            if task is None or (args.type and task.get("type") != args.type):
+                continue
+            if args.label and args.label not in (task.get("labels") or []):
+                continue
+        count += 1
+        if done[1] is not None:
+            lead.append(done[1])
+        if done[2] is not None:
+            cycle.append(done[2])
+
+    out = {
+        "shorn": count,
+        "lead_time": {"tasks": len(lead), **_percentiles(lead)},
+        "cycle_time": {"tasks": len(cycle), **_percentiles(cycle)},
+    }
+    if args.json:
+        print(json.dumps(out, indent=2))
+        return
+    print(f"Shorn: {count}")
+    for key, label in (("lead_time", "Lead time (created -> shorn)"), ("cycle_time", "Cycle time (shaving -> shorn)")):
+        stats = out[key]
+        pcts = "  ".join(f"{p}: {format_duration(stats[p])}" for p in stats if p != "tasks")
+        print(f"{label}, {stats['tasks']} tasks" + (f":  {pcts}" if pcts else ""))
 
-    # Locate the beads JSONL file
-    if args.file:
-        jsonl_path = Path(args.file)
-    else:
-        p = Path.cwd().resolve()
-        jsonl_path = None
-        while True:
-            candidate = p / ".beads" / "issues.jsonl"
-            if candidate.is_file():
-                jsonl_path = candidate
-                break
-            if p.parent == p:
-                break
-            p = p.parent
-        if not jsonl_path:
-            print("error: no .beads/issues.jsonl found (use --file to specify)", file=sys.stderr)
-            sys.exit(1)
 
+def cmd_import_beads(args):
+    root = find_tasks_root()
+    jsonl_path = Path(args.file) if args.file else _find_beads_file()
     if not jsonl_path.is_file():
         print(f"error: {jsonl_path} not found", file=sys.stderr)
         sys.exit(1)
 
-    # Collect existing task IDs so we can skip duplicates
-    existing_ids: set[str] = set()
-    for d in (root / s for s in STATUSES):
-        if d.exists():
-            for f in d.glob("*.md"):
-                existing_ids.add(f.stem)
-
-    skip_types = {"message", "molecule", "merge-request"}
-    skip_statuses = {"tombstone", "pinned"}
-    priority_map = {0: 1, 1: 1, 2: 2, 3: 3, 4: 3}
-    type_map = {"bug": "bug", "feature": "feature"}
-
-    # Map beads status → yaks directory
-    _bead_status_map = {
-        "in_progress": SHAVING,
-        "closed": SHORN,
-    }
+    st = jsonl_path.stat()
+    source = {"file": str(jsonl_path.resolve()), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    state = None if args.restart or args.dry_run else _read_import_checkpoint(root, source)
+    if state and state["offset"] >= st.st_size:
+        print(f"Already imported {jsonl_path} (use --restart to check it again)")
+        return
+    if state:
+        print(f"Resuming {jsonl_path} at line {state['lines'] + 1}", file=sys.stderr)
+    else:
+        state = {"offset": 0, "lines": 0, "created": {s: 0 for s in STATUSES}, "skipped": 0, "unresolved": {}}
+    created = state["created"]
+    # Dependency target -> importing tasks, for targets not seen yet.
+    unresolved: dict[str, list[str]] = state["unresolved"]
+
+    # Existing IDs come from file names alone; nothing needs parsing.
+    existing = {e.name[:-3] for s in STATUSES for _, e in _status_files(root, s)}
+    existing.update(archive_index(root))
+
+    batch: list[tuple[str, dict]] = []
+    started = time.monotonic()
+    reported = started
+    first_line = state["lines"]
+
+    def flush(offset: int) -> None:
+        if not args.dry_run:
+            if batch:
+                with repo_lock(root):
+                    for status, task in batch:
+                        save_task(task_path(root, status, task["id"]), task)
+            _atomic_write(root / IMPORT_CHECKPOINT, json.dumps(
+                {"version": _IMPORT_VERSION, **source, **state, "offset": offset}, separators=(",", ":")))
+        batch.clear()
+
+    with open(jsonl_path, "rb") as f:
+        f.seek(state["offset"])
+        offset = state["offset"]
+        for raw in f:
+            if len(batch) >= _IMPORT_BATCH:
+                flush(offset)
+                now = time.monotonic()
+                if now - reported >= _IMPORT_PROGRESS:
+                    reported = now
+                    rate = (state["lines"] - first_line) / (now - started)
+                    print(f"  {offset * 100 // st.st_size}%  line {state['lines']}, "
+                          f"{sum(created.values())} imported, {rate:.0f} lines/s", file=sys.stderr)
+            offset += len(raw)
+            state["lines"] += 1
+            if not raw.strip():
+                continue
+            try:
+                mapped = bead_task(json.loads(raw))
+            except (ValueError, AttributeError):
+                flush(offset - len(raw))
+                print(f"error: {jsonl_path}:{state['lines']}: not a JSON object", file=sys.stderr)
+                sys.exit(1)
+            if mapped is None:
+                state["skipped"] += 1
+                continue
+            yak_dir, task = mapped
+            bead_id = task["id"]
+            unresolved.pop(bead_id, None)
 
-    created = {s: 0 for s in STATUSES}
-    skipped = 0
+            # Idempotent: skip if already imported
+            if bead_id in existing:
+                state["skipped"] += 1
+                continue
+            existing.add(bead_id)
+            for dep in task.get("depends_on", []):
+                if dep not in existing:
+                    unresolved.setdefault(dep, []).append(bead_id)
+
+            if args.dry_run:
+                print(f"  [dry-run] {yak_dir}/{bead_id}.md  {task.get('title', '')}")
+            else:
+                batch.append((yak_dir, task))
+            created[yak_dir] += 1
+        flush(offset)
+    if not args.dry_run:
+        _ensure_gitignore(root, IMPORT_CHECKPOINT)
 
-    for line in jsonl_path.read_text().splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        bead = json.loads(line)
+    total = sum(created.values())
+    elapsed = time.monotonic() - started
+    prefix = "[dry-run] " if args.dry_run else ""
+    print(f"{prefix}Imported {total} tasks (hairy: {created[HAIRY]}, shaving: {created[SHAVING]}, shorn: {created[SHORN]}), "
+          f"skipped {state['skipped']} in {elapsed:.1f}s ({(state['lines'] - first_line) / max(elapsed, 1e-9):.0f} lines/s)")
+    if unresolved:
+        pairs = [(src, dep) for dep, srcs in sorted(unresolved.items()) for src in srcs]
+        print(f"warning: {len(pairs)} dependencies point at issues neither imported nor already tracked:",
+              file=sys.stderr)
+        for src, dep in pairs[:10]:
+            print(f"  {src} -> {dep}", file=sys.stderr)
+        if len(pairs) > 10:
+            print(f"  ... and {len(pairs) - 10} more (see /yaks:tangled)", file=sys.stderr)
+
+
+def parse_timestamp(value) -> datetime | None:
+    """Parse a task timestamp (ISO 8601 string or YAML datetime) as an aware UTC datetime."""
+    if isinstance(value, datetime):
+        dt = value
+    elif isinstance(value, str):
+        try:
+            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    else:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
 
-        # Skip non-task types and soft-deleted/pinned
-        if bead.get("issue_type") in skip_types:
-            skipped += 1
-            continue
-        if bead.get("status") in skip_statuses:
-            skipped += 1
-            continue
 
-        bead_id = bead.get("id", "")
-        if not bead_id:
-            skipped += 1
-            continue
+def cmd_archive(args):
+    root = find_tasks_root()
+    cutoff = datetime.now(timezone.utc) - timedelta(days=args.older_than)
+    candidates = []
+    paths = []
+    for _, stem, task, path in _indexed(root, SHORN):
+        updated = parse_timestamp(task.get("updated"))
+        if updated is not None and updated < cutoff:
+            candidates.append(stem)
+            paths.append(path)
+
+    if not candidates:
+        print(f"No shorn tasks older than {args.older_than:g} day(s).")
+        return
+    if args.dry_run:
+        for stem in candidates:
+            print(f"  [dry-run] {stem}")
+        print(f"[dry-run] Would archive {len(candidates)} task(s)")
+        return
 
-        # Idempotent: skip if already imported
-        if bead_id in existing_ids:
-            skipped += 1
-            continue
+    # Append to the pack and make it durable before the index points at it;
+    # the task files are only removed once both are in place.
+    with repo_lock(root):
+        entries = dict(archive_index(root))
+        packed = []
+        with open(root / ARCHIVE_PACK, "ab") as f:
+            offset = f.seek(0, os.SEEK_END)
+            for stem, path in zip(candidates, paths):
+                try:
+                    raw = path.read_bytes()
+                except FileNotFoundError:
+                    continue  # regrown since the scan
+                updated = parse_timestamp(parse_task(raw.decode()).get("updated"))
+                if updated is None or updated >= cutoff:
+                    continue  # touched since the scan
+                data = zlib.compress(raw, 9)
+                f.write(data)
+                entries[stem] = [offset, len(data)]
+                offset += len(data)
+                packed.append(path)
+            f.flush()
+            os.fsync(f.fileno())
+        _write_archive_index(root, entries)
+        for path in packed:
+            path.unlink()
+            _index_forget(path)
+    print(f"Archived {len(packed)} shorn task(s) into .yaks/{ARCHIVE_PACK}")
+
+
+def cmd_migrate(args):
+    # Not find_tasks_root(): that refuses to run until this command has.
+    root = _locate_yaks_dir()
+    if root is None:
+        print("error: no .yaks/ directory found (run /yaks:init first)", file=sys.stderr)
+        sys.exit(1)
+    if schema_version(root) > SCHEMA_VERSION:
+        _check_schema(root)  # reports the version mismatch
+    applied = migrate(root)
+    if applied:
+        print(f"Migrated .yaks/ to storage schema {applied[-1]}")
+    else:
+        print(f"Storage schema is up to date (version {schema_version(root)})")
 
-        # Map status to yaks directory
-        yak_dir = _bead_status_map.get(bead.get("status", ""), HAIRY)
 
-        # Build task
-        task: dict = {"id": bead_id}
-        if bead.get("title"):
-            task["title"] = bead["title"]
-        task["type"] = type_map.get(bead.get("issue_type", ""), "task")
-        task["priority"] = priority_map.get(bead.get("priority", 2), 2)
+def cmd_layout(args):
+    root = find_tasks_root()
+    current = storage_layout(root)
+    if not args.layout:
+        print(current)
+        return
+    if args.layout == current:
+        print(f"Layout is already {current}")
+        return
 
-        # Timestamps
-        if bead.get("created_at"):
-            task["created"] = bead["created_at"]
-        else:
-            task["created"] = now_iso()
-        if bead.get("updated_at"):
-            task["updated"] = bead["updated_at"]
+    def set_layout(layout: str) -> None:
+        cfg = load_config(root)
+        if layout == FLAT:
+            cfg.pop("layout", None)
         else:
-            task["updated"] = task["created"]
-
-        # Dependencies — only "blocks" type
-        deps = bead.get("dependencies", [])
-        if deps:
-            dep_ids = [d["depends_on_id"] for d in deps if d.get("type") == "blocks" and d.get("depends_on_id")]
-            if dep_ids:
-                task["depends_on"] = dep_ids
-
-        # Labels
-        if bead.get("labels"):
-            task["labels"] = bead["labels"]
-
-        # Description — unescape literal \n sequences left by beads export,
-        # and strip trailing whitespace so the YAML dumper uses block scalars.
-        if bead.get("description"):
-            desc = bead["description"]
-            desc = desc.replace("\\n", "\n").replace("\\t", "\t")
-            desc = "\n".join(line.rstrip() for line in desc.split("\n"))
-            task["description"] = desc
-
-        if args.dry_run:
-            print(f"  [dry-run] {yak_dir}/{bead_id}.md  {task.get('title', '')}")
+            cfg["layout"] = layout
+        save_config(root, cfg)
+
+    # Every task stays findable at each step: lookups in sharded mode fall
+    # back to the flat path, so switch the config first when sharding and
+    # last when flattening. Other writers wait, so none lands mid-move.
+    with repo_lock(root):
+        tasks = _indexed(root)
+        if args.layout == SHARDED:
+            set_layout(SHARDED)
+        entries = task_index(root)
+        moved = 0
+        for s, stem, _, path in tasks:
+            dest = (root / s / shard_of(stem) / path.name) if args.layout == SHARDED else root / s / path.name
+            if dest == path:
+                continue
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            path.rename(dest)
+            # A rename keeps mtime and size, so the entry stays valid under its new key.
+            entries[_task_rel(dest)[1]] = entries.pop(_task_rel(path)[1])
+            moved += 1
+        if args.layout == FLAT:
+            for s in STATUSES:
+                for d in (root / s).glob("*/"):
+                    with contextlib.suppress(OSError):
+                        d.rmdir()
+            set_layout(FLAT)
+        _write_index(root, _indexes[root])
+    print(f"Switched layout {current} → {args.layout} ({moved} task(s) moved)")
+
+
+# ---------------------------------------------------------------------------
+# Batch execution
+# ---------------------------------------------------------------------------
+
+_BATCH_REF_RE = re.compile(r"\$\{([^}]+)\}")
+
+
+def _batch_argv(op, names: dict[str, str]) -> list[str]:
+    """Turn one batch operation into an argv list, substituting ${name} references."""
+    if isinstance(op, list):
+        argv = [str(a) for a in op]
+    elif isinstance(op, dict) and "argv" in op:
+        argv = [str(a) for a in op["argv"]]
+    elif isinstance(op, dict) and "op" in op:
+        argv = [str(op["op"])] + [str(a) for a in op.get("args", [])]
+        for key, value in op.items():
+            if key in ("op", "args", "as") or value is None or value is False:
+                continue
+            flag = "--" + key.replace("_", "-")
+            if value is True:
+                argv.append(flag)
+            elif isinstance(value, list):
+                argv.append(flag)
+                argv.extend(str(v) for v in value)
+            else:
+                argv += [flag, str(value)]
+    else:
+        raise ValueError("operation must be an argv array or an object with 'op' or 'argv'")
+
+    def ref(m: re.Match) -> str:
+        if m.group(1) not in names:
+            raise ValueError(f"unknown reference ${{{m.group(1)}}}")
+        return names[m.group(1)]
+
+    return [_BATCH_REF_RE.sub(ref, a) for a in argv]
+
+
+def cmd_batch(args):
+    root = find_tasks_root()
+    names: dict[str, str] = {}
+    failed = False
+    src = open(args.file) if args.file else sys.stdin
+    with src, _trusted_index(root):
+        for lineno, line in enumerate(src, 1):
+            line = line.strip()
+            if not line:
+                continue
+            result: dict = {"line": lineno}
+            try:
+                op = json.loads(line)
+                argv = _batch_argv(op, names)
+                if not argv or argv[0] in _LOCAL_ONLY:
+                    raise ValueError(f"{argv[0] if argv else 'empty command'} is not allowed in a batch")
+            except ValueError as e:
+                result.update(ok=False, error=str(e))
+            else:
+                code, out, err, value = _run_captured(argv)
+                result.update(ok=code == 0, code=code, stdout=out, stderr=err)
+                if code == 0 and isinstance(value, str):
+                    result["id"] = value
+                    if isinstance(op, dict) and op.get("as"):
+                        names[op["as"]] = value
+            print(json.dumps(result), flush=True)
+            if not result["ok"]:
+                failed = True
+                if args.stop_on_error:
+                    break
+    if failed:
+        sys.exit(1)
+
+
+# ---------------------------------------------------------------------------
+# Resident server
+#
+# `yak serve` keeps one process alive with the frontmatter index in memory and
+# answers subcommands over a Unix socket in `.yaks/`. The CLI forwards to it
+# whenever the socket is live. Every request still re-validates the index
+# against the filesystem, so hand edits and git checkouts are picked up.
+# ---------------------------------------------------------------------------
+
+SOCKET_FILE = ".serve.sock"
+
+# Subcommands that never go through the server (batch reads the client's stdin;
+# serve and watch run until stopped).
+_LOCAL_ONLY = {"init", "serve", "batch", "watch"}
+
+
+def _run_captured(argv: list[str]) -> tuple[int, str, str, object]:
+    """Run one CLI invocation in-process, returning (exit_code, stdout, stderr, result)."""
+    out, err = io.StringIO(), io.StringIO()
+    code = 0
+    result = None
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+        try:
+            result = _dispatch(argv)
+        except SystemExit as e:
+            if isinstance(e.code, int):
+                code = e.code
+            elif e.code is not None:
+                print(e.code, file=sys.stderr)
+                code = 1
+        except Exception:
+            import traceback
+
+            traceback.print_exc()
+            code = 1
+    return code, out.getvalue(), err.getvalue(), result
+
+
+def _forward_to_server(argv: list[str]) -> int | None:
+    """Run *argv* on a live `yak serve` for this tree. Returns None to run locally."""
+    # Leading options (--trace, --profile) are about this process, so run those here too.
+    if not argv or argv[0] in _LOCAL_ONLY or argv[0].startswith("-") or os.environ.get("YAKS_NO_SERVER"):
+        return None
+    root = _locate_yaks_dir()
+    if root is None or not (root / SOCKET_FILE).exists():
+        return None
+    import socket
+
+    request = {"argv": argv, "cwd": str(Path.cwd()), "root": str(root)}
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(root / SOCKET_FILE))
+            sock.sendall(json.dumps(request).encode() + b"\n")
+            with sock.makefile("rb") as f:
+                reply = json.loads(f.readline())
+    except (OSError, ValueError):
+        return None  # stale socket or server went away; run locally
+    if reply.get("code") is None:
+        return None
+    sys.stdout.write(reply.get("stdout", ""))
+    sys.stderr.write(reply.get("stderr", ""))
+    return reply["code"]
+
+
+def _serve_one(conn, root: Path) -> None:
+    with conn, conn.makefile("rwb") as f:
+        try:
+            request = json.loads(f.readline())
+            argv, cwd = request["argv"], request["cwd"]
+        except (ValueError, KeyError, TypeError):
+            return
+        if request.get("root") != str(root) or (argv and argv[0] in _LOCAL_ONLY):
+            reply: dict = {"code": None}  # not ours; client runs locally
         else:
-            dest = root / yak_dir / f"{bead_id}.md"
-            save_task(dest, task)
+            os.chdir(cwd)
+            code, out, err, _ = _run_captured(argv)
+            reply = {"code": code, "stdout": out, "stderr": err}
+        f.write(json.dumps(reply).encode() + b"\n")
 
-        created[yak_dir] += 1
 
-    total = sum(created.values())
-    prefix = "[dry-run] " if args.dry_run else ""
-    print(f"{prefix}Imported {total} tasks (hairy: {created[HAIRY]}, shaving: {created[SHAVING]}, shorn: {created[SHORN]}), skipped {skipped}")
+def cmd_serve(args):
+    import socket
+
+    root = find_tasks_root()
+    sock_path = root / SOCKET_FILE
+    if sock_path.exists():
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(str(sock_path))
+            except OSError:
+                sock_path.unlink()  # left behind by a server that died
+            else:
+                print(f"error: a yak server is already running on {sock_path}", file=sys.stderr)
+                sys.exit(1)
+    _ensure_gitignore(root, SOCKET_FILE)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o077)
+    try:
+        server.bind(str(sock_path))
+    finally:
+        os.umask(old_umask)
+    server.listen(16)
+    if args.idle_timeout:
+        server.settimeout(args.idle_timeout)
+    task_index(root)  # warm the cache before the first request
+    print(f"Serving {root} on {sock_path}", flush=True)
+    try:
+        while True:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                print("Idle timeout reached, shutting down.")
+                break
+            conn.settimeout(None)
+            _serve_one(conn, root)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        sock_path.unlink(missing_ok=True)
+
+
+# ---------------------------------------------------------------------------
+# Compact task records
+#
+# Commands pass tasks around as the dicts the frontmatter parser returns,
+# which is fine for a process that lives for one command. Something that
+# keeps every task for hours (`yak watch`) holds Task records instead: one
+# slot per known field, interned IDs, types and labels, tuples for lists,
+# canonical timestamps as epoch seconds, and the description left in the
+# task file until someone asks for it. A record reads like a dict (get,
+# [], in, keys, items, `{**task}`), and to_dict() gives back exactly the
+# dict it was made from, key order included.
+#
+# `yak serve` keeps its index as dicts. Entries loaded from .yaks/.index
+# already share their strings, so records save under a third there, while
+# every command reads fields back an order of magnitude slower and each
+# index write converts every task; `bench.py memory` reports both sides.
+# ---------------------------------------------------------------------------
+
+# The order `create` writes fields in; records only remember an order that differs.
+_TASK_ORDER = ("id", "title", "type", "priority", "created", "updated", "depends_on", "labels", "commit",
+               "description")
+_ABSENT = object()
+_LAZY = object()  # description still in the task file
+_CANONICAL_TIME_RE = re.compile(r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\dZ")
+
+
+def _encode_field(key: str, v):
+    """The compact form of *v* for slot *key*, or _ABSENT to keep it as is in the extras."""
+    if key in ("id", "type"):
+        return sys.intern(v) if type(v) is str else _ABSENT
+    if key in ("title", "commit", "description"):
+        return v if type(v) is str else _ABSENT
+    if key == "priority":
+        return v if type(v) is int else _ABSENT
+    if key in ("created", "updated"):
+        if type(v) is not str or not _CANONICAL_TIME_RE.fullmatch(v):
+            return _ABSENT
+        try:
+            return int(datetime.fromisoformat(v[:-1]).replace(tzinfo=timezone.utc).timestamp())
+        except ValueError:
+            return _ABSENT
+    # depends_on, labels
+    if type(v) is list and all(type(x) is str for x in v):
+        return tuple(sys.intern(x) for x in v)
+    return _ABSENT
+
+
+class Task:
+    """A read-only task, stored compactly. Build with from_dict(); to_dict() is lossless."""
+
+    __slots__ = (*_TASK_ORDER, "_extra", "_order", "_path", "_crc")
+
+    # Each field slot holds its compact form (see _encode_field), or _ABSENT.
+    id: object
+    title: object
+    type: object
+    priority: object
+    created: object
+    updated: object
+    depends_on: object
+    labels: object
+    commit: object
+    description: object
+    _extra: dict | None  # fields with no slot, or whose value doesn't fit it
+    _order: tuple[str, ...] | None  # key order, when it isn't _TASK_ORDER's
+    _path: Path | None
+    _crc: int  # checksum of a description left on disk
+
+    @classmethod
+    def from_dict(cls, task: dict, path: Path | None = None) -> "Task":
+        """Compact *task*; with the *path* it was parsed from, its description stays on disk."""
+        self = cls.__new__(cls)
+        self.id = self.title = self.type = self.priority = self.created = self.updated = _ABSENT
+        self.depends_on = self.labels = self.commit = self.description = _ABSENT
+        self._extra = None
+        self._path = path
+        self._crc = 0
+        for key, v in task.items():
+            enc = _encode_field(key, v) if key in _TASK_ORDER else _ABSENT
+            if enc is _ABSENT:
+                if self._extra is None:
+                    self._extra = {}
+                self._extra[key] = v
+            elif key == "description" and path is not None:
+                self.description = _LAZY
+                self._crc = zlib.crc32(v.encode())
+            else:
+                setattr(self, key, enc)
+        keys = tuple(task)
+        self._order = None if keys == self._default_order() else tuple(sys.intern(k) for k in keys)
+        return self
+
+    def _default_order(self) -> tuple:
+        slotted = tuple(k for k in _TASK_ORDER if getattr(self, k) is not _ABSENT)
+        return slotted + tuple(self._extra) if self._extra else slotted
+
+    def _raw(self, key: str):
+        """What is stored for *key*: a description stands for its checksum, so nothing is read."""
+        if key in _TASK_ORDER:
+            v = getattr(self, key)
+            if v is not _ABSENT:
+                if key == "description":
+                    return ("crc", self._crc if v is _LAZY else zlib.crc32(v.encode()))
+                return v
+        return self._extra.get(key, _ABSENT) if self._extra else _ABSENT
+
+    def differs(self, other: "Task", key: str) -> bool:
+        """Whether *key* differs between two records, without loading either description."""
+        return self._raw(key) != other._raw(key)
+
+    def keys(self):
+        return self._order or self._default_order()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def __contains__(self, key) -> bool:
+        return self._raw(key) is not _ABSENT
+
+    def __getitem__(self, key: str):
+        if key not in _TASK_ORDER or getattr(self, key) is _ABSENT:
+            if self._extra and key in self._extra:
+                return self._extra[key]
+            raise KeyError(key)
+        v = getattr(self, key)
+        if key in ("created", "updated"):
+            return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(v))
+        if key in ("depends_on", "labels"):
+            return list(v)
+        if v is _LAZY and self._path is not None:
+            # Read fresh each time rather than kept; if the file has changed since,
+            # this is its current description.
+            return parse_task(self._path.read_text()).get("description", "")
+        return v
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def to_dict(self) -> dict:
+        return {k: self[k] for k in self.keys()}
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Task):
+            return NotImplemented
+        keys = self.keys()
+        return set(keys) == set(other.keys()) and not any(self.differs(other, k) for k in keys)
+
+    def __repr__(self) -> str:
+        return f"Task({self.to_dict()!r})"
+
+
+# ---------------------------------------------------------------------------
+# Watch
+#
+# `yak watch` keeps an in-memory copy of every task current and reports each
+# change as it lands. On Linux it sleeps on inotify (through ctypes, so no
+# extra dependency) and re-reads only the files it was told about; elsewhere,
+# or with --poll, it stats the tree every --interval seconds and re-reads
+# only files whose mtime or size moved.
+# ---------------------------------------------------------------------------
+
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_ONLYDIR = 0x1000000
+_IN_ISDIR = 0x40000000
+_IN_CLOEXEC = 0o2000000
+# Task files are written via rename (MOVED_TO) or in place by editors
+# (CLOSE_WRITE); CREATE is only acted on for new shard or status dirs.
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_ONLYDIR
+
+# After the first event of a burst, keep reading until the queue has been
+# quiet this long, so both halves of a move land in the same batch...
+_WATCH_SETTLE = 0.05
+# ...but report at least this often while the tree keeps churning.
+_WATCH_MAX_BATCH = 0.5
+
+
+class _Inotify:
+    """Just enough of Linux inotify: one watch per directory, events as (dir, name, mask)."""
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch  # AttributeError off Linux
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self.fd = libc.inotify_init1(_IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.dirs: dict[int, str] = {}  # watch descriptor -> dir relative to the root, "" for the root
+
+    def add(self, root: Path, rel: str) -> bool:
+        wd = self._add_watch(self.fd, os.fsencode(root / rel), _WATCH_MASK)
+        if wd < 0:
+            return False  # gone again, or out of watches
+        self.dirs[wd] = rel
+        return True
+
+    def read(self, timeout: float | None) -> list[tuple[str, str, int]]:
+        import select
+        import struct
+
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        buf = os.read(self.fd, 1 << 16)
+        events = []
+        pos = 0
+        while pos < len(buf):
+            wd, mask, _, size = struct.unpack_from("iIII", buf, pos)
+            name = buf[pos + 16:pos + 16 + size].rstrip(b"\0").decode(errors="surrogateescape")
+            pos += 16 + size
+            if mask & _IN_IGNORED:
+                self.dirs.pop(wd, None)
+            elif wd in self.dirs or mask & _IN_Q_OVERFLOW:
+                events.append((self.dirs.get(wd, ""), name, mask))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def _watch_tree(notify: _Inotify, root: Path, rel: str) -> set[str]:
+    """Watch dir *rel* (a status dir or one of its shards) and return the task files already in it.
+
+    Listing after the watch is in place means a file that arrived before it
+    is picked up here and one that arrives after raises an event.
+    """
+    if not notify.add(root, rel):
+        return set()
+    found = set()
+    with contextlib.suppress(FileNotFoundError), os.scandir(root / rel) as it:
+        for e in it:
+            if e.name.endswith(".md"):
+                found.add(f"{rel}/{e.name}")
+            elif "/" not in rel and e.is_dir():
+                found |= _watch_tree(notify, root, f"{rel}/{e.name}")
+    return found
+
+
+def _inotify_changes(notify: _Inotify, root: Path) -> set[str] | None:
+    """Block until something changes; return the touched files, or None if events were lost."""
+    events = notify.read(None)
+    deadline = time.monotonic() + _WATCH_MAX_BATCH
+    while time.monotonic() < deadline:
+        more = notify.read(_WATCH_SETTLE)
+        if not more:
+            break
+        events += more
+    touched = set()
+    for d, name, mask in events:
+        if mask & _IN_Q_OVERFLOW:
+            return None
+        if mask & _IN_ISDIR:
+            # A new status dir under the root, or a new shard under a status dir.
+            if mask & (_IN_CREATE | _IN_MOVED_TO) and ((not d and name in STATUSES) or d in STATUSES):
+                touched |= _watch_tree(notify, root, f"{d}/{name}" if d else name)
+        elif d and name.endswith(".md") and not name.startswith("."):
+            touched.add(f"{d}/{name}")
+    return touched
+
+
+def _poll_changes(root: Path, files: dict[str, list]) -> set[str]:
+    """Stat every task file and return those that appeared, vanished, or changed."""
+    racy_after = time.time_ns() - _RACY_NS
+    seen = set()
+    touched = set()
+    for s in STATUSES:
+        for rel, e in _status_files(root, s):
+            seen.add(rel)
+            st = e.stat()
+            ent = files.get(rel)
+            # Recently written files are re-read until they settle (see _RACY_NS).
+            if not (ent and ent[0] == st.st_mtime_ns and ent[1] == st.st_size and st.st_mtime_ns < racy_after):
+                touched.add(rel)
+    return touched | (files.keys() - seen)
+
+
+def _rel_id(rel: str) -> str:
+    return rel[rel.rindex("/") + 1:-3]
+
+
+def _watch_state(files: dict[str, list], rels: set[str] | None) -> tuple[str, Task] | None:
+    """(status, task) for one ID, picking the newer file while a move is half done."""
+    live = [r for r in rels or () if files[r][2]]
+    if not live:
+        return None
+    rel = max(live, key=lambda r: files[r][0])
+    return sys.intern(rel[:rel.index("/")]), files[rel][2]
+
+
+def _watch_task(task: Task) -> dict:
+    try:
+        return task.to_dict()
+    except OSError:
+        # Moved or deleted again since it was read; the next batch reports that.
+        return {k: task[k] for k in task.keys() if k != "description"}
+
+
+def _watch_apply(root: Path, files: dict[str, list], ids: dict[str, set[str]], touched: set[str]):
+    """Re-read the *touched* files into the model and yield an event per task that changed."""
+    affected = {_rel_id(rel) for rel in touched}
+    before = {tid: _watch_state(files, ids.get(tid)) for tid in affected}
+    for rel in touched:
+        tid = _rel_id(rel)
+        try:
+            st = os.stat(root / rel)
+        except OSError:  # gone, or no longer readable: either way not a task we can report
+            if files.pop(rel, None) is not None:
+                ids[tid].discard(rel)
+            continue
+        try:
+            task = Task.from_dict(load_task(root / rel), root / rel)
+        except FileNotFoundError:
+            if files.pop(rel, None) is not None:
+                ids[tid].discard(rel)
+            continue
+        except Exception:
+            task = Task.from_dict({})  # mid-edit by hand; judged again on its next save
+        files[rel] = [st.st_mtime_ns, st.st_size, task]
+        ids.setdefault(tid, set()).add(rel)
+    when = now_iso()
+    for tid in sorted(affected):
+        old, new = before[tid], _watch_state(files, ids.get(tid))
+        if old == new:
+            continue  # rewritten unchanged, or moved between shards by `yak layout`
+        if not ids.get(tid):
+            ids.pop(tid, None)
+        kind = "deleted" if new is None else "created" if old is None else "moved" if old[0] != new[0] else "updated"
+        event = {"event": kind, "id": tid, "status": new and new[0], "old_status": old and old[0], "time": when}
+        if new:
+            event["task"] = _watch_task(new[1])
+        if old and new:
+            event["fields"] = sorted(k for k in {*old[1].keys(), *new[1].keys()} if old[1].differs(new[1], k))
+        if new is None and tid in archive_index(root):
+            event["archived"] = True
+        yield event
+
+
+def _watch_line(event: dict) -> str:
+    kind = event["event"]
+    if kind == "moved":
+        what = f"{event['old_status']} -> {event['status']}"
+    elif kind == "updated":
+        what = ", ".join(event["fields"])
+    elif kind == "deleted":
+        what = "archived" if event.get("archived") else f"from {event['old_status']}"
+    else:
+        what = event["status"]
+    title = event.get("task", {}).get("title", "")
+    return f"{event['time']}  {kind:8s} {event['id']}  {what}  {title}".rstrip()
+
+
+def cmd_watch(args):
+    root = find_tasks_root()
+    notify = None
+    if not args.poll:
+        try:
+            notify = _Inotify()
+        except (OSError, AttributeError):
+            pass  # not Linux, or the inotify instance limit is reached
+    if notify:
+        notify.add(root, "")
+        for s in STATUSES:
+            _watch_tree(notify, root, s)
+    files = {rel: [mtime, size, Task.from_dict(task, root / rel)]
+             for rel, (mtime, size, task) in task_index(root).items()}
+    _indexes.pop(root, None)  # the records replace the index's dicts for the rest of this process
+    ids: dict[str, set[str]] = {}
+    for rel in files:
+        ids.setdefault(_rel_id(rel), set()).add(rel)
+
+    def emit(event: dict) -> None:
+        # default=str: a hand-edited, unquoted timestamp loads as a datetime.
+        sys.stdout.write(json.dumps(event, default=str) + "\n" if args.ndjson else _watch_line(event) + "\n")
+
+    backend = "inotify" if notify else "poll"
+    try:
+        if args.snapshot:
+            when = now_iso()
+            for tid in sorted(ids):
+                state = _watch_state(files, ids[tid])
+                if state:
+                    emit({"event": "snapshot", "id": tid, "status": state[0], "time": when,
+                          "task": _watch_task(state[1])})
+        if args.ndjson:
+            emit({"event": "ready", "backend": backend, "tasks": len(files), "time": now_iso()})
+        else:
+            print(f"Watching {root} ({backend}); Ctrl-C to stop.", file=sys.stderr)
+        sys.stdout.flush()
+        while True:
+            if notify:
+                touched = _inotify_changes(notify, root)
+                if touched is None:  # the kernel queue overflowed: resync everything
+                    for s in STATUSES:
+                        _watch_tree(notify, root, s)
+                    touched = _poll_changes(root, files)
+            else:
+                time.sleep(args.interval)
+                touched = _poll_changes(root, files)
+            for event in _watch_apply(root, files, ids, touched):
+                emit(event)
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+    except BrokenPipeError:
+        # The reader went away; point stdout at /dev/null so exit doesn't complain.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    finally:
+        if notify:
+            notify.close()
 
 
 # ---------------------------------------------------------------------------
@@ -860,8 +4552,32 @@ def cmd_import_beads(args):
 _ALL_STATUS_NAMES = sorted(_STATUS_ALIASES.keys())
 
 
-def build_parser() -> argparse.ArgumentParser:
+def _add_paging_args(sp) -> None:
+    sp.add_argument("--sort", type=parse_sort, metavar="FIELDS",
+                    help="Comma-separated sort fields from priority, updated, created, id; "
+                         "prefix with - for descending (e.g. --sort=priority,-updated)")
+    sp.add_argument("--limit", type=int, metavar="N", help="Show at most N tasks")
+    sp.add_argument("--after", metavar="CURSOR", help="Resume after the cursor printed by a previous page")
+
+
+def _add_federation_args(sp) -> None:
+    sp.add_argument("--all-roots", action="store_true",
+                    help="Read every .yaks/ in the monorepo: `roots:` in config.yaml, or a scan below the project")
+    sp.add_argument("--scan-depth", type=int, default=FEDERATION_SCAN_DEPTH, metavar="N",
+                    help=f"How many directories deep --all-roots looks when no roots are configured "
+                         f"(default: {FEDERATION_SCAN_DEPTH})")
+
+
+def build_parser():
+    import argparse
+
     p = argparse.ArgumentParser(prog="yaks", description="Filesystem-native task tracker")
+    p.add_argument("--trace", metavar="FILE",
+                   help="Write per-phase timings and file/parse counts to FILE ('-' for stderr); also YAKS_TRACE")
+    p.add_argument("--trace-format", choices=TRACE_FORMATS, default="json",
+                   help="json summary, or chrome trace events (default: json); also YAKS_TRACE_FORMAT")
+    p.add_argument("--profile", metavar="FILE",
+                   help="Run under cProfile, dump stats to FILE and print the top entries; also YAKS_PROFILE")
     sub = p.add_subparsers(dest="command")
 
     # init
@@ -884,7 +4600,22 @@ def build_parser() -> argparse.ArgumentParser:
     sp.add_argument("--type", help="Filter by type")
     sp.add_argument("--priority", type=int, help="Filter by priority")
     sp.add_argument("--label", help="Filter by label")
-    sp.add_argument("--json", action="store_true", help="JSON output")
+    sp.add_argument("--id-prefix", default="", metavar="PREFIX", help="Only tasks whose ID starts with PREFIX")
+    _add_paging_args(sp)
+    _add_federation_args(sp)
+    out = sp.add_mutually_exclusive_group()
+    out.add_argument("--json", action="store_true", help="JSON output")
+    out.add_argument("--ndjson", action="store_true", help="Stream one JSON object per line")
+
+    # query
+    sp = sub.add_parser("query", help="List tasks matching a query expression")
+    sp.add_argument("query", nargs="+",
+                    help='e.g. "priority<=2 and label:auth and not type:task and updated>2026-09-01"')
+    sp.add_argument("--explain", action="store_true", help="Show which indexes narrowed the search (on stderr)")
+    _add_paging_args(sp)
+    out = sp.add_mutually_exclusive_group()
+    out.add_argument("--json", action="store_true", help="JSON output")
+    out.add_argument("--ndjson", action="store_true", help="Stream one JSON object per line")
 
     # show
     sp = sub.add_parser("show", help="Show a task")
@@ -900,38 +4631,59 @@ def build_parser() -> argparse.ArgumentParser:
     sp.add_argument("--description", help="New description")
     sp.add_argument("--add-label", nargs="+", help="Add labels")
     sp.add_argument("--remove-label", nargs="+", help="Remove labels")
+    sp.add_argument("--if-updated", metavar="TIMESTAMP",
+                    help="Fail with a conflict unless the task's updated field still equals TIMESTAMP")
 
     # shave (+ alias: work)
     for name in ("shave", "work"):
         sp = sub.add_parser(name, help="Start shaving a yak")
         sp.add_argument("id", help="Task ID")
+        sp.add_argument("--if-updated", metavar="TIMESTAMP",
+                        help="Fail with a conflict unless the task's updated field still equals TIMESTAMP")
 
     # shorn (+ alias: close)
     for name in ("shorn", "close"):
         sp = sub.add_parser(name, help="Mark a yak as shorn")
         sp.add_argument("id", help="Task ID")
         sp.add_argument("--commit", help="Commit hash (default: git HEAD)")
+        sp.add_argument("--if-updated", metavar="TIMESTAMP",
+                        help="Fail with a conflict unless the task's updated field still equals TIMESTAMP")
 
     # regrow (+ alias: reopen)
     for name in ("regrow", "reopen"):
         sp = sub.add_parser(name, help="Regrow a shorn yak")
         sp.add_argument("id", help="Task ID")
+        sp.add_argument("--if-updated", metavar="TIMESTAMP",
+                        help="Fail with a conflict unless the task's updated field still equals TIMESTAMP")
 
     # next (+ alias: ready)
     for name in ("next", "ready"):
         sp = sub.add_parser(name, help="Show yaks ready to shave")
         sp.add_argument("--json", action="store_true", help="JSON output")
+        _add_paging_args(sp)
+        _add_federation_args(sp)
 
     # tangled (+ alias: blocked)
     for name in ("tangled", "blocked"):
         sp = sub.add_parser(name, help="Show tangled yaks")
+        sp.add_argument("--root-cause", action="store_true",
+                        help="Show transitive root causes and the longest blocking chain")
         sp.add_argument("--json", action="store_true", help="JSON output")
+        _add_federation_args(sp)
 
     # dep
     sp = sub.add_parser("dep", help="Manage dependencies")
-    sp.add_argument("action", choices=["add", "remove"], help="Add or remove dependency")
-    sp.add_argument("id", help="Task ID")
-    sp.add_argument("dep_id", help="Dependency task ID")
+    sp.add_argument("action", choices=["add", "remove", "check"],
+                    help="Add or remove a dependency, or check the whole graph")
+    sp.add_argument("id", nargs="?", help="Task ID")
+    sp.add_argument("dep_id", nargs="?", help="Dependency task ID")
+    sp.add_argument("--json", action="store_true", help="JSON output (check only)")
+
+    # tree
+    sp = sub.add_parser("tree", help="Show the parent/child hierarchy with rolled-up progress")
+    sp.add_argument("id", nargs="?", help="Task to start from (default: every top-level task)")
+    sp.add_argument("--depth", type=int, metavar="N", help="Show N levels of children (default: all)")
+    sp.add_argument("--json", action="store_true", help="JSON output: one entry per task, in display order")
 
     # reparent
     sp = sub.add_parser("reparent", help="Move a task to a new parent or to top-level")
@@ -944,23 +4696,80 @@ def build_parser() -> argparse.ArgumentParser:
     sp = sub.add_parser("search", help="Search tasks by keyword")
     sp.add_argument("query", help="Search term")
     sp.add_argument("--status", choices=_ALL_STATUS_NAMES, help="Filter by status")
-    sp.add_argument("--json", action="store_true", help="JSON output")
+    sp.add_argument("--id-prefix", default="", metavar="PREFIX", help="Only tasks whose ID starts with PREFIX")
+    _add_paging_args(sp)
+    out = sp.add_mutually_exclusive_group()
+    out.add_argument("--json", action="store_true", help="JSON output")
+    out.add_argument("--ndjson", action="store_true", help="Stream one JSON object per line")
 
     # stats
     sp = sub.add_parser("stats", help="Show task statistics")
+    sp.add_argument("--by", choices=["day", "week"], default="week",
+                    help="Period for created/shorn counts (default: week)")
+    sp.add_argument("--periods", type=int, default=8, help="How many periods to show (default: 8)")
+    sp.add_argument("--top", type=int, default=10,
+                    help="Labels and families to show in text output; families in JSON (default: 10)")
+    sp.add_argument("--json", action="store_true", help="JSON output")
+    _add_federation_args(sp)
+
+    sp = sub.add_parser("history", help="Show status changes recorded in git")
+    sp.add_argument("id", nargs="?", help="Task ID (default: recent moves of all tasks)")
+    sp.add_argument("--since", type=parse_since, metavar="DATE", help="Only moves on or after DATE")
+    sp.add_argument("--limit", type=int, default=20, help="Moves to show without a task ID (default: 20)")
+    sp.add_argument("--json", action="store_true", help="JSON output")
+
+    sp = sub.add_parser("cycle-time", help="Lead and cycle time percentiles of shorn tasks, from git history")
+    sp.add_argument("--type", help="Only tasks of this type")
+    sp.add_argument("--label", help="Only tasks with this label")
+    sp.add_argument("--since", type=parse_since, metavar="DATE", help="Only tasks shorn on or after DATE")
     sp.add_argument("--json", action="store_true", help="JSON output")
 
     # import-beads
     sp = sub.add_parser("import-beads", help="Import tasks from a beads issues.jsonl file")
     sp.add_argument("--file", help="Path to issues.jsonl (default: auto-detect .beads/issues.jsonl)")
     sp.add_argument("--dry-run", action="store_true", help="Print what would be created without writing")
+    sp.add_argument("--restart", action="store_true", help="Ignore saved progress and re-check the whole file")
+
+    # archive
+    sp = sub.add_parser("archive", help="Pack old shorn tasks into .yaks/archive.pack")
+    sp.add_argument("--older-than", type=float, default=30, metavar="DAYS",
+                    help="Archive shorn tasks not updated for this many days (default: 30)")
+    sp.add_argument("--dry-run", action="store_true", help="List what would be archived without writing")
+
+    # migrate
+    sub.add_parser("migrate", help="Upgrade .yaks/ to the current storage schema")
+
+    # layout
+    sp = sub.add_parser("layout", help="Show or change how task files are laid out on disk")
+    sp.add_argument("layout", nargs="?", choices=LAYOUTS,
+                    help="flat: one directory per status; sharded: 256 subdirectories per status")
+
+    # batch
+    sp = sub.add_parser("batch", help="Run many subcommands from a JSONL stream in one process")
+    sp.add_argument("--file", help="Read operations from this file instead of stdin")
+    sp.add_argument("--stop-on-error", action="store_true", help="Stop at the first failing operation")
+
+    # serve
+    sp = sub.add_parser("serve", help="Run a resident server that answers commands over a Unix socket")
+    sp.add_argument("--idle-timeout", type=float, default=0,
+                    help="Exit after this many seconds without a request (default: never)")
+
+    # watch
+    sp = sub.add_parser("watch", help="Follow task changes as they happen")
+    sp.add_argument("--ndjson", action="store_true",
+                    help="One JSON event per line: created, updated, moved or deleted")
+    sp.add_argument("--snapshot", action="store_true", help="Start with a snapshot event for every task")
+    sp.add_argument("--poll", action="store_true", help="Poll with stat even where inotify is available")
+    sp.add_argument("--interval", type=float, default=1.0, metavar="SECONDS",
+                    help="Seconds between polls (default: 1)")
 
     return p
 
 
-def main():
+def _dispatch(argv: list[str]):
+    start = time.perf_counter_ns()
     parser = build_parser()
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     if not args.command:
         parser.print_help()
         sys.exit(1)
@@ -969,6 +4778,7 @@ def main():
         "init": cmd_init,
         "create": cmd_create,
         "list": cmd_list,
+        "query": cmd_query,
         "show": cmd_show,
         "update": cmd_update,
         "shave": cmd_shave,
@@ -983,11 +4793,36 @@ def main():
         "blocked": cmd_tangled,
         "dep": cmd_dep,
         "reparent": cmd_reparent,
+        "tree": cmd_tree,
         "search": cmd_search,
         "stats": cmd_stats,
+        "history": cmd_history,
+        "cycle-time": cmd_cycle_time,
         "import-beads": cmd_import_beads,
+        "archive": cmd_archive,
+        "layout": cmd_layout,
+        "migrate": cmd_migrate,
+        "batch": cmd_batch,
+        "serve": cmd_serve,
+        "watch": cmd_watch,
     }
-    commands[args.command](args)
+    if args.trace or args.profile:
+        return _run_diagnosed(args, commands[args.command], start, time.perf_counter_ns())
+    return commands[args.command](args)
+
+
+def main():
+    argv = sys.argv[1:]
+    # The environment only applies to the outermost command, not to each
+    # operation of a batch or a request to the server.
+    env_flags = (("YAKS_TRACE", "--trace"), ("YAKS_TRACE_FORMAT", "--trace-format"), ("YAKS_PROFILE", "--profile"))
+    for var, flag in env_flags:
+        if os.environ.get(var):
+            argv = [flag, os.environ[var], *argv]
+    code = _forward_to_server(argv)
+    if code is not None:
+        sys.exit(code)
+    _dispatch(argv)
 
 
 if __name__ == "__main__":